@@ -8,6 +8,9 @@ from app.backtester import BacktestingSystem
 from app.handlers.data_handler import DataHandler
 from app.handlers.execution_handler import ExecutionHandler
 from app.handlers.strategy_handler import StrategyHandler
+from app.models.backtest_runs import get_run_store
+from app.models.bar_store import get_bar_store
+from app.models.websocket_manager import WebSocketManager
 import pytz
 
 dotenv.load_dotenv()
@@ -19,6 +22,17 @@ USE_PAPER = os.getenv('USE_PAPER', '1') == '1'
 ALPACA_API_KEY = os.getenv('ALPACA_API_KEY_PAPER' if USE_PAPER else 'ALPACA_API_KEY')
 ALPACA_API_SECRET = os.getenv('ALPACA_SECRET_KEY_PAPER' if USE_PAPER else 'ALPACA_SECRET_KEY')
 BACKTEST = os.getenv('BACKTEST', '0') == '1'
+# read & write bars through the consolidated dbs/market_data.db instead of one db file per ticker
+USE_BAR_STORE = os.getenv('USE_BAR_STORE', '0') == '1'
+# worker processes generating signals in parallel, 0 generates them in the trading process
+SIGNAL_WORKERS = int(os.getenv('SIGNAL_WORKERS', '0'))
+# milliseconds between the backtest dashboard's update frames, and their encoding: json or deflate (compressed binary)
+BACKTEST_FRAME_MS = int(os.getenv('BACKTEST_FRAME_MS', '250'))
+BACKTEST_FRAME_ENCODING = os.getenv('BACKTEST_FRAME_ENCODING', 'json')
+# messages a dashboard connection may fall behind by before its oldest are dropped, and whether pending
+# progress-only frames are coalesced (coalesce) or all sent (drop_oldest)
+BACKTEST_WS_QUEUE = int(os.getenv('BACKTEST_WS_QUEUE', '256'))
+BACKTEST_WS_POLICY = os.getenv('BACKTEST_WS_POLICY', 'coalesce')
 logger.info("env data: BACKTEST={}".format(os.getenv('BACKTEST')))
 
 local_tz = pytz.timezone('America/New_York')
@@ -46,10 +60,16 @@ class TradingSystem:
         self.trade_results = []  # Store results of backtested trades
         self.backtest_name = ''
         self.backtest_system = None
+        self.bar_store = get_bar_store('dbs') if USE_BAR_STORE else None
+        self.run_store = get_run_store('dbs')  # every backtest run, whether from the dashboard, the CLI or the farm
 
     async def run(self):
         if self.backtest_mode:
-            backtest_system = BacktestingSystem(tickers, ALPACA_API_KEY, ALPACA_API_SECRET)
+            backtest_system = BacktestingSystem(tickers, ALPACA_API_KEY, ALPACA_API_SECRET, bar_store=self.bar_store)
+            backtest_system.run_store = self.run_store
+            backtest_system.publish_interval = BACKTEST_FRAME_MS / 1000
+            backtest_system.publish_encoding = BACKTEST_FRAME_ENCODING
+            backtest_system.ws_manager = WebSocketManager(max_queue=BACKTEST_WS_QUEUE, policy=BACKTEST_WS_POLICY)
             self.data_handler = backtest_system.data_handler
             self.execution_handler = backtest_system.execution_handler
             self.strategy_handler = backtest_system.strategy_handler
@@ -70,8 +90,8 @@ class TradingSystem:
         """
         logger.info("Starting live trading mode...")
         self.execution_handler = ExecutionHandler(ALPACA_API_KEY, ALPACA_API_SECRET, db_base_path='dbs', use_paper=USE_PAPER)    
-        self.data_handler = DataHandler(tickers, ALPACA_API_KEY, ALPACA_API_SECRET, db_base_path='dbs', timeframe=self.timeframe)
-        self.strategy_handler = StrategyHandler(tickers, db_base_path='dbs', timeframe=self.timeframe)
+        self.data_handler = DataHandler(tickers, ALPACA_API_KEY, ALPACA_API_SECRET, db_base_path='dbs', timeframe=self.timeframe, bar_store=self.bar_store)
+        self.strategy_handler = StrategyHandler(tickers, db_base_path='dbs', timeframe=self.timeframe, bar_store=self.bar_store, workers=SIGNAL_WORKERS)
 
         while True:
             is_market_open = self.execution_handler.is_market_open()
@@ -101,9 +121,10 @@ class TradingSystem:
             # get most recent price data for position checks
             ticker_to_price_map = self.data_handler.fetch_most_recent_prices()
 
-            # check position at the 1hr interval of the market open using last candle from ticker_to_price_map
-            if ticker_to_price_map:
-                if ticker_to_price_map[tickers[0]]['timestamp'].minute == 30:
+            # check position at the 1hr interval of the market open using the last cached candle
+            latest_bar = self.data_handler.latest_bars.get(tickers[0])
+            if ticker_to_price_map and latest_bar is not None:
+                if latest_bar['timestamp'].minute == 30:
                     self.execution_handler.position_manager.check_positions(ticker_to_price_map)  # Check positions
             
             logger.info("Sleeping for 60 seconds...")
@@ -5,11 +5,14 @@ import asyncio, logging
 import logging.config
 import plotly.graph_objects as go
 from pathlib import Path
-from fastapi import FastAPI, Request, WebSocket, WebSocketDisconnect
+from typing import List, Optional
+from fastapi import FastAPI, HTTPException, Query, Request, WebSocket, WebSocketDisconnect
 from fastapi.responses import HTMLResponse
 from fastapi.staticfiles import StaticFiles
 from fastapi.templating import Jinja2Templates
 from app.algo_trader import TradingSystem
+from app.models.backtest_runs import to_records
+from app.models.bar_store import close_bar_stores
 from app.utils import log_util
 from alpaca.trading import OrderSide
 
@@ -37,12 +40,16 @@ async def lifespan(app: FastAPI):
         trader_task.cancel()  # Cancel the background trading task
         if trading_system.data_handler is not None:
             trading_system.data_handler.shutdown()
+        if trading_system.strategy_handler is not None:
+            trading_system.strategy_handler.close()
         if trading_system.backtest_system is not None:
             trading_system.backtest_system.stop_backtest()
+            await trading_system.backtest_system.ws_manager.close()
         try:
             await trader_task
         except asyncio.CancelledError:
             logging.info("Background task successfully cancelled.")
+        close_bar_stores()
         logging.info("Application shutdown complete.")
 
 app = FastAPI(lifespan=lifespan)
@@ -134,6 +141,40 @@ async def stock_chart(request: Request, ticker: str):
     return templates.TemplateResponse("chart.html", {"request": request, "chart": chart_html})
 
 
+@app.get("/api/backtests")
+async def list_backtests(batch_id: Optional[str] = None, strategy: Optional[str] = None, ticker: Optional[str] = None,
+                         status: Optional[str] = None, order_by: str = "started_at", descending: bool = True,
+                         limit: int = Query(100, le=1000), offset: int = 0):
+    """Stored backtest runs with their summary metrics, newest first or ranked by a metric."""
+    try:
+        runs = trading_system.run_store.list_runs(batch_id=batch_id, strategy=strategy, ticker=ticker, status=status,
+                                                  order_by=order_by, descending=descending, limit=limit, offset=offset)
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    return to_records(runs)
+
+
+@app.get("/api/backtests/compare")
+async def compare_backtests(run_ids: List[str] = Query(...)):
+    """The given runs side by side, each with its down-sampled equity curve."""
+    runs, equity = trading_system.run_store.compare_runs(run_ids)
+    curves = {run_id: to_records(curve[["timestamp", "equity"]]) for run_id, curve in equity.groupby("run_id")}
+    return [{**run, "equity": curves.get(run["run_id"], [])} for run in to_records(runs)]
+
+
+@app.get("/api/backtests/{run_id}")
+async def get_backtest(run_id: str):
+    """One run with its trade ledger and equity curve."""
+    runs, equity = trading_system.run_store.compare_runs([run_id])
+    if runs.empty:
+        raise HTTPException(status_code=404, detail=f"No backtest run {run_id}")
+    return {
+        **to_records(runs)[0],
+        "trades": to_records(trading_system.run_store.get_trades(run_id).drop(columns="run_id")),
+        "equity": to_records(equity[["timestamp", "equity"]]),
+    }
+
+
 @app.websocket("/ws/trades")
 async def websocket_trades(websocket: WebSocket):
     await websocket.accept()
@@ -148,7 +189,8 @@ async def websocket_backtest(websocket: WebSocket):
     """
     Called by the backtest_dashboard JavaScript to register a new backtest & subscribe to data.
     """
-    await trading_system.backtest_system.ws_manager.connect(websocket)
+    ws_manager = trading_system.backtest_system.ws_manager
+    await ws_manager.connect(websocket)
 
     try:
         while True:
@@ -159,12 +201,13 @@ async def websocket_backtest(websocket: WebSocket):
             strategy = message.get("strategy")
 
             if not ticker or not strategy:
-                await websocket.send_json({"error": "Missing ticker or strategy"})
+                await ws_manager.send_to(websocket, {"error": "Missing ticker or strategy"})
                 continue
 
             # check if the backtest is already running and if so tell the frontend
-            if ticker in trading_system.backtest_system.running_backtests:
-                await websocket.send_json({"is_backtest_running": True})
+            # backtests share the backtest system's account, one runs at a time
+            if trading_system.backtest_system.is_running:
+                await ws_manager.send_to(websocket, {"is_backtest_running": True, "message": {"text": "A backtest is already running", "type": "error"}})
             else:
                 # Log the received message
                 logger.info(f"Starting backtest for: {ticker} using {strategy}")
@@ -172,9 +215,9 @@ async def websocket_backtest(websocket: WebSocket):
                 # Start the backtest in a background task
                 asyncio.create_task(trading_system.backtest_system.start_backtest_for_ticker(ticker, strategy))
 
-                await websocket.send_json({"message": "Backtest started."})
+                await ws_manager.send_to(websocket, {"message": "Backtest started."})
 
     except WebSocketDisconnect:
         logger.warning("WebSocket disconnected.")
         trading_system.backtest_system.stop_backtest()
-        await trading_system.backtest_system.ws_manager.disconnect(websocket)
\ No newline at end of file
+        await ws_manager.disconnect(websocket)
\ No newline at end of file
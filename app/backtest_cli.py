@@ -0,0 +1,110 @@
+import argparse
+import json
+import logging
+import os
+import time
+
+import dotenv
+
+from app.backtester import BacktestingSystem
+from app.models.backtest_checkpoint import BacktestCheckpoint
+from app.models.backtest_data import BacktestDataEngine
+from app.models.backtest_runs import METRIC_COLUMNS, TRADE_COLUMNS, get_run_store
+
+logger = logging.getLogger("app")
+
+
+def read_tickers(path="tickers.txt"):
+    with open(path, "r") as f:
+        return [t.strip() for t in f.read().splitlines() if t.strip()]
+
+
+def backtest_credentials():
+    """Alpaca credentials from the environment. Backtests never call Alpaca, so placeholders do when none are set."""
+    use_paper = os.getenv('USE_PAPER', '1') == '1'
+    api_key = os.getenv('ALPACA_API_KEY_PAPER' if use_paper else 'ALPACA_API_KEY', 'backtest')
+    api_secret = os.getenv('ALPACA_SECRET_KEY_PAPER' if use_paper else 'ALPACA_SECRET_KEY', 'backtest')
+    return api_key, api_secret
+
+
+def run(system: BacktestingSystem, start_candle_index=0, tickers=None, data_engine=None, checkpoint=None):
+    """
+    Backtest with the dashboard's StrategyHandler & ExecutionHandler logic but none of its plumbing: no event loop,
+    no WebSocket messages. Returns a summary of the run.
+    """
+    started_at = time.perf_counter()
+    data_engine = data_engine or BacktestDataEngine(system.data_handler.get_backtest_data())
+    load_seconds = time.perf_counter() - started_at
+    system.run_headless(start_candle_index, tickers=tickers, data_engine=data_engine, checkpoint=checkpoint)
+    throughput = system.throughput or dict()
+    position_manager = system.execution_handler.position_manager
+    return {
+        "tickers": tickers or system.tickers,
+        "strategies": list(system.strategy_handler.strategies),
+        "start_candle_index": start_candle_index if checkpoint is None else checkpoint.first_candle_index,
+        "resumed_at": None if checkpoint is None else checkpoint.candle_index,
+        "load_seconds": load_seconds,
+        "seconds": throughput.get("seconds"),
+        "candles": throughput.get("bars"),
+        "candles_per_second": throughput.get("bars_per_second"),
+        "run_id": (system.run or dict()).get("run_id"),
+        "trades": len(system.trade_results),
+        "final_equity": float(position_manager.equity),
+        "cash_balance": float(position_manager.cash_balance),
+        # the ledger marked to market on the replayed candles, see `BacktestingSystem.finish_run`
+        "metrics": {name: (system.run or dict()).get(name) for name in METRIC_COLUMNS if name not in ("bars", "seconds")},
+        "attribution": (system.run or dict()).get("attribution"),
+    }
+
+
+def write_results(path, summary, system: BacktestingSystem):
+    """One JSON file of the summary, the trades and the daily equity, columns stored as arrays."""
+    trades = system.trade_ledger()
+    results = {
+        "summary": summary,
+        "trades": {column: [trade[i] for trade in trades] for i, column in enumerate(TRADE_COLUMNS)},
+        "equity": {
+            "timestamp": [timestamp.isoformat() for timestamp, _ in system.equity_curve],
+            "equity": [float(equity) for _, equity in system.equity_curve],
+        },
+    }
+    with open(path, "w") as f:
+        json.dump(results, f, separators=(",", ":"))
+
+
+if __name__ == "__main__":
+    from app.models.bar_store import get_bar_store
+
+    dotenv.load_dotenv()
+    parser = argparse.ArgumentParser(description="Run a backtest without the dashboard, as fast as the strategies allow.")
+    parser.add_argument("--tickers", nargs="+", help="tickers to backtest, tickers.txt by default")
+    parser.add_argument("--strategies", nargs="+", help="strategies to backtest, the StrategyHandler's active ones by default")
+    parser.add_argument("--start-candle", type=int, default=0, help="clock step to start the backtest at")
+    parser.add_argument("--output", default="backtest_results.json")
+    parser.add_argument("--db-base-path", default="dbs")
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--checkpoint", help="checkpoint the backtest to this file as it runs")
+    parser.add_argument("--checkpoint-every", type=int, default=390, help="clock steps between checkpoints")
+    parser.add_argument("--resume", action="store_true", help="continue from the --checkpoint file when there is one")
+    args = parser.parse_args()
+    logging.basicConfig(level=args.log_level)
+
+    tickers = args.tickers or read_tickers()
+    bar_store = get_bar_store(args.db_base_path) if os.getenv('USE_BAR_STORE', '0') == '1' else None
+    system = BacktestingSystem(tickers, *backtest_credentials(), bar_store=bar_store, db_base_path=args.db_base_path)
+    if args.strategies:
+        system.strategy_handler.select_strategies(args.strategies)
+    system.run_source = "cli"
+    system.run_store = get_run_store(args.db_base_path)
+
+    system.checkpoint_path = args.checkpoint
+    system.checkpoint_every = args.checkpoint_every
+    checkpoint = BacktestCheckpoint.load(args.checkpoint) if args.resume and args.checkpoint else None
+    if checkpoint is not None:
+        print(f"Resuming from candle {checkpoint.candle_index:,} of {args.checkpoint}")
+
+    summary = run(system, args.start_candle, checkpoint=checkpoint)
+    write_results(args.output, summary, system)
+    print(f"Backtested {summary['candles']:,} candles of {len(summary['tickers'])} tickers in {summary['seconds']:.2f}s "
+          f"({summary['candles_per_second'] or 0:,.0f} candles/s, data loaded in {summary['load_seconds']:.2f}s), "
+          f"{summary['trades']} trades, results written to {args.output} and stored as run {summary['run_id']}")
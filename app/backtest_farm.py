@@ -0,0 +1,168 @@
+import argparse
+import ast
+import itertools
+import logging
+import os
+import tempfile
+import traceback
+import uuid
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from datetime import datetime
+from multiprocessing import get_context
+
+import dotenv
+
+from app.backtester import BacktestingSystem
+from app.models.backtest_data import BacktestDataEngine
+from app.models.backtest_runs import METRIC_COLUMNS, BacktestRunStore, get_run_store
+
+logger = logging.getLogger("app")
+
+EXECUTION_PARAMS = {"target_pct"}  # swept on the ExecutionHandler, every other parameter is set on the strategy
+
+
+def parameter_grid(tickers, strategies, params=None):
+    """
+    One job per ticker, strategy and combination of parameter values.
+    `params` maps a parameter to the values to sweep, `name` applies to every strategy and `strategy.name` to one.
+    """
+    params = params or dict()
+    jobs = []
+    for strategy in strategies:
+        swept = dict()
+        for key, values in params.items():
+            owner, _, name = key.rpartition(".")
+            if owner in ("", strategy):
+                swept[name] = list(values)
+        for values in itertools.product(*swept.values()):
+            for ticker in tickers:
+                jobs.append({"job_id": len(jobs), "ticker": ticker, "strategy": strategy, "params": dict(zip(swept, values))})
+    return jobs
+
+
+_worker_engine = None
+_worker_credentials = None
+
+
+def _init_worker(directory, api_key, api_secret):
+    global _worker_engine, _worker_credentials
+    _worker_engine = BacktestDataEngine.load(directory)
+    _worker_credentials = (api_key, api_secret)
+
+
+def _run_job(job):
+    system = None
+    try:
+        system = BacktestingSystem([job["ticker"]], *_worker_credentials)
+        system.run_source = "farm"
+        system.run_params = job["params"]
+        system.strategy_handler.select_strategies([job["strategy"]])
+        strategy_params = {name: value for name, value in job["params"].items() if name not in EXECUTION_PARAMS}
+        system.strategy_handler.strategies[job["strategy"]].configure(**strategy_params)
+        for name in EXECUTION_PARAMS & job["params"].keys():
+            setattr(system.execution_handler, name, job["params"][name])
+        system.run_headless(tickers=[job["ticker"]], data_engine=_worker_engine)
+    except Exception:
+        return {"run": getattr(system, "run", None), "error": traceback.format_exc()}
+    return {"run": system.run, "trades": system.trade_ledger(), "equity": system.run_equity}
+
+
+def job_run(farm_id, job, result):
+    """The run record of a finished job, a failed one is recorded even when its backtest never started."""
+    run = dict(result.get("run") or {"run_id": uuid.uuid4().hex, "started_at": datetime.now(), "finished_at": datetime.now()})
+    run.update(batch_id=farm_id, source="farm", tickers=[job["ticker"]], strategies=[job["strategy"]], params=job["params"])
+    if result.get("error"):
+        run.update(status="failed", error=result["error"])
+    return run
+
+
+class BacktestFarm:
+    """
+    Runs a grid of single ticker, single strategy backtests in worker processes, away from the web process.
+    The candles are loaded once and written as `.npy` files every worker memory maps read-only, so a worker
+    only pays for the candles its jobs touch and all of them share one copy. Each job backtests in a fresh
+    BacktestingSystem and is stored as a run of the BacktestRunStore as it finishes, the batch's farm id as its
+    `batch_id`. Workers never write to the store, this process does.
+    """
+    def __init__(self, api_key, api_secret, db_base_path="dbs", workers=4, runs: BacktestRunStore = None):
+        self.api_key = api_key
+        self.api_secret = api_secret
+        self.workers = workers  # 0 runs the jobs one after another in this process
+        self.runs = runs or get_run_store(db_base_path)
+
+    def run(self, data, jobs, farm_id=None):
+        """Backtest every job on `data` (a BacktestDataEngine or {ticker: candles}). Returns the batch's farm id."""
+        engine = data if isinstance(data, BacktestDataEngine) else BacktestDataEngine(data)
+        farm_id = farm_id or f"{datetime.now():%Y%m%d-%H%M%S}-{uuid.uuid4().hex[:6]}"
+        logger.info("Backtest farm %r running %r jobs on %r workers", farm_id, len(jobs), self.workers)
+        with tempfile.TemporaryDirectory(prefix="backtest-farm-") as directory:
+            engine.save(directory)
+            for job, result in self._results(directory, jobs):
+                if result.get("error"):
+                    logger.error("Backtest farm job %r failed: %s", job, result["error"])
+                self.runs.save_run(job_run(farm_id, job, result), result.get("trades", ()), result.get("equity", ()))
+        return farm_id
+
+    def rank(self, farm_id=None, metric="return_pct", limit=20, ascending=False):
+        """The best `limit` completed runs by `metric`, of one batch or of every batch when `farm_id` is None."""
+        return self.runs.list_runs(batch_id=farm_id, status="completed", order_by=metric, descending=not ascending, limit=limit)
+
+    def _results(self, directory, jobs):
+        if self.workers <= 0:
+            _init_worker(directory, self.api_key, self.api_secret)
+            for job in jobs:
+                yield job, _run_job(job)
+            return
+        executor = ProcessPoolExecutor(
+            max_workers=min(self.workers, len(jobs)) or 1,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(directory, self.api_key, self.api_secret),
+        )
+        with executor:
+            futures = {executor.submit(_run_job, job): job for job in jobs}
+            for future in as_completed(futures):
+                try:
+                    result = future.result()
+                except Exception:
+                    result = {"error": traceback.format_exc()}
+                yield futures[future], result
+
+
+def parse_param(text):
+    """`name=1,2,3` as (name, [values]), values are Python literals or plain strings."""
+    name, _, values = text.partition("=")
+    parsed = []
+    for value in values.split(","):
+        try:
+            parsed.append(ast.literal_eval(value))
+        except (ValueError, SyntaxError):
+            parsed.append(value)
+    return name.strip(), parsed
+
+
+if __name__ == "__main__":
+    from app.backtest_cli import backtest_credentials, read_tickers
+    from app.handlers.data_handler import DataHandler
+    from app.models.bar_store import get_bar_store
+
+    dotenv.load_dotenv()
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Backtest a grid of tickers, strategies and parameters in worker processes.")
+    parser.add_argument("--tickers", nargs="+", help="tickers to backtest, tickers.txt by default")
+    parser.add_argument("--strategies", nargs="+", default=["support_resistance"])
+    parser.add_argument("--param", action="append", default=[], help="name=v1,v2 or strategy.name=v1,v2, repeatable")
+    parser.add_argument("--workers", type=int, default=os.cpu_count())
+    parser.add_argument("--db-base-path", default="dbs")
+    parser.add_argument("--top", type=int, default=20, help="ranked jobs to print")
+    args = parser.parse_args()
+
+    tickers = args.tickers or read_tickers()
+    api_key, api_secret = backtest_credentials()
+    bar_store = get_bar_store(args.db_base_path) if os.getenv('USE_BAR_STORE', '0') == '1' else None
+
+    data_handler = DataHandler(tickers, api_key, api_secret, db_base_path=args.db_base_path, is_backtest=True, bar_store=bar_store)
+    jobs = parameter_grid(tickers, args.strategies, dict(parse_param(param) for param in args.param))
+    farm = BacktestFarm(api_key, api_secret, db_base_path=args.db_base_path, workers=args.workers)
+    farm_id = farm.run(data_handler.get_backtest_data(), jobs)
+    print(farm.rank(farm_id, limit=args.top)[["run_id", "tickers", "strategies", "params", *METRIC_COLUMNS]].to_string())
@@ -1,9 +1,18 @@
 from app.handlers.data_handler import DataHandler
 from app.handlers.execution_handler import ExecutionHandler
 from app.handlers.strategy_handler import StrategyHandler
+from app.models.backtest_checkpoint import BacktestCheckpoint
+from app.models.backtest_data import BacktestDataEngine
+from app.models.backtest_publisher import BacktestPublisher
+from app.models.backtest_runs import TRADE_COLUMNS
+from app.utils import analytics
 import logging
 import pandas as pd
 import asyncio  
+import time
+import traceback
+import uuid
+from datetime import datetime
 
 from alpaca.data import TimeFrame
 
@@ -14,11 +23,13 @@ logger = logging.getLogger("app")
 
 class BacktestingSystem():
 
-    def __init__(self, tickers, api_key, api_secret, timeframe=TimeFrame.Minute):
+    def __init__(self, tickers, api_key, api_secret, timeframe=TimeFrame.Minute, bar_store=None, db_base_path='dbs'):
         self.timeframe = timeframe
         self.execution_handler = ExecutionHandler(api_key, api_secret, use_paper=True, is_backtest=True)    
-        self.data_handler = DataHandler(tickers, api_key, api_secret, db_base_path='dbs', timeframe=timeframe, is_backtest=True)
-        self.strategy_handler = StrategyHandler(tickers, db_base_path='dbs', timeframe=self.timeframe)
+        self.data_handler = DataHandler(tickers, api_key, api_secret, db_base_path=db_base_path, timeframe=timeframe, is_backtest=True, bar_store=bar_store)
+        self.strategy_handler = StrategyHandler(tickers, db_base_path=db_base_path, timeframe=self.timeframe, bar_store=bar_store)
+        # backtests train their own Markov models instead of overwriting the live ones saved on disk
+        self.strategy_handler.markov_prediction.model_dir = None
         self.trade_results = []  # Store results of backtested trades
         self.tickers = tickers
         self.registered_websockets = []
@@ -26,7 +37,21 @@ class BacktestingSystem():
 
         # Initialize WebSocket Manager
         self.ws_manager = WebSocketManager()
+        self.publish_interval = 0.25  # seconds between the dashboard's backtest frames
+        self.publish_encoding = "json"  # or "deflate" for compressed binary frames
         self.task = None
+        self.data_engine = None
+        # strategies with a whole-history mode compute every signal of the backtest up front
+        self.use_vectorized_signals = True
+        self.throughput = None  # bars replayed per second by the last backtest
+        self.equity_curve = []  # (timestamp, equity) at the start of every backtested day
+        self.checkpoint_path = None  # when set, the running backtest is checkpointed here to be resumed with `replay`
+        self.checkpoint_every = 390  # clock steps between checkpoints
+        self.run_store = None  # BacktestRunStore every backtest is recorded in when set
+        self.run_source = "dashboard"  # what started the backtests, recorded with each run
+        self.run_params = dict()  # parameters recorded with each run, e.g. the ones a parameter sweep set
+        self.run = None  # metadata & summary metrics of the last backtest, see `finish_run`
+        self.run_equity = []  # (timestamp, equity) of the last backtest marked to market at every day's close
 
     def is_market_open(self, timestamp):
         if timestamp.weekday() >= 5:
@@ -39,7 +64,8 @@ class BacktestingSystem():
     
     @property
     def is_running(self):
-        return self.running_backtests
+        """The dashboard backtests still running, by ticker."""
+        return {ticker: task for ticker, task in self.running_backtests.items() if not task.done()}
     
     def register_websocket(self, ws):
         # register a websocket to the backtesting system to feed information to the front end
@@ -73,142 +99,337 @@ class BacktestingSystem():
         return daily_candles.to_dict(orient="records")
 
 
-    def report_data_period(self, data):
+    def update_latest_prices(self, end):
+        """Feed the data handler's latest bar cache with each ticker's last candle before `end`."""
+        for ticker in self.data_engine.tickers:
+            candle = self.data_engine.last_candle(ticker, end)
+            if candle is not None:
+                self.data_handler.latest_bars.update(ticker, candle["timestamp"], close=candle["close"])
+
+    def report_data_period(self, start, end):
         """
         Report the start and end timestamps of the data period.
         """
-        start = data["timestamp"].iloc[0]
-        end = data["timestamp"].iloc[-1]
         logger.info("Backtest Data period: %r - %r", start.isoformat(), end.isoformat())
 
 
-    async def run_backtest(self, start_candle_index=0):
-        logger.info("AlgoTrader BacktestingSystem fetching backtest data")
-
-        backtest_data = self.data_handler.get_backtest_data()
-        backtest_ticker_data = backtest_data[self.tickers[0]]
-
-        start_candle_timestamp = backtest_ticker_data['timestamp'].iloc[start_candle_index]
-        total_number_candles = len(backtest_ticker_data)
+    def completed_candles(self, clock, candle_index, first_candle_index):
+        """
+        [(ticker, row)] of the candles that became visible at clock step `candle_index`. Strategies only see candles
+        before the clock, so those are the candles stamped at the previous step, or each ticker's last candle so far
+        on the backtest's first step.
+        """
+        if candle_index > first_candle_index:
+            return clock.events(candle_index - 1)
+        end = clock.timestamp(candle_index)
+        completed = []
+        for ticker in clock.tickers:
+            row = self.data_engine.index_of(ticker, end) - 1
+            if row >= 0:
+                completed.append((ticker, row))
+        return completed
+
+
+    def take_checkpoint(self, clock, candle_index, first_candle_index, curr_date, day_start) -> BacktestCheckpoint:
+        """The state of the running backtest before clock step `candle_index`."""
+        return BacktestCheckpoint(
+            candle_index, first_candle_index, clock.tickers, len(clock), clock.timestamp(len(clock) - 1), curr_date, day_start,
+            account=self.execution_handler.position_manager.get_backtest_state(),
+            trade_results=self.trade_results,
+            equity_curve=self.equity_curve,
+            strategy_states={
+                name: {ticker: strategy.get_ticker_state(ticker) for ticker in clock.tickers}
+                for name, strategy in self.strategy_handler.strategies.items()
+            },
+            aggregator_states={ticker: self.strategy_handler.bar_aggregator.get_ticker_state(ticker) for ticker in clock.tickers},
+            run=self.run,
+        )
+
+    def restore_checkpoint(self, checkpoint: BacktestCheckpoint):
+        missing = set(checkpoint.strategy_states) - set(self.strategy_handler.strategies)
+        if missing:
+            raise ValueError(f"Checkpoint was taken with strategies {sorted(missing)} that are not active")
+        self.execution_handler.position_manager.set_backtest_state(checkpoint.account)
+        self.trade_results = list(checkpoint.trade_results)
+        self.equity_curve = list(checkpoint.equity_curve)
+        for name, states in checkpoint.strategy_states.items():
+            for ticker, state in states.items():
+                self.strategy_handler.strategies[name].set_ticker_state(ticker, state)
+        for ticker, state in checkpoint.aggregator_states.items():
+            self.strategy_handler.bar_aggregator.set_ticker_state(ticker, state)
+        if getattr(checkpoint, "run", None) is not None:
+            self.run = dict(checkpoint.run)
+
+
+    def start_run(self, clock, first_candle_index):
+        """The metadata of a new backtest run, completed by `finish_run`."""
+        return {
+            "run_id": uuid.uuid4().hex,
+            "source": self.run_source,
+            "started_at": datetime.now(),
+            "tickers": list(clock.tickers),
+            "strategies": list(self.strategy_handler.strategies),
+            "params": dict(self.run_params),
+            "data_start": clock.timestamp(first_candle_index).to_pydatetime(),
+            "data_end": clock.timestamp(len(clock) - 1).to_pydatetime(),
+        }
+
+    def replayed_prices(self, clock, first_candle_index, candle_index):
+        """{ticker: (timestamps, closes)} of the candles replayed before clock step `candle_index`."""
+        if candle_index <= first_candle_index:
+            return dict()
+        start, end = clock.timestamp(first_candle_index), clock.timestamp(candle_index - 1)
+        prices = dict()
+        for ticker in clock.tickers:
+            first, last = self.data_engine.index_of(ticker, start), self.data_engine.index_of(ticker, end, side="right")
+            prices[ticker] = (self.data_engine.timestamps[ticker][first:last], self.data_engine.frame(ticker)["close"].values[first:last])
+        return prices
+
+    def finish_run(self, status, error=None, prices=None):
+        """
+        Complete `self.run` with how the backtest ended and its performance: the trade ledger marked to market on
+        the replayed candles (`prices`, see `replayed_prices`) in one vectorized pass. The run is stored with its
+        trades and daily equity when there is a run store.
+        """
+        self.run.update(status=status, error=error, finished_at=datetime.now(), bars=self.throughput["bars"], seconds=self.throughput["seconds"])
+        try:
+            ledger = pd.DataFrame(self.trade_ledger(), columns=TRADE_COLUMNS)
+            report = analytics.performance_report(ledger, prices or dict(), self.execution_handler.position_manager.starting_balance)
+            self.run.update({name: value for name, value in report["metrics"].items() if name not in ("avg_win", "avg_loss", "max_drawdown_seconds")})
+            self.run["attribution"] = report["attribution"].to_dict(orient="records")
+            equity = analytics.daily(report["equity"])
+            self.run_equity = list(zip(equity["timestamp"], equity["equity"]))
+            if self.run_store is not None:
+                self.run_store.save_run(self.run, ledger.itertuples(index=False, name=None), self.run_equity)
+        except Exception as e:
+            logger.exception("Error recording backtest run %r", self.run["run_id"], exc_info=e)
+
+
+    def replay(self, start_candle_index=0, tickers=None, data_engine=None, checkpoint: BacktestCheckpoint = None):
+        """
+        The backtest itself, synchronous and free of any I/O: replays the candles of `tickers` (every backtested
+        ticker when None) on one clock merged from all their timestamps. At each step every ticker with a new candle
+        is evaluated and priced together, so their signals are sized against one shared portfolio.
+        `data_engine` replays already loaded candles instead of reading them from the data handler.
+        `checkpoint` resumes a backtest from the step it was taken at, with the same tickers and strategies.
+        Yields ("start", clock), then ("candle", end) at every step, ("trade", order) for every executed trade and
+        ("day", end, day_start) once positions are marked at the first candle of a new day, for the caller to report.
+        """
+        tickers = checkpoint.tickers if checkpoint is not None else tickers or self.tickers
+
+        # load every candle once, strategies are served views of it up to the backtest clock
+        self.data_engine = data_engine or BacktestDataEngine(self.data_handler.get_backtest_data())
+        self.strategy_handler.backtest_engine = self.data_engine
+        self.strategy_handler.bar_aggregator.reset()
+        self.data_handler.latest_bars.clear()
+        clock = self.data_engine.clock(tickers)
+        if start_candle_index >= len(clock):
+            logger.warning("No backtest candles for %r from candle %r", tickers, start_candle_index)
+            self.strategy_handler.backtest_engine = None
+            return
+        first_candle_index = start_candle_index
+        curr_date = clock.timestamp(start_candle_index)
+        day_start = curr_date  # Track first candle of the day
+        self.run = self.start_run(clock, first_candle_index)
+        if checkpoint is None:
+            # the system is reused by the dashboard, every backtest starts from a fresh account and ledger
+            self.trade_results = []
+            self.equity_curve = []
+            self.execution_handler.position_manager.reset_backtest_account()
+        else:
+            if not checkpoint.matches(clock):
+                self.strategy_handler.backtest_engine = None
+                raise ValueError("Backtest checkpoint was taken on other candles")
+            self.restore_checkpoint(checkpoint)
+            start_candle_index, first_candle_index = checkpoint.candle_index, checkpoint.first_candle_index
+            curr_date, day_start = checkpoint.curr_date, checkpoint.day_start
+            logger.info("Resuming backtest at candle %r / %r", start_candle_index, len(clock))
+        closes = {ticker: self.data_engine.frame(ticker)["close"].values for ticker in clock.tickers}
+        if self.use_vectorized_signals:
+            # from where the backtest started, so a resumed backtest gets the signals it would have had
+            self.strategy_handler.vectorize_backtest(clock.timestamps[first_candle_index:], tickers=clock.tickers)
+
+        self.report_data_period(curr_date, clock.timestamp(len(clock) - 1))
+        started_at = time.perf_counter()
         candle_index = start_candle_index
-
-        curr_date = start_candle_timestamp
-        daily_candle_index = start_candle_index  # Track first candle of the day
-
-        await self.ws_manager.send_message({
-            "message": {"type": "success", "text": f"Backtest has begun for tickers {', '.join(self.tickers)}"}
-        })
-
-        logger.info("AlgoTrader BacktestingSystem begin backtest & signal generation")
-
-        self.report_data_period(backtest_ticker_data)
-
-        while candle_index <= total_number_candles:
-            if self.task and self.task.cancelled():
-                logger.warning("Task cancelled!")
-                return  # Stop if the task is cancelled
-
-            logger.debug("Running backtest for candle %r / %r", candle_index, total_number_candles)
-
-            backtest_data["end"] = backtest_ticker_data["timestamp"].iloc[candle_index]
-            candle_index += 1
-
-            # Skip if the market is closed
-            if not self.is_market_open(backtest_data["end"]):
-                continue
-
-            # Generate trading signals
-            try:
-                signal_data = self.strategy_handler.generate_signals(is_backtest=True, backtest_data=backtest_data)
-            except Exception as e:
-                logger.exception("Error generating signals", exc_info=e)
-                
-            for signal in signal_data.values():
-                order = None
+        status, error = "cancelled", None  # unless it runs to the end or fails
+
+        try:
+            yield "start", clock
+            for candle_index in range(start_candle_index, len(clock)):
+                end = clock.timestamp(candle_index)
+                if self.checkpoint_path and candle_index > start_candle_index and (candle_index - first_candle_index) % self.checkpoint_every == 0:
+                    self.take_checkpoint(clock, candle_index, first_candle_index, curr_date, day_start).save(self.checkpoint_path)
+                yield "candle", end
+                # every ticker with a new candle moves forward together and its open position is repriced
+                latest_prices = {ticker: closes[ticker][row] for ticker, row in self.completed_candles(clock, candle_index, first_candle_index)}
+                self.execution_handler.position_manager.mark_positions(latest_prices)
+
+                # Skip if the market is closed
+                if not self.is_market_open(end):
+                    continue
+
+                # Generate trading signals, only the tickers with a new candle can have a new signal
+                backtest_data = {"end": end, "tickers": list(latest_prices)}
                 try:
-                    order = self.execution_handler.run_backtest_trade(signal)
+                    signal_data = self.strategy_handler.generate_signals(is_backtest=True, backtest_data=backtest_data)
                 except Exception as e:
-                    logger.exception("Error executing backtest trade", exc_info=e)
+                    logger.exception("Error generating signals", exc_info=e)
+                    signal_data = dict()
 
-                if order is not None:
-                    order['timestamp'] = backtest_data["end"].isoformat()
-                    self.trade_results.append(order)
+                for signal in signal_data.values():
+                    order = None
                     try:
-                        logger.info("Trade outcome: %r", order)
-                        trade_message = {
-                            "trade": {
-                                "timestamp": order["timestamp"],
-                                "ticker": order["ticker"],
-                                "price": order["price"],
-                                "side": order["side"].value,
-                                "qty": order["qty"],
-                                "direction": order["direction"]
-                            },
-                            "balance": self.execution_handler.position_manager.cash_balance,
-                            "positions": [p.__repr__() for p in self.execution_handler.position_manager.positions.values()],
-                            "ticker_data": None,  # No new ticker data yet,
-                            "message": dict(type="success", text=f"Trade executed for {order['ticker']}")
-                        }
-                        await self.ws_manager.send_message(trade_message)
-                        logger.info("Trade message sent")
+                        order = self.execution_handler.run_backtest_trade(signal)
                     except Exception as e:
-                        logger.exception("Error sending trade data to WebSocket", exc_info=e)
-
-            # **New day detected, send full-day data**
-            if backtest_data["end"].date() != curr_date.date():
-                logger.debug("New day detected: %r", backtest_data["end"])
-                curr_date = backtest_data["end"]
-
-                try:
-                    ticker_to_price_map = self.data_handler.fetch_most_recent_prices()
-                    self.execution_handler.update_backtest_positions(backtest_data["end"], ticker_to_price_map=ticker_to_price_map)
-
-                    # Slice full day's data
-                    ticker_data = self.serialize_ticker_data(backtest_ticker_data.iloc[daily_candle_index:candle_index])
-
-                    daily_message = {
-                        "trade": None,  # No specific trade at day start
-                        "balance": self.execution_handler.position_manager.cash_balance,
-                        "positions": [p.__repr__() for p in self.execution_handler.position_manager.positions.values()],
-                        "stats": self.execution_handler.position_manager.stats(),
-                        "ticker_data": ticker_data,  # Send all candles from the last detected day
-                    }
-
-                    await self.ws_manager.send_message(daily_message)
-
-                    # **Update daily_candle_index to mark the start of a new day**
-                    daily_candle_index = candle_index
+                        logger.exception("Error executing backtest trade", exc_info=e)
+                    if order is not None:
+                        order['timestamp'] = end.isoformat()
+                        self.trade_results.append(order)
+                        yield "trade", order
+
+                # **New day detected, mark positions to the last prices**
+                if end.date() != curr_date.date():
+                    curr_date = end
+                    try:
+                        self.update_latest_prices(end)
+                        ticker_to_price_map = self.data_handler.fetch_most_recent_prices()
+                        self.execution_handler.update_backtest_positions(end, ticker_to_price_map=ticker_to_price_map)
+                        self.equity_curve.append((end, self.execution_handler.position_manager.equity))
+                    except Exception as e:
+                        logger.exception("Error updating backtest positions", exc_info=e)
+                        continue
+                    yield "day", end, day_start
+                    day_start = end
                     # **Check positions at the start of the day**
-                    self.execution_handler.position_manager.check_positions(ticker_to_price_map) 
-                except Exception as e:
-                    logger.exception("Error sending daily backtest data to WebSocket", exc_info=e)
-            
-            await asyncio.sleep(0)
-
-        logger.info("Position Manager stats: %r", self.execution_handler.position_manager.stats())
+                    try:
+                        self.execution_handler.position_manager.check_positions(ticker_to_price_map)
+                    except Exception as e:
+                        logger.exception("Error checking backtest positions", exc_info=e)
+            candle_index = len(clock)
+            status = "completed"
+        except Exception:
+            status, error = "failed", traceback.format_exc()
+            raise
+        finally:
+            seconds = time.perf_counter() - started_at
+            bars = clock.bars_between(start_candle_index, candle_index)
+            self.throughput = {"bars": bars, "tickers": len(clock.tickers), "seconds": seconds, "bars_per_second": bars / seconds if seconds else None}
+            logger.info("Backtest replayed %r bars of %r tickers in %.2fs (%.0f bars/s)", bars, len(clock.tickers), seconds, self.throughput["bars_per_second"] or 0)
+            self.strategy_handler.backtest_engine = None
+            self.strategy_handler.vectorized_signals = dict()
+            self.finish_run(status, error, prices=self.replayed_prices(clock, first_candle_index, candle_index))
+
+
+    def run_headless(self, start_candle_index=0, tickers=None, data_engine=None, checkpoint=None):
+        """Run `replay` to the end with nothing reported along the way. Returns the executed trades."""
+        for _ in self.replay(start_candle_index, tickers=tickers, data_engine=data_engine, checkpoint=checkpoint):
+            pass
+        return self.trade_results
+
+    def trade_ledger(self):
+        """The executed trades as (timestamp, ticker, side, qty, price, reason, strategy) rows."""
+        return [
+            (order["timestamp"], order["ticker"], getattr(order["side"], "value", order["side"]), float(order["qty"]), float(order["price"]),
+             order.get("reason"), order.get("strategy"))
+            for order in self.trade_results
+        ]
+
+
+    async def run_backtest(self, start_candle_index=0, tickers=None, data_engine=None, checkpoint=None):
+        """
+        Run `replay` for the dashboard, yielding to the event loop between candles. Trades, positions and daily
+        candles are coalesced by a BacktestPublisher into frames sent to the WebSocket clients every
+        `publish_interval` seconds. See `replay` for the arguments.
+        """
+        logger.info("AlgoTrader BacktestingSystem fetching backtest data")
+        publisher = BacktestPublisher(self.ws_manager, interval=self.publish_interval, encoding=self.publish_encoding)
+        # dashboards connecting from now on are sent this backtest so far first
+        self.ws_manager.snapshot = publisher.snapshot
+        position_manager = self.execution_handler.position_manager
+        chart_ticker = None  # the ticker whose daily candles are sent to the dashboard
+        candles, replayed = 0, 0
+        replay = self.replay(start_candle_index, tickers=tickers, data_engine=data_engine, checkpoint=checkpoint)
+        try:
+            for event in replay:
+                kind = event[0]
+                if kind == "start":
+                    clock = event[1]
+                    chart_ticker = clock.tickers[0]
+                    candles = len(clock)
+                    replayed = start_candle_index if checkpoint is None else checkpoint.candle_index
+                    publisher.message(f"Backtest has begun for tickers {', '.join(clock.tickers)}")
+                    await publisher.publish(position_manager, force=True)
+                    logger.info("AlgoTrader BacktestingSystem begin backtest & signal generation")
+
+                elif kind == "candle":
+                    if self.task and self.task.cancelled():
+                        logger.warning("Task cancelled!")
+                        return  # Stop if the task is cancelled
+                    replayed += 1
+                    publisher.advance(event[1], replayed / candles)
+                    await publisher.publish(position_manager)
+                    await asyncio.sleep(0)
+
+                elif kind == "trade":
+                    logger.debug("Trade outcome: %r", event[1])
+                    publisher.trade(event[1])
+
+                elif kind == "day":
+                    # **New day detected, send the full day's candles with the next frame**
+                    _, end, day_start = event
+                    logger.debug("New day detected: %r", end)
+                    try:
+                        publisher.day(self.serialize_ticker_data(self.data_engine.window(chart_ticker, end=end, start=day_start)), position_manager.stats())
+                    except Exception as e:
+                        logger.exception("Error collecting daily backtest data", exc_info=e)
+        finally:
+            # a cancelled backtest is recorded & releases the system before another one starts
+            replay.close()
+
+        publisher.message("Backtest completed")
+        await publisher.publish(position_manager, force=True)
+        logger.info("Position Manager stats: %r", position_manager.stats())
         logger.info("Backtest completed. Results: %r", self.trade_results)
 
 
     def start_backtest(self):
-        """Starts the backtest task in the background."""
-        if self.task and not self.task.done():
-            self.task.cancel()  # Cancel any existing task before starting a new one
-        self.task = asyncio.create_task(self.run_backtest())
+        """Starts the backtest task in the background, once any running backtest has stopped."""
+        self.task = asyncio.create_task(self.run_alone(self.backtest_tasks(), self.run_backtest()))
 
 
     async def start_backtest_for_ticker(self, ticker: str, strategy: str):
         """
         Runs a simulated backtest and sends updates via WebSocket.
         """
-        if ticker in self.running_backtests:
-            self.running_backtests[ticker].cancel()  # Cancel any existing task
-        self.tickers = [ticker]
-        task = asyncio.create_task(self.run_backtest())
-        self.running_backtests[ticker] = task
+        self.running_backtests = {ticker: asyncio.create_task(self.run_alone(self.backtest_tasks(), self.run_backtest(tickers=[ticker])))}
+
+
+    def backtest_tasks(self):
+        """The running backtest tasks."""
+        tasks = list(self.is_running.values())
+        if self.task and not self.task.done() and self.task not in tasks:
+            tasks.append(self.task)
+        return tasks
+
+    async def run_alone(self, running, backtest):
+        """
+        Await the `backtest` coroutine once the `running` backtests are cancelled and have finished recording their
+        runs. Backtests share this system's account, ledger, data engine & signals, so one runs at a time.
+        """
+        try:
+            for task in running:
+                task.cancel()
+            if running:
+                await asyncio.gather(*running, return_exceptions=True)
+        except asyncio.CancelledError:
+            backtest.close()
+            raise
+        await backtest
 
 
     def stop_backtest(self):
-        """Stops the running backtest."""
-        if self.task and not self.task.done():
-            self.task.cancel()
-            self.task = None
\ No newline at end of file
+        """Stops the running backtests."""
+        for task in self.backtest_tasks():
+            task.cancel()
+        self.task = None
\ No newline at end of file
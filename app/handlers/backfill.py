@@ -0,0 +1,201 @@
+import json
+import logging
+import os
+import threading
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from datetime import datetime, timedelta
+
+from alpaca.data import StockBarsRequest, TimeFrame
+
+logger = logging.getLogger("app")
+
+# Alpaca's free data plan allows 200 historical requests per minute
+DEFAULT_REQUESTS_PER_MINUTE = 200
+# get_stock_bars only follows next_page_token internally when `limit` exceeds its 10k page size,
+# so capping each request at one page makes every call exactly one HTTP request against the budget
+DEFAULT_PAGE_LIMIT = 10_000
+
+
+class RequestBudget:
+    """Thread-safe sliding window rate limiter. `acquire` blocks until a request fits in the budget."""
+    def __init__(self, max_requests=DEFAULT_REQUESTS_PER_MINUTE, period=60.0):
+        self.max_requests = max_requests
+        self.period = period
+        self.requests_made = 0
+        self._sent = deque()
+        self._lock = threading.Lock()
+
+    def acquire(self):
+        while True:
+            with self._lock:
+                now = time.monotonic()
+                while self._sent and now - self._sent[0] >= self.period:
+                    self._sent.popleft()
+                if len(self._sent) < self.max_requests:
+                    self._sent.append(now)
+                    self.requests_made += 1
+                    return
+                wait = self.period - (now - self._sent[0])
+            time.sleep(wait)
+
+
+class BackfillCheckpoints:
+    """
+    Per ticker & timeframe high-water marks persisted as JSON. Everything before a ticker's checkpoint
+    has been fetched and saved, so an interrupted backfill resumes from there.
+    """
+    def __init__(self, path=None):
+        self.path = path
+        self.checkpoints = dict()
+        if path is not None and os.path.exists(path):
+            with open(path, "r") as f:
+                self.checkpoints = json.load(f)
+
+    def _key(self, ticker, timeframe):
+        return f"{ticker};{timeframe}"
+
+    def get(self, ticker, timeframe):
+        value = self.checkpoints.get(self._key(ticker, timeframe))
+        return datetime.fromisoformat(value) if value else None
+
+    def set(self, ticker, timeframe, completed_through: datetime):
+        self.checkpoints[self._key(ticker, timeframe)] = completed_through.isoformat()
+        if self.path is None:
+            return
+        tmp_path = f"{self.path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.checkpoints, f, indent=2, sort_keys=True)
+        os.replace(tmp_path, self.path)
+
+
+class BackfillEngine:
+    """
+    Fetch historical bars for many tickers concurrently.
+    The range is split into windows, each fetched for a batch of tickers by a bounded thread pool which
+    follows pagination inside the window and stays under the request budget. Results are handed to `on_data`
+    on the calling thread, so database writes are never concurrent, and each ticker's checkpoint advances
+    over its contiguous completed windows.
+    """
+    def __init__(self, client, on_data, timeframe=TimeFrame.Minute, window=timedelta(days=7), max_workers=4,
+                 batch_size=1, budget: RequestBudget = None, page_limit=DEFAULT_PAGE_LIMIT,
+                 checkpoints: BackfillCheckpoints = None, max_retries=2):
+        self.client = client  # StockHistoricalDataClient or anything with `get_stock_bars`
+        self.on_data = on_data  # called with `BarSet.data` ({ticker: [Bar, ...]})
+        self.timeframe = timeframe
+        self.window = window
+        self.max_workers = max_workers
+        self.batch_size = batch_size  # tickers per request
+        self.budget = budget or RequestBudget()
+        self.page_limit = page_limit
+        self.checkpoints = checkpoints or BackfillCheckpoints()
+        self.max_retries = max_retries
+
+    def plan(self, tickers, start: datetime, end: datetime):
+        """
+        Return a list of (tickers, windows) groups skipping what the checkpoints already cover.
+        Tickers resuming from the same checkpoint share windows so they can be batched into one request.
+        """
+        by_start = dict()
+        for ticker in tickers:
+            checkpoint = self.checkpoints.get(ticker, self.timeframe)
+            curr_start = max(start, checkpoint) if checkpoint else start
+            by_start.setdefault(curr_start, []).append(ticker)
+
+        plan = []
+        for curr_start, group in by_start.items():
+            windows = []
+            while curr_start < end:
+                curr_end = min(curr_start + self.window, end)
+                windows.append((curr_start, curr_end))
+                curr_start = curr_end
+            if not windows:
+                continue
+            for i in range(0, len(group), self.batch_size):
+                plan.append((group[i:i + self.batch_size], windows))
+        return plan
+
+    def fetch_window(self, tickers, start: datetime, end: datetime):
+        """Fetch every page of bars for a batch of tickers in one window."""
+        data = dict()
+        pending = [(list(tickers), start)]
+        while pending:
+            symbols, page_start = pending.pop()
+            self.budget.acquire()
+            request = StockBarsRequest(
+                symbol_or_symbols=symbols,
+                start=page_start,
+                end=end,
+                timeframe=self.timeframe,
+                limit=self.page_limit,
+            )
+            response = self.client.get_stock_bars(request)
+            if response is None or not response.data:
+                continue
+            received = 0
+            for symbol, bars in response.data.items():
+                data.setdefault(symbol, []).extend(bars or [])
+                received += len(bars or [])
+            if received < self.page_limit:
+                continue
+            # the page is full: bars come sorted by symbol then time, so only the last symbol was cut short
+            # and the symbols after it have not been returned yet
+            last_symbol = max(symbol for symbol, bars in response.data.items() if bars)
+            remaining = [symbol for symbol in symbols if symbol > last_symbol]
+            if remaining:
+                pending.append((remaining, page_start))
+            pending.append(([last_symbol], data[last_symbol][-1].timestamp + timedelta(microseconds=1)))
+        return data
+
+    def _fetch_with_retries(self, tickers, start, end):
+        for attempt in range(self.max_retries + 1):
+            try:
+                return self.fetch_window(tickers, start, end)
+            except Exception as e:
+                if attempt == self.max_retries:
+                    raise
+                logger.warning("Retrying backfill for %r %r-%r attempt=%r", tickers, start, end, attempt + 1, exc_info=e)
+                time.sleep(2 ** attempt)
+
+    def run(self, tickers, start: datetime, end: datetime):
+        """Backfill [start, end) for every ticker. Returns a stats dict."""
+        plan = self.plan(tickers, start, end)
+        completed = [set() for _ in plan]
+        next_window = [0 for _ in plan]
+        stats = dict(windows=sum(len(windows) for _, windows in plan), failed=0, bars=0)
+        started_at = time.perf_counter()
+        requests_before = self.budget.requests_made
+
+        with ThreadPoolExecutor(max_workers=self.max_workers) as executor:
+            futures = {
+                executor.submit(self._fetch_with_retries, batch, w_start, w_end): (group, i)
+                for group, (batch, windows) in enumerate(plan)
+                for i, (w_start, w_end) in enumerate(windows)
+            }
+            for future in as_completed(futures):
+                group, i = futures[future]
+                batch, windows = plan[group]
+                try:
+                    data = future.result()
+                except Exception as e:
+                    stats["failed"] += 1
+                    logger.error("Backfill failed for %r window=%r", batch, windows[i], exc_info=e)
+                    continue
+                if data:
+                    self.on_data(data)
+                    stats["bars"] += sum(len(bars) for bars in data.values())
+                completed[group].add(i)
+                # advance the checkpoint over contiguous completed windows only
+                advanced = False
+                while next_window[group] in completed[group]:
+                    next_window[group] += 1
+                    advanced = True
+                if advanced:
+                    for ticker in batch:
+                        self.checkpoints.set(ticker, self.timeframe, windows[next_window[group] - 1][1])
+
+        stats["requests"] = self.budget.requests_made - requests_before
+        stats["seconds"] = time.perf_counter() - started_at
+        logger.info("Backfill complete: %r", stats)
+        return stats
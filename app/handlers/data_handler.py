@@ -1,6 +1,5 @@
 import asyncio
 import logging
-import time
 import duckdb
 from datetime import datetime, timedelta
 from alpaca.data.historical import StockHistoricalDataClient
@@ -8,18 +7,25 @@ from alpaca.data.live import StockDataStream
 from alpaca.data.enums import DataFeed
 from alpaca.data import StockBarsRequest, Bar
 from alpaca.data import TimeFrame
-from alpaca.trading import OrderSide
 import duckdb, logging
 import plotly.graph_objects as go
 import pandas as pd
 
+from app.handlers.backfill import BackfillEngine, RequestBudget
+from app.models.backtest_runs import downsample
+from app.models.bar_write_buffer import BarWriteBuffer
+from app.models.latest_bar_cache import LatestBarCache
+from app.utils import analytics
+from app.utils.bar_ingestion import BarIngestor
+
 
 logger = logging.getLogger("app")
 INITIAL_BALANCE = 30000
+EQUITY_CHART_POINTS = 2000  # the equity chart plots at most this many points however long the history
 
 
 class DataHandler():
-    def __init__(self, tickers, api_key, api_secret, db_base_path, timeframe=TimeFrame.Minute, is_backtest=False):
+    def __init__(self, tickers, api_key, api_secret, db_base_path, timeframe=TimeFrame.Minute, is_backtest=False, bar_store=None):
         super().__init__()
         self.tickers = tickers  # List of tickers to subscribe to
         self.db_base_path = db_base_path  # Base path for database files
@@ -29,6 +35,14 @@ class DataHandler():
         self.api_key = api_key
         self.api_secret = api_secret
         self.is_stream_subscribed = False
+        self.bar_store = bar_store  # optional consolidated BarStore, replaces the per-ticker db files
+        self.ingestor = BarIngestor(db_base_path=db_base_path, timeframe=timeframe, bar_store=bar_store)
+        self.request_budget = RequestBudget()  # shared by every backfill so the rate limit holds across calls
+        self.backfill_workers = 4
+        self.backfill_batch_size = len(tickers)  # tickers per backfill request, a catch-up window fits in one request
+        # streamed bars are batched across tickers and written by a background thread
+        self.write_buffer = BarWriteBuffer(self.ingestor, max_rows=500, flush_interval=1.0)
+        self.latest_bars = LatestBarCache()
 
     def fetch_data(self, start=None, end=None, days=1, use_most_recent=False):
         """
@@ -37,13 +51,17 @@ class DataHandler():
         end is the end date for the data fetch. If None, it defaults to the current date.
         days is the number of days to fetch data for. If None, it defaults to 1. start and end if specified will override this.
         use_most_recent is a flag to set start as the most recent candle data timestamp.
-        Iterates by the number of days specified in the `days` parameter.
+        The range is fetched in 1 day windows by a BackfillEngine, `backfill_batch_size` tickers per request.
         """
         end = datetime.now() if end is None else end
         start = end - timedelta(days=days) if start is None else start
         
         # set start value to the most recent candle timestamp
-        if use_most_recent:
+        if use_most_recent and self.bar_store is not None:
+            latest_bars = self.bar_store.get_latest_bars(self.tickers, self.timeframe)
+            if not latest_bars.empty:
+                start = latest_bars["timestamp"].min()
+        elif use_most_recent:
             # find the most recent candle timestart as `start``
             oldest_candle = None
             for ticker in self.tickers:
@@ -68,60 +86,62 @@ class DataHandler():
         
 
         try:
-            curr_start = start
-            curr_end = start + timedelta(days=1)
-            while curr_start <= end:
-                logger.info("Fetching data for tickers from %r to %r", curr_start, curr_end)
-                data = None
-                request = StockBarsRequest(
-                    symbol_or_symbols=self.tickers,
-                    start=curr_start,
-                    end=curr_end,
-                    timeframe=self.timeframe,
-                )
-                try:
-                    data = self.data_store.get_stock_bars(request)
-                except Exception as e:
-                    logger.error("Error fetching market data for ticker: %r", self.tickers, exc_info=e)
-                
-                if data is None or data.data is None:
-                    logger.info("No data received %r", data)
-                else:    
-                    logger.info("Data received for %r from %r to %r", self.tickers, curr_start, curr_end)
-                    self.save_market_data(data.data)
-                logger.info(f"Data saved for tickers")
-                curr_start = curr_end
-                curr_end = curr_start + timedelta(days=1)
+            logger.info("Fetching data for tickers from %r to %r", start, end)
+            engine = BackfillEngine(
+                self.data_store,
+                self.save_market_data,
+                timeframe=self.timeframe,
+                window=timedelta(days=1),
+                max_workers=self.backfill_workers,
+                batch_size=self.backfill_batch_size,
+                budget=self.request_budget,
+            )
+            engine.run(self.tickers, start, end)
+            logger.info(f"Data saved for tickers")
         except Exception as e:
             logger.error("Error fetching market data", exc_info=e)
             return None
         
     def fetch_most_recent_prices(self):
         """
-        Fetch the most recent candle data for the specified tickers.
+        Return {ticker: close} of the most recent candle for the specified tickers from the latest bar cache.
+        The cache is seeded from the databases on first use and kept current by the stream & ingestion paths.
+        In backtests the BacktestingSystem feeds the cache as it walks the candles.
         """
-        try:
-            ticker_to_price_map = dict()
-            for ticker in self.tickers:
-                connection = duckdb.connect(f"{self.db_base_path}/{ticker}_{self.timeframe}_data.db")
-                most_recent_candle_data = connection.sql(
-                    f"SELECT * FROM ticker_data ORDER BY timestamp DESC LIMIT 1"
-                ).df()
-                connection.close()
-                last_candle = most_recent_candle_data["timestamp"].iloc[0] if not most_recent_candle_data.empty else None
-                if last_candle:
-                    price = most_recent_candle_data["close"].iloc[0]
-                    ticker_to_price_map[ticker] = price
+        if not self.latest_bars.is_seeded:
+            self.seed_latest_bars()
+        return self.latest_bars.price_map(self.tickers)
 
-        except Exception as e:
-            logger.error("Error fetching most recent prices", exc_info=e)
-            return None
-        
-        return ticker_to_price_map
+    def seed_latest_bars(self):
+        """Load the most recent candle of every ticker into the latest bar cache."""
+        if self.is_backtest:
+            # the most recent bars on disk lie in the future of a backtest's clock
+            self.latest_bars.is_seeded = True
+            return
+        if self.bar_store is not None:
+            self.latest_bars.seed(self.bar_store.get_latest_bars(self.tickers, self.timeframe))
+            return
+        latest_bars = []
+        for ticker in self.tickers:
+            try:
+                connection = duckdb.connect(f"{self.db_base_path}/{ticker}_{self.timeframe}_data.db")
+                try:
+                    latest_bars.append(connection.sql(
+                        f"SELECT * FROM ticker_data ORDER BY timestamp DESC LIMIT 1"
+                    ).df())
+                finally:
+                    connection.close()
+            except Exception as e:
+                logger.error("Error fetching most recent price for %r", ticker, exc_info=e)
+        latest_bars = [df for df in latest_bars if not df.empty]
+        self.latest_bars.seed(pd.concat(latest_bars, ignore_index=True) if latest_bars else pd.DataFrame())
     
     def get_backtest_data(self):
         data = dict()
         for ticker in self.tickers:
+            if self.bar_store is not None:
+                data[ticker] = self.bar_store.get_ticker_data(ticker, self.timeframe)
+                continue
             conn_str = f"{self.db_base_path}/{ticker}_{self.timeframe.__str__()}_data.db"
             conn = duckdb.connect(conn_str, read_only=True)
             ticker_data = conn.sql(f"SELECT * FROM ticker_data ORDER BY timestamp ASC").df()
@@ -131,7 +151,10 @@ class DataHandler():
     
 
     def generate_equity_curve_chart(self):
-        """Generates an equity curve from trade history stored in trades.db."""
+        """
+        Generates an equity curve from the trade history stored in trades.db, marked to market on the bars of every
+        traded ticker, titled with its drawdown, Sharpe ratio and win rate.
+        """
         
         # Connect to DuckDB and fetch trade history
         if self.is_backtest:
@@ -139,7 +162,7 @@ class DataHandler():
         else:
             conn_str = f"{self.db_base_path}/trades.db"
         query = """
-            SELECT timestamp, ticker, action as side, price, qty as quantity 
+            SELECT timestamp, ticker, action as side, price, qty, strategy
             FROM trades 
             ORDER BY timestamp ASC
         """
@@ -149,25 +172,21 @@ class DataHandler():
         if df.empty:
             return "<p class='text-gray-400'>No trade data available.</p>"
 
-        # Ensure timestamps are in datetime format
-        df["timestamp"] = pd.to_datetime(df["timestamp"])
-
-        # Calculate realized P&L
-        equity = INITIAL_BALANCE
-        equity_curve = []
-        
-        for index, row in df.iterrows():
-            trade_value = row["price"] * row["quantity"]
-            
-            if row["side"] is OrderSide.BUY:
-                equity -= trade_value  # Deduct cost of purchase
-            elif row["side"] is OrderSide.SELL:
-                equity += trade_value  # Add revenue from sale
-            
-            equity_curve.append((row["timestamp"], equity))
-
-        # Convert to DataFrame
-        equity_df = pd.DataFrame(equity_curve, columns=["timestamp", "equity"])
+        # every traded ticker's closes since the first trade, to mark its positions between trades
+        start = pd.to_datetime(df["timestamp"]).min()
+        prices = dict()
+        for ticker in df["ticker"].unique():
+            bars = self.get_historical_data(ticker, start, datetime.now())
+            if bars is not None and not bars.empty:
+                prices[ticker] = (bars["timestamp"].values, bars["close"].values)
+        report = analytics.performance_report(df, prices, INITIAL_BALANCE)
+        metrics = report["metrics"]
+        equity_df = report["equity"].iloc[downsample(len(report["equity"]), EQUITY_CHART_POINTS)]
+        summary = [f"max drawdown {metrics['max_drawdown']:.1%}"]
+        if metrics["sharpe"] is not None:
+            summary.append(f"Sharpe {metrics['sharpe']:.2f}")
+        if metrics["win_rate"] is not None:
+            summary.append(f"win rate {metrics['win_rate']:.0%}")
 
         # Generate the Plotly chart
         fig = go.Figure()
@@ -182,7 +201,7 @@ class DataHandler():
         # Chart layout settings
         fig.update_layout(
             template="plotly_dark",
-            title="Account Equity Curve",
+            title=f"Account Equity Curve ({', '.join(summary)})",
             xaxis_title="Time",
             yaxis_title="Equity",
             plot_bgcolor="black",
@@ -198,6 +217,9 @@ class DataHandler():
         """
         Fetch historical data for the specified ticker and timeframe.
         """
+        if self.bar_store is not None:
+            # both ends inclusive, like the per-ticker db query below
+            return self.bar_store.get_ticker_data(ticker, self.timeframe, start=start, end=end, end_inclusive=True)
         conn = duckdb.connect(f"{self.db_base_path}/{ticker}_{self.timeframe.__str__()}_data.db")
         query = f"SELECT * FROM ticker_data WHERE timestamp >= '{start}' AND timestamp <= '{end}' ORDER BY timestamp ASC"
         try:
@@ -212,7 +234,7 @@ class DataHandler():
 
     async def handle_stream_bar_data(self, bar: Bar):
         """
-        Process incoming bar and update ticker_data OHLC
+        Process incoming bar and queue it in the write-behind buffer.
         """
         symbol = bar.symbol
         timestamp = bar.timestamp
@@ -223,9 +245,9 @@ class DataHandler():
         else:
             logger.info('received bar for {}: {}'.format(symbol, timestamp))
 
-        value_str = f"('{timestamp}', '{symbol}', {bar.open}, {bar.high}, {bar.low}, {bar.close}, {bar.volume}, {bar.vwap})"
-        logger.info('saving values for %r @ %r', symbol, timestamp)
-        self.save_to_db(symbol, [value_str])
+        logger.debug('buffering values for %r @ %r', symbol, timestamp)
+        self.write_buffer.add(symbol, bar)
+        self.latest_bars.update_from_bar(bar)
 
 
     def query_duckdb_db(self, conn_str, query):
@@ -242,50 +264,26 @@ class DataHandler():
         return df
 
     def save_market_data(self, data: dict):
-        for ticker in data.keys():
-            ticker_data = data.get(ticker, [])
-            value_strs = []
-            for row in ticker_data:
-                value_str = f"('{row.timestamp}', '{ticker}', {row.open}, {row.high}, {row.low}, {row.close}, {row.volume}, {row.vwap})"
-                logger.debug("candle values for %r: %r", ticker, value_str)
-                value_strs.append(value_str)
-            self.save_to_db(ticker, value_strs)
-            
-            logger.info('Data saved for ticker %r', ticker)
-
-    def save_to_db(self, ticker, value_strs, retries=1):
-        if len(value_strs) == 1:
-            value_str = value_strs[0]
-        else:
-            value_str = ", ".join(value_strs)
-        db_path = f"{self.db_base_path}/{ticker}_{self.timeframe.__str__()}_data.db"
-        conn = duckdb.connect(db_path)
-        should_retry = False
-        try:
-            conn.execute(f"INSERT OR IGNORE INTO ticker_data VALUES {value_str}")
-        except Exception as e:
-            if retries > 0:
-                should_retry = True
-            else:
-                logger.error(f"Error saving data to database: {e}")
-        finally:
-            conn.close()
-            if should_retry:
-                time.sleep(1)
-                logger.info("Retrying save to db for %r", ticker)
-                self.save_to_db(ticker, value_strs, retries=retries-1)
-
+        """Save `BarSet.data` with one vectorized upsert per ticker per chunk."""
+        frames = self.ingestor.ingest_barset(data)
+        for ticker, frame in frames.items():
+            self.latest_bars.update_from_frame(ticker, frame)
+            logger.info('Data saved for ticker %r rows=%r', ticker, len(frame))
+        return frames
 
     def shutdown(self):
         if self.is_stream_subscribed:
             self.stream_task.cancel()
             self.is_stream_subscribed = False
             logger.info("Unsubscribed from data stream")
+        self.write_buffer.stop()
 
     async def subscribe_to_data_stream(self):
         """Start the Alpaca WebSocket data stream asynchronously inside FastAPI's event loop."""
         stream = StockDataStream(api_key=self.api_key, secret_key=self.api_secret, feed=DataFeed.IEX)
 
+        self.write_buffer.start()
+
         # Subscribe to real-time quote updates
         stream.subscribe_bars(self.handle_stream_bar_data, *self.tickers)
 
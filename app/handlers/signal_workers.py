@@ -0,0 +1,163 @@
+import copy
+import logging
+import time
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from multiprocessing import get_context
+from multiprocessing.shared_memory import SharedMemory
+
+import numpy as np
+import pandas as pd
+
+from app.models.bar_aggregator import BarAggregator
+from app.models.reference_series import ReferenceSeries, get_reference_cache
+
+logger = logging.getLogger("app")
+
+
+def generate_ticker_signals(strategies, ticker, ticker_data, now, precomputed=None):
+    """
+    Run every strategy due at the latest candle on its own lookback window of a ticker's candles.
+    Strategies in `precomputed` ({name: signal}) take that signal instead, `ticker_data` may be None when all do.
+    Returns the last actionable signal.
+    """
+    signal = None
+    precomputed = precomputed or dict()
+    timestamp = ticker_data['timestamp'].iloc[-1] if ticker_data is not None else None
+    for name, strategy in strategies.items():
+        if name in precomputed:
+            if precomputed[name] is not None and precomputed[name].action is not None:
+                signal = precomputed[name]
+            continue
+        if ticker_data is None or not strategy.is_due(timestamp):
+            continue
+        # each strategy only sees its own lookback window of the loaded candles
+        strategy_window = strategy.history_window()
+        first_index = 0 if strategy_window is None else ticker_data['timestamp'].searchsorted(now - strategy_window)
+        strategy_data = ticker_data.iloc[first_index:]
+        if strategy_data.empty or not strategy.is_warm(strategy_data):
+            continue
+        strategy_signal = strategy.generate_signal(ticker, strategy_data)
+        if strategy_signal is not None and strategy_signal.action is not None:
+            logger.debug("Signal generated for %r: %r", ticker, strategy_signal)
+            signal = strategy_signal
+    return signal
+
+
+def share_frame(frame: pd.DataFrame):
+    """
+    Copy a frame's timestamps and numeric columns into one shared memory block.
+    Returns the block, which the caller must unlink, and a small picklable descriptor to attach to it.
+    """
+    columns = [column for column in frame.columns if column != 'timestamp' and pd.api.types.is_numeric_dtype(frame[column])]
+    rows = len(frame)
+    block = SharedMemory(create=True, size=max(8, 8 * rows * (len(columns) + 1)))
+    timestamps = np.ndarray((rows,), dtype=np.int64, buffer=block.buf)
+    timestamps[:] = frame['timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+    values = np.ndarray((len(columns), rows), dtype=np.float64, buffer=block.buf, offset=8 * rows)
+    for i, column in enumerate(columns):
+        values[i] = frame[column].to_numpy(dtype=np.float64)
+    return block, {"name": block.name, "rows": rows, "columns": columns}
+
+
+def attach_frame(descriptor) -> pd.DataFrame:
+    """Rebuild a frame shared with `share_frame`. The data is copied out so the block can be closed right away."""
+    block = SharedMemory(name=descriptor["name"])
+    try:
+        rows, columns = descriptor["rows"], descriptor["columns"]
+        timestamps = np.ndarray((rows,), dtype=np.int64, buffer=block.buf)
+        values = np.ndarray((len(columns), rows), dtype=np.float64, buffer=block.buf, offset=8 * rows)
+        frame = pd.DataFrame({"timestamp": timestamps.view('datetime64[ns]').copy()})
+        for i, column in enumerate(columns):
+            frame[column] = values[i].copy()
+        del timestamps, values
+        return frame
+    finally:
+        block.close()
+
+
+_worker_strategies = None
+
+
+def _init_worker(strategies):
+    global _worker_strategies
+    _worker_strategies = strategies
+
+
+def _evaluate_ticker(ticker, frame_descriptor, vxx_descriptor, now, states, precomputed):
+    frame = attach_frame(frame_descriptor)
+    for strategy in _worker_strategies.values():
+        if strategy.bar_aggregator is not None:
+            # all strategies share one aggregator, seeding it from the shipped candles is a few vectorized reductions
+            strategy.bar_aggregator.reset(ticker)
+            strategy.bar_aggregator.update_from_frame(ticker, frame)
+            break
+    if vxx_descriptor is not None:
+        vxx = attach_frame(vxx_descriptor)
+        for strategy in _worker_strategies.values():
+            if strategy.uses_vxx:
+                series = ReferenceSeries('vxx', lambda start=None: vxx if start is None else vxx[vxx['timestamp'] >= start])
+                get_reference_cache().install(strategy.vxx_key(), series)
+    for name, state in states.items():
+        _worker_strategies[name].set_ticker_state(ticker, state)
+
+    started_at = time.perf_counter()
+    signal = generate_ticker_signals(_worker_strategies, ticker, frame, now, precomputed=precomputed)
+    seconds = time.perf_counter() - started_at
+    states = {name: strategy.get_ticker_state(ticker) for name, strategy in _worker_strategies.items()}
+    return ticker, signal, states, seconds
+
+
+class SignalWorkerPool:
+    """
+    Evaluates tickers in a pool of worker processes, sidestepping the GIL held by the pandas/scipy work.
+    Each worker holds a copy of the strategies made when the pool starts. Candles are shipped through shared
+    memory instead of pickled DataFrames, and every ticker's strategy state travels with its task and comes back
+    with its result, so a ticker gets the same signals whichever process evaluates it.
+    """
+    def __init__(self, strategies, max_workers=4):
+        self.strategy_names = list(strategies.keys())
+        self.max_workers = max_workers
+        worker_strategies = dict()
+        worker_aggregator = None
+        for name, strategy in strategies.items():
+            # connections stay behind and workers aggregate the candles they are sent with an aggregator of their own
+            worker_strategy = copy.copy(strategy)
+            worker_strategy.bar_store = None
+            if strategy.bar_aggregator is not None:
+                worker_aggregator = worker_aggregator or BarAggregator(strategy.bar_aggregator.intervals)
+                worker_strategy.bar_aggregator = worker_aggregator
+            worker_strategies[name] = worker_strategy
+        self.executor = ProcessPoolExecutor(
+            max_workers=max_workers,
+            mp_context=get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(worker_strategies,),
+        )
+
+    def run(self, strategies, ticker_data: dict, now, vxx_data: pd.DataFrame = None, precomputed: dict = None):
+        """Evaluate every ticker and yield (ticker, signal, seconds), restoring each ticker's strategy state."""
+        blocks = []
+        try:
+            vxx_descriptor = None
+            if vxx_data is not None:
+                block, vxx_descriptor = share_frame(vxx_data)
+                blocks.append(block)
+            futures = []
+            for ticker, data in ticker_data.items():
+                block, descriptor = share_frame(data)
+                blocks.append(block)
+                states = {name: strategy.get_ticker_state(ticker) for name, strategy in strategies.items()}
+                ticker_precomputed = (precomputed or dict()).get(ticker)
+                futures.append(self.executor.submit(_evaluate_ticker, ticker, descriptor, vxx_descriptor, now, states, ticker_precomputed))
+            for future in as_completed(futures):
+                ticker, signal, states, seconds = future.result()
+                for name, state in states.items():
+                    strategies[name].set_ticker_state(ticker, state)
+                yield ticker, signal, seconds
+        finally:
+            for block in blocks:
+                block.close()
+                block.unlink()
+
+    def close(self):
+        self.executor.shutdown(wait=True, cancel_futures=True)
@@ -1,6 +1,11 @@
 import duckdb
 import logging
+import time
+import pandas as pd
+from datetime import datetime, timedelta, timezone
 
+from app.handlers.signal_workers import SignalWorkerPool, generate_ticker_signals
+from app.models.bar_aggregator import BarAggregator
 from app.models.signal import Signal
 from app.strategies.base import get_ticker_data, get_ticker_data_by_timeframe
 from app.strategies.market_profile_strategy import MarketProfileStrategy
@@ -14,46 +19,222 @@ logger = logging.getLogger("app")
 
 
 class StrategyHandler():
-    def __init__(self, tickers, db_base_path="dbs", timeframe=TimeFrame.Minute):
+    def __init__(self, tickers, db_base_path="dbs", timeframe=TimeFrame.Minute, bar_store=None, workers=0):
         super().__init__()
         self.db_base_path = db_base_path
         self.tickers = tickers
         self.timeframe = timeframe
-        self.markov_prediction = MarkovPredictionStrategy(db_base_path=self.db_base_path)
+        self.bar_store = bar_store
+        self.workers = workers  # worker processes evaluating tickers in parallel, 0 evaluates them in this process
+        self.worker_pool = None
+        self.ticker_timings = dict()  # seconds spent generating each ticker's signal on the last call
+        # {strategy name: {ticker: signals}} computed for a whole backtest at once, see `vectorize_backtest`
+        self.vectorized_signals = dict()
+        self.backtest_engine = None  # BacktestDataEngine serving in-memory candles while a backtest runs
+        # higher timeframe bars shared by every strategy, fed with the candles handed to them
+        self.bar_aggregator = BarAggregator()
+        self.markov_prediction = MarkovPredictionStrategy(db_base_path=self.db_base_path, bar_store=self.bar_store, model_dir=f"{self.db_base_path}/markov_models")
         self.market_profile_strategy = MarketProfileStrategy(timeframe=self.timeframe)
         self.support_resistance_strategy = SupportResistanceStrategy()
         self.trend_following_strategy = TrendFollowingStrategy()
+        for strategy in [self.markov_prediction, self.market_profile_strategy, self.support_resistance_strategy, self.trend_following_strategy]:
+            strategy.bar_aggregator = self.bar_aggregator
         self.strategies = {
             'support_resistance': self.support_resistance_strategy,
             # 'markov': self.markov_prediction,
             # 'market_profile': self.market_profile_strategy
         }
 
+    def select_strategies(self, names):
+        """Make the named strategies the active ones, e.g. to backtest a single strategy."""
+        available = {strategy.name: strategy for strategy in [self.markov_prediction, self.market_profile_strategy, self.support_resistance_strategy, self.trend_following_strategy]}
+        unknown = [name for name in names if name not in available]
+        if unknown:
+            raise ValueError(f"Unknown strategies {unknown}, expected any of {sorted(available)}")
+        self.strategies = {name: available[name] for name in names}
+
+    def history_window(self, strategies=None):
+        """The union of the strategies' lookback windows (all active ones by default), None when any needs the full history."""
+        strategies = self.strategies.values() if strategies is None else strategies
+        windows = [strategy.history_window() for strategy in strategies]
+        if not windows or any(window is None for window in windows):
+            return None
+        return max(windows)
+
+    def last_candle_timestamp(self, ticker, end=None):
+        """The timestamp of the latest candle before `end` strategies would be handed, None when there is none."""
+        if self.backtest_engine is not None and end is not None and ticker in self.backtest_engine:
+            return self.backtest_engine.last_timestamp(ticker, end)
+        if self.bar_store is not None:
+            return self.bar_store.get_last_timestamp(ticker, self.timeframe, end=end)
+        connection = duckdb.connect(f"{self.db_base_path}/{ticker}_{self.timeframe}_data.db")
+        try:
+            query = "SELECT max(timestamp) FROM ticker_data"
+            params = []
+            if end is not None:
+                query += " WHERE timestamp < ?"
+                params.append(end)
+            last = connection.execute(query, params).fetchone()[0]
+        finally:
+            connection.close()
+        return None if last is None else pd.Timestamp(last)
+
+    def load_ticker_data(self, ticker, end=None, start=None):
+        """Load a ticker's candles in [start, end), pushing the time predicate down to DuckDB."""
+        if self.backtest_engine is not None and end is not None and ticker in self.backtest_engine:
+            return self.backtest_engine.window(ticker, end=end, start=start)
+        if self.bar_store is not None:
+            return self.bar_store.get_ticker_data(ticker, self.timeframe, start=start, end=end)
+        connection = duckdb.connect(f"{self.db_base_path}/{ticker}_{self.timeframe}_data.db")
+        try:
+            if end is not None:
+                logger.debug("get backtest data: %r", end)
+                return get_ticker_data_by_timeframe(ticker, connection, timeframe=self.timeframe, db_base_path=self.db_base_path, end=end, start=start)
+            return get_ticker_data(ticker, connection, timeframe=self.timeframe, db_base_path=self.db_base_path, start=start)
+        finally:
+            connection.close()
+
     def generate_signals(self, is_backtest=False, backtest_data=None):
         signal_data = dict()
+        end = backtest_data['end'] if is_backtest else None
+        # stored candles are naive UTC
+        now = end if is_backtest else datetime.now(timezone.utc).replace(tzinfo=None)
 
-        for ticker in self.tickers:
+        ticker_data = dict()
+        precomputed = dict()
+        # a backtest step names the tickers with a new candle, the others can't have a new signal
+        tickers = backtest_data.get('tickers', self.tickers) if is_backtest else self.tickers
+        for ticker in tickers:
             if ticker in ['VXX']:
                 continue
-            connection = duckdb.connect(f"{self.db_base_path}/{ticker}_{self.timeframe}_data.db")
-            if is_backtest:
-                logger.debug("get backtest data: %r", backtest_data.get('end'))
-                ticker_data = get_ticker_data_by_timeframe(ticker, connection, timeframe=self.timeframe, db_base_path=self.db_base_path, end=backtest_data['end'])
-                # logger.info(f"Backtest data for {ticker}: {ticker_data.head()}")
-            else:
-                ticker_data = get_ticker_data(ticker, connection, timeframe=self.timeframe, db_base_path=self.db_base_path)    
-                logger.debug('most recent ticker %r timestamp: %r', ticker, ticker_data['timestamp'].iloc[-1])
-            connection.close()
-            for strategy in self.strategies.values():
-                if ticker_data.empty:
-                    continue
-                signal: Signal = strategy.generate_signal(ticker, ticker_data)
-                if signal is not None and signal.action is not None:
-                    logger.debug("Signal generated for %r: %r", ticker, signal)
-                    signal_data[ticker] = signal
-            
+            # strategies act on the latest candle, only the ones due at it need the ticker's history loaded
+            last_timestamp = self.last_candle_timestamp(ticker, end=end)
+            if last_timestamp is None:
+                continue
+            due = {name: strategy for name, strategy in self.strategies.items() if strategy.is_due(last_timestamp)}
+            if not due:
+                logger.debug("No strategy due for %r at %r, skipping", ticker, last_timestamp)
+                continue
+            precomputed[ticker] = self.precomputed_signals(ticker, end, due)
+            pending = [strategy for name, strategy in due.items() if name not in precomputed[ticker]]
+            if not pending:
+                ticker_data[ticker] = None
+                continue
+            window = self.history_window(pending)
+            start = now - window if window is not None else None
+            data = self.load_ticker_data(ticker, end=end, start=start)
+            if data.empty:
+                continue
+            first_timestamp = self.bar_aggregator.first_timestamp(ticker)
+            if first_timestamp is not None and data['timestamp'].iloc[0] < first_timestamp:
+                # a strategy with a longer lookback came due, rebuild the ticker's bars from the longer history
+                self.bar_aggregator.reset(ticker)
+            self.bar_aggregator.update_from_frame(ticker, data)
+            logger.debug('most recent ticker %r timestamp: %r', ticker, data['timestamp'].iloc[-1])
+            ticker_data[ticker] = data
+
+        started_at = time.perf_counter()
+        self.ticker_timings = dict()
+        signals = dict()
+        loaded = {ticker: data for ticker, data in ticker_data.items() if data is not None}
+        if self.workers > 0 and len(loaded) > 1:
+            vxx_data = self.shared_vxx_data(now)
+            for ticker, signal, seconds in self.get_worker_pool().run(self.strategies, loaded, now, vxx_data=vxx_data, precomputed=precomputed):
+                self.ticker_timings[ticker] = seconds
+                signals[ticker] = signal
+        for ticker, data in ticker_data.items():
+            if ticker in signals:
+                continue
+            ticker_started_at = time.perf_counter()
+            signals[ticker] = generate_ticker_signals(self.strategies, ticker, data, now, precomputed=precomputed.get(ticker))
+            self.ticker_timings[ticker] = time.perf_counter() - ticker_started_at
+        if self.ticker_timings:
+            slowest = max(self.ticker_timings, key=self.ticker_timings.get)
+            logger.debug("Generated signals for %r tickers in %.3fs, slowest %r took %.3fs",
+                         len(self.ticker_timings), time.perf_counter() - started_at, slowest, self.ticker_timings[slowest])
+        # in ticker order whichever process finished first
+        for ticker in ticker_data:
+            if signals[ticker] is not None:
+                signal_data[ticker] = signals[ticker]
         return signal_data
 
+    def vectorize_backtest(self, ends, tickers=None):
+        """
+        Precompute the signals of the strategies with a vectorized whole-history mode at every backtest clock time in
+        `ends` for `tickers` (every ticker when None). `generate_signals` looks them up instead of evaluating those
+        strategies candle by candle.
+        """
+        self.vectorized_signals = dict()
+        ends = pd.DatetimeIndex(ends)
+        if self.backtest_engine is None or ends.empty:
+            return
+        started_at = time.perf_counter()
+        # the candles the bar aggregator is seeded with when the backtest starts
+        window = self.history_window()
+        start = ends[0] - window if window is not None else None
+        for name, strategy in self.strategies.items():
+            for ticker in tickers or self.tickers:
+                if ticker in ['VXX'] or ticker not in self.backtest_engine:
+                    continue
+                signals = strategy.generate_signals_vectorized(ticker, self.backtest_engine.window(ticker, start=start), ends)
+                if signals is None:
+                    break
+                self.vectorized_signals.setdefault(name, dict())[ticker] = signals
+        if self.vectorized_signals:
+            logger.info("Vectorized %r signals over %r clock times in %.2fs",
+                        list(self.vectorized_signals.keys()), len(ends), time.perf_counter() - started_at)
+
+    def precomputed_signals(self, ticker, end, strategies: dict):
+        """{name: signal or None} of the `strategies` with a vectorized signal at `end`."""
+        precomputed = dict()
+        if end is None:
+            return precomputed
+        for name, strategy in strategies.items():
+            signals = self.vectorized_signals.get(name, dict()).get(ticker)
+            if signals is None:
+                continue
+            row = signals.index.searchsorted(end)
+            if row == len(signals) or signals.index[row] != end:
+                continue
+            action = signals['action'].values[row]
+            if action is None:
+                precomputed[name] = None
+                continue
+            signal = Signal(strategy=strategy.name, ticker=ticker, price=signals['price'].values[row],
+                            reason=signals['reason'].values[row], direction='long')
+            signal.action = action
+            for column in ['direction', 'stop_loss', 'take_profit']:
+                if column in signals.columns and not pd.isna(signals[column].values[row]):
+                    setattr(signal, column, signals[column].values[row])
+            precomputed[name] = signal
+        return precomputed
+
+    def shared_vxx_data(self, now):
+        """
+        The VXX closes to ship to the workers, None when no active strategy reads them. Only the rows the strategies
+        can look up are sent: from their lookback window's start up to the minute of `now`.
+        """
+        vxx_strategies = [strategy for strategy in self.strategies.values() if strategy.uses_vxx]
+        if not vxx_strategies:
+            return None
+        series = vxx_strategies[0].vxx_series()
+        series.refresh(now)
+        window = self.history_window(vxx_strategies)
+        return series.frame(end=now + timedelta(minutes=1), start=now - window if window is not None else None)
+
+    def get_worker_pool(self) -> SignalWorkerPool:
+        # workers copy the strategies when they start, so the pool is rebuilt when the active strategies change
+        if self.worker_pool is not None and self.worker_pool.strategy_names != list(self.strategies.keys()):
+            self.close()
+        if self.worker_pool is None:
+            self.worker_pool = SignalWorkerPool(self.strategies, max_workers=self.workers)
+        return self.worker_pool
+
+    def close(self):
+        if self.worker_pool is not None:
+            self.worker_pool.close()
+            self.worker_pool = None
+
     def get_strategies(self):
         strategies = [strat.to_dict() for strat in self.strategies.values()]
         return strategies
\ No newline at end of file
@@ -0,0 +1,55 @@
+import gzip
+import logging
+import os
+import pickle
+
+logger = logging.getLogger("app")
+
+CHECKPOINT_VERSION = 1
+
+
+class BacktestCheckpoint:
+    """
+    Everything a backtest needs to continue from clock step `candle_index` as if it had never stopped:
+    the simulated account, the trades & equity so far, every strategy's and the bar aggregator's per ticker state,
+    the step the backtest started at, the day it is in and its run record. `clock_size` & `clock_end` identify the candles it was
+    taken on, resuming on other candles is refused.
+    Saved as a gzipped pickle, written to a temporary file first so a crash mid-write keeps the previous checkpoint.
+    """
+    def __init__(self, candle_index, first_candle_index, tickers, clock_size, clock_end, curr_date, day_start, account,
+                 trade_results, equity_curve, strategy_states, aggregator_states, run=None):
+        self.version = CHECKPOINT_VERSION
+        self.candle_index = candle_index
+        self.first_candle_index = first_candle_index
+        self.tickers = tickers
+        self.clock_size = clock_size
+        self.clock_end = clock_end
+        self.curr_date = curr_date  # the day of the last candle replayed
+        self.day_start = day_start  # the first candle of that day
+        self.account = account  # PositionManager.get_backtest_state()
+        self.trade_results = trade_results
+        self.equity_curve = equity_curve
+        self.strategy_states = strategy_states  # {strategy name: {ticker: state}}
+        self.aggregator_states = aggregator_states  # {ticker: state}
+        self.run = run  # BacktestingSystem.run, so the resumed backtest is stored as the same run
+
+    def matches(self, clock):
+        return self.tickers == clock.tickers and self.clock_size == len(clock) and self.clock_end == clock.timestamp(len(clock) - 1)
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with gzip.open(tmp_path, "wb", compresslevel=3) as f:
+            pickle.dump(self, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+        logger.debug("Backtest checkpoint saved at candle %r to %r", self.candle_index, path)
+
+    @classmethod
+    def load(cls, path):
+        """The checkpoint saved at `path`, None when there is none."""
+        if not os.path.exists(path):
+            return None
+        with gzip.open(path, "rb") as f:
+            checkpoint = pickle.load(f)
+        if getattr(checkpoint, "version", None) != CHECKPOINT_VERSION:
+            raise ValueError(f"Unsupported backtest checkpoint version in {path}")
+        return checkpoint
@@ -0,0 +1,159 @@
+import logging
+import os
+from datetime import datetime
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+BACKTEST_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume", "vwap"]
+PRICE_COLUMNS = BACKTEST_COLUMNS[1:]
+
+
+class BacktestDataEngine:
+    """
+    Holds every ticker's backtest candles in memory, loaded once when the backtest starts.
+    Each ticker is one timestamp-sorted frame whose price columns share a single contiguous float64 block,
+    so `window` is a binary search plus a row slice: a view of the loaded candles instead of a DuckDB re-read
+    of everything before the backtest clock.
+    Callers must treat windows as read-only, they share memory with the engine.
+    """
+    def __init__(self, data: dict):
+        self.frames = dict()
+        self.timestamps = dict()
+        for ticker, ticker_data in data.items():
+            if ticker == "end":
+                continue
+            frame = self._to_frame(ticker_data)
+            self.frames[ticker] = frame
+            self.timestamps[ticker] = frame["timestamp"].values
+        logger.info("Backtest data engine loaded %r candles for %r tickers", sum(len(f) for f in self.frames.values()), len(self.frames))
+
+    def _to_frame(self, ticker_data):
+        """Normalize raw candles (a DataFrame or a dict of columns) into the engine's sorted, contiguous layout."""
+        raw = pd.DataFrame(ticker_data).sort_values("timestamp", kind="stable")
+        # one row per column so each column is contiguous inside the frame's float block
+        prices = np.empty((len(PRICE_COLUMNS), len(raw)), dtype=np.float64)
+        for i, column in enumerate(PRICE_COLUMNS):
+            prices[i] = raw[column].to_numpy(dtype=np.float64) if column in raw.columns else np.nan
+        return self._wrap(pd.to_datetime(raw["timestamp"]).to_numpy(), prices)
+
+    @staticmethod
+    def _wrap(timestamps, prices):
+        """A frame over a (len(PRICE_COLUMNS), rows) price block without copying it."""
+        frame = pd.DataFrame(prices.T, columns=PRICE_COLUMNS, copy=False)
+        frame.insert(0, "timestamp", timestamps)
+        return frame
+
+    def save(self, directory):
+        """Write every ticker's candles as `.npy` files that `load` can memory map."""
+        os.makedirs(directory, exist_ok=True)
+        for ticker, frame in self.frames.items():
+            np.save(os.path.join(directory, f"{ticker}_timestamps.npy"), self.timestamps[ticker].astype("datetime64[ns]"))
+            np.save(os.path.join(directory, f"{ticker}_prices.npy"), np.ascontiguousarray(frame[PRICE_COLUMNS].to_numpy().T))
+
+    @classmethod
+    def load(cls, directory, tickers=None) -> "BacktestDataEngine":
+        """
+        An engine over candles written by `save`. The price blocks are read-only memory maps, so every process
+        loading the same directory shares one copy of them through the page cache.
+        """
+        engine = cls(dict())
+        suffix = "_timestamps.npy"
+        names = sorted(name[:-len(suffix)] for name in os.listdir(directory) if name.endswith(suffix))
+        for ticker in names:
+            if tickers is not None and ticker not in tickers:
+                continue
+            timestamps = np.load(os.path.join(directory, f"{ticker}{suffix}"))
+            prices = np.load(os.path.join(directory, f"{ticker}_prices.npy"), mmap_mode="r")
+            engine.frames[ticker] = cls._wrap(timestamps, prices)
+            engine.timestamps[ticker] = engine.frames[ticker]["timestamp"].values
+        logger.info("Backtest data engine mapped %r candles for %r tickers", sum(len(f) for f in engine.frames.values()), len(engine.frames))
+        return engine
+
+    def __contains__(self, ticker):
+        return ticker in self.frames
+
+    @property
+    def tickers(self):
+        return list(self.frames.keys())
+
+    def frame(self, ticker) -> pd.DataFrame:
+        return self.frames[ticker]
+
+    def index_of(self, ticker, end: datetime, side="left"):
+        """The number of candles strictly before `end` (or at or before it with side='right')."""
+        return int(np.searchsorted(self.timestamps[ticker], np.datetime64(end), side=side))
+
+    def window(self, ticker, end: datetime = None, start: datetime = None) -> pd.DataFrame:
+        """Candles in [start, end) as a row slice of the loaded frame, matching `get_ticker_data_by_timeframe`."""
+        first = 0 if start is None else self.index_of(ticker, start)
+        last = len(self.timestamps[ticker]) if end is None else self.index_of(ticker, end)
+        return self.frames[ticker].iloc[first:last]
+
+    def arrays(self, ticker, end: datetime = None, start: datetime = None) -> dict:
+        """Like `window` but returns {column: numpy view} for code that works on raw arrays."""
+        first = 0 if start is None else self.index_of(ticker, start)
+        last = len(self.timestamps[ticker]) if end is None else self.index_of(ticker, end)
+        frame = self.frames[ticker]
+        return {column: frame[column].values[first:last] for column in BACKTEST_COLUMNS}
+
+    def last_timestamp(self, ticker, end: datetime):
+        """The timestamp of the most recent candle before `end`, None if there is none."""
+        index = self.index_of(ticker, end) - 1
+        return None if index < 0 else pd.Timestamp(self.timestamps[ticker][index])
+
+    def last_candle(self, ticker, end: datetime):
+        """The most recent candle before `end` as a dict, None if there is none."""
+        index = self.index_of(ticker, end) - 1
+        if index < 0:
+            return None
+        frame = self.frames[ticker]
+        return {column: frame[column].values[index] for column in BACKTEST_COLUMNS}
+
+    def clock(self, tickers=None) -> "BacktestClock":
+        """One event clock over the candles of `tickers` (every ticker when None)."""
+        tickers = [ticker for ticker in (tickers or self.tickers) if ticker in self.frames]
+        stamps = [self.timestamps[ticker].astype("datetime64[ns]").astype(np.int64) for ticker in tickers]
+        owners = [np.full(len(s), i, dtype=np.int32) for i, s in enumerate(stamps)]
+        rows = [np.arange(len(s), dtype=np.int64) for s in stamps]
+        return BacktestClock(tickers, stamps, owners, rows)
+
+
+class BacktestClock:
+    """
+    Every candle of several tickers merged into one time-ordered stream of events.
+    The per-ticker timestamps are already sorted, so a stable sort of their concatenation is a k-way merge of k runs.
+    `timestamps` holds each distinct candle time once, and the events at `timestamps[i]` are
+    `owners[offsets[i]:offsets[i + 1]]` (an index into `tickers`) with the candle's row in that ticker's frame in `rows`.
+    """
+    def __init__(self, tickers, stamps, owners, rows):
+        self.tickers = list(tickers)
+        stamps = np.concatenate(stamps) if stamps else np.empty(0, dtype=np.int64)
+        order = np.argsort(stamps, kind="stable")
+        self.owners = np.concatenate(owners)[order] if owners else np.empty(0, dtype=np.int32)
+        self.rows = np.concatenate(rows)[order] if rows else np.empty(0, dtype=np.int64)
+        merged = stamps[order]
+        first = np.flatnonzero(np.r_[True, merged[1:] != merged[:-1]]) if len(merged) else np.empty(0, dtype=np.int64)
+        self.timestamps = merged[first].astype("datetime64[ns]")
+        self.offsets = np.append(first, len(stamps))
+
+    def __len__(self):
+        return len(self.timestamps)
+
+    @property
+    def bars(self):
+        return len(self.owners)
+
+    def timestamp(self, index) -> pd.Timestamp:
+        return pd.Timestamp(self.timestamps[index])
+
+    def events(self, index):
+        """[(ticker, row)] of the candles stamped `timestamps[index]`, in ticker order."""
+        start, stop = self.offsets[index], self.offsets[index + 1]
+        return [(self.tickers[owner], int(row)) for owner, row in zip(self.owners[start:stop], self.rows[start:stop])]
+
+    def bars_between(self, start, stop):
+        """The number of candles stamped `timestamps[start:stop]`."""
+        return int(self.offsets[stop] - self.offsets[start])
@@ -0,0 +1,155 @@
+import json
+import logging
+import time
+import zlib
+
+logger = logging.getLogger("app")
+
+FRAME_ENCODINGS = ("json", "deflate")
+PROGRESS_KEYS = {"type", "seq", "progress", "timestamp"}
+TRADE_FIELDS = ["timestamp", "ticker", "side", "qty", "price", "direction"]
+POSITION_FIELDS = ["ticker", "qty", "entry_price", "current_price", "pl", "pl_pct", "direction", "is_open"]
+CANDLE_FIELDS = ["timestamp", "open", "high", "low", "close"]
+
+
+def columns(rows, fields) -> dict:
+    """Rows of `fields` as one list per field, so a frame names every field once however many rows it holds."""
+    return {field: [row[i] for row in rows] for i, field in enumerate(fields)}
+
+
+class BacktestPublisher:
+    """
+    Coalesces a running backtest's updates for the dashboard into frames sent at most every `interval` seconds.
+    Between frames trades and candles are only appended to buffers. A frame carries what changed since the last one:
+    the new trades, the new daily candles, and the positions whose values changed or that were removed, each as
+    columns. With `encoding="deflate"` frames are sent as zlib-compressed JSON bytes, which browsers inflate with
+    `DecompressionStream("deflate")`. Frames holding nothing but progress are sent with the "progress" key, so a
+    dashboard that falls behind skips to the newest one instead of replaying them all.
+    `snapshot` is everything sent so far as one frame, for a dashboard that connects mid-run or lost frames. The
+    first frame of a backtest is a snapshot too, so dashboards drop what they show of an earlier backtest.
+    """
+    def __init__(self, ws_manager, interval=0.25, encoding="json", clock=time.monotonic):
+        if encoding not in FRAME_ENCODINGS:
+            raise ValueError(f"Unknown frame encoding {encoding!r}, expected one of {FRAME_ENCODINGS}")
+        self.ws_manager = ws_manager
+        self.interval = interval
+        self.encoding = encoding
+        self.clock = clock
+        self.seq = 0
+        self.last_publish = None
+        self.trades = []
+        self.candles = []
+        self.messages = []
+        self.stats = None
+        self.timestamp = None
+        self.progress = None
+        self.sent_progress = None
+        self.sent_timestamp = None
+        self.sent_balance = None
+        self.sent_positions = dict()  # ticker -> the position row last sent
+        self.sent_trades = []
+        self.sent_candles = []
+        self.sent_stats = None
+
+    def trade(self, order):
+        self.trades.append((
+            order["timestamp"], order["ticker"], getattr(order["side"], "value", order["side"]),
+            float(order["qty"]), float(order["price"]), order.get("direction"),
+        ))
+
+    def day(self, candles, stats):
+        """A finished day: its candles as `serialize_ticker_data` rows and the position manager's stats."""
+        self.candles.extend(tuple(candle[field] for field in CANDLE_FIELDS) for candle in candles)
+        self.stats = stats
+
+    def message(self, text, type="success"):
+        self.messages.append({"type": type, "text": text})
+
+    def advance(self, timestamp, progress):
+        """The backtest clock moved to `timestamp`, `progress` of the way through."""
+        self.timestamp = timestamp
+        self.progress = progress
+
+    def position_rows(self, position_manager) -> dict:
+        rows = dict()
+        for ticker, position in position_manager.positions.items():
+            if position is None:
+                continue
+            rows[ticker] = (
+                ticker, float(position.qty), float(position.entry_price), float(position.current_price), float(position.pl),
+                float(position.pl_pct), position.direction, bool(position.is_open),
+            )
+        return rows
+
+    def frame(self, position_manager):
+        """The frame of everything that changed since the last one, None when nothing did."""
+        frame = {"type": "snapshot" if self.seq == 0 else "frame", "seq": self.seq + 1}
+        if self.progress != self.sent_progress:
+            frame["progress"] = self.progress
+            frame["timestamp"] = self.timestamp.isoformat() if self.timestamp is not None else None
+        balance = float(position_manager.cash_balance)
+        if balance != self.sent_balance:
+            frame["balance"] = balance
+        rows = self.position_rows(position_manager)
+        changed = [row for ticker, row in rows.items() if self.sent_positions.get(ticker) != row]
+        removed = [ticker for ticker in self.sent_positions if ticker not in rows]
+        if changed or removed:
+            frame["positions"] = {"changed": columns(changed, POSITION_FIELDS), "removed": removed}
+        if self.trades:
+            frame["trades"] = columns(self.trades, TRADE_FIELDS)
+        if self.candles:
+            frame["candles"] = columns(self.candles, CANDLE_FIELDS)
+        if self.stats is not None:
+            frame["stats"] = self.stats
+        if self.messages:
+            frame["messages"] = self.messages
+        if len(frame) == 2:
+            return None
+
+        self.seq += 1
+        self.sent_progress, self.sent_balance, self.sent_positions = self.progress, balance, rows
+        self.sent_timestamp = frame.get("timestamp", self.sent_timestamp)
+        self.sent_trades.extend(self.trades)
+        self.sent_candles.extend(self.candles)
+        self.sent_stats = self.stats if self.stats is not None else self.sent_stats
+        self.trades, self.candles, self.messages, self.stats = [], [], [], None
+        return frame
+
+    def snapshot(self):
+        """Everything the frames sent so far hold, as one encoded frame the next frames apply on top of."""
+        frame = {
+            "type": "snapshot",
+            "seq": self.seq,
+            "progress": self.sent_progress,
+            "timestamp": self.sent_timestamp,
+            "positions": {"changed": columns(list(self.sent_positions.values()), POSITION_FIELDS), "removed": []},
+            "trades": columns(self.sent_trades, TRADE_FIELDS),
+            "candles": columns(self.sent_candles, CANDLE_FIELDS),
+        }
+        if self.sent_balance is not None:
+            frame["balance"] = self.sent_balance
+        if self.sent_stats is not None:
+            frame["stats"] = self.sent_stats
+        return self.encode(frame)
+
+    def encode(self, frame):
+        """JSON frames go out as dicts for the manager to serialize once, deflate ones as compressed bytes."""
+        if self.encoding == "deflate":
+            return zlib.compress(json.dumps(frame, separators=(",", ":"), default=str).encode())
+        return frame
+
+    async def publish(self, position_manager, force=False):
+        """Send a frame when `interval` has passed since the last one, or now with `force`. True when one was sent."""
+        now = self.clock()
+        if not force and self.last_publish is not None and now - self.last_publish < self.interval:
+            return False
+        self.last_publish = now
+        frame = self.frame(position_manager)
+        if frame is None:
+            return False
+        try:
+            key = "progress" if frame["type"] == "frame" and frame.keys() <= PROGRESS_KEYS else None
+            await self.ws_manager.send_message(self.encode(frame), key=key)
+        except Exception as e:
+            logger.exception("Error publishing backtest frame %r", frame["seq"], exc_info=e)
+        return True
@@ -0,0 +1,166 @@
+import json
+import logging
+import os
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+RUN_STORE_FILENAME = "backtest_runs.db"
+METRIC_COLUMNS = ["trades", "round_trips", "final_equity", "return_pct", "max_drawdown", "sharpe", "sortino", "win_rate",
+                  "profit_factor", "avg_holding_seconds", "exposure", "turnover", "bars", "seconds"]
+RUN_SCHEMA = {
+    "run_id": "TEXT PRIMARY KEY", "batch_id": "TEXT", "source": "TEXT", "status": "TEXT", "error": "TEXT",
+    "started_at": "TIMESTAMP", "finished_at": "TIMESTAMP", "tickers": "TEXT[]", "strategies": "TEXT[]", "params": "TEXT",
+    "data_start": "TIMESTAMP", "data_end": "TIMESTAMP", "trades": "INTEGER", "round_trips": "INTEGER",
+    "final_equity": "DOUBLE", "return_pct": "DOUBLE", "max_drawdown": "DOUBLE", "sharpe": "DOUBLE", "sortino": "DOUBLE",
+    "win_rate": "DOUBLE", "profit_factor": "DOUBLE", "avg_holding_seconds": "DOUBLE", "exposure": "DOUBLE",
+    "turnover": "DOUBLE", "bars": "BIGINT", "seconds": "DOUBLE", "attribution": "TEXT",
+}
+RUN_COLUMNS = list(RUN_SCHEMA)
+TRADE_COLUMNS = ["timestamp", "ticker", "side", "qty", "price", "reason", "strategy"]
+TRADE_SCHEMA = {"run_id": "TEXT NOT NULL", "timestamp": "TIMESTAMP", "ticker": "TEXT", "side": "TEXT", "qty": "DOUBLE",
+                "price": "DOUBLE", "reason": "TEXT", "strategy": "TEXT"}
+EQUITY_POINTS = 500  # equity curves are stored down-sampled to at most this many points
+
+
+def downsample(count, max_points=EQUITY_POINTS) -> np.ndarray:
+    """Indices of at most `max_points` evenly spaced samples out of `count`, always keeping the first and last."""
+    if count <= max_points:
+        return np.arange(count)
+    return np.unique(np.linspace(0, count - 1, max_points).round().astype(np.int64))
+
+
+def to_records(frame: pd.DataFrame) -> list:
+    """Rows as JSON ready dicts: NaN as None, lists as lists."""
+    records = frame.astype(object).where(frame.notna(), None).to_dict(orient="records")
+    for record in records:
+        for key, value in record.items():
+            if isinstance(value, np.ndarray):
+                record[key] = value.tolist()
+    return records
+
+
+class BacktestRunStore:
+    """
+    Every backtest run, whatever started it, keyed by `run_id`: its metadata, parameters and summary metrics in
+    `backtest_runs`, its trade ledger in `backtest_run_trades` and its down-sampled equity in `backtest_run_equity`.
+    Metrics are columns of the runs table, so listing, filtering and ranking thousands of runs is one columnar
+    scan with no per-run work. A connection is only held for each read or write, so the web app and CLI or farm
+    processes can take turns on the same file.
+    """
+    def __init__(self, db_path):
+        self.db_path = db_path
+        os.makedirs(os.path.dirname(db_path) or ".", exist_ok=True)
+        self.create_tables()
+
+    def connect(self, read_only=False):
+        return duckdb.connect(self.db_path, read_only=read_only)
+
+    def create_tables(self):
+        conn = self.connect()
+        try:
+            for table, schema in [("backtest_runs", RUN_SCHEMA), ("backtest_run_trades", TRADE_SCHEMA)]:
+                conn.execute(f"CREATE TABLE IF NOT EXISTS {table} ({', '.join(f'{name} {kind}' for name, kind in schema.items())})")
+                # stores created before a column was added get it appended
+                existing = {row[0] for row in conn.execute(f"SELECT column_name FROM (DESCRIBE {table})").fetchall()}
+                for name, kind in schema.items():
+                    if name not in existing:
+                        conn.execute(f"ALTER TABLE {table} ADD COLUMN {name} {kind}")
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS backtest_run_equity (
+                    run_id TEXT NOT NULL,
+                    timestamp TIMESTAMP,
+                    equity DOUBLE
+                )
+            """)
+        finally:
+            conn.close()
+
+    def save_run(self, run: dict, trades=(), equity=()):
+        """
+        Store a run (a dict of RUN_COLUMNS, `params` & `attribution` as Python objects), its trades as
+        TRADE_COLUMNS rows and its equity as (timestamp, equity) rows, which are down-sampled.
+        Saving a run again replaces it.
+        """
+        run = {**run, "params": json.dumps(run.get("params") or dict(), sort_keys=True, default=str),
+               "attribution": json.dumps(run.get("attribution"), default=str) if run.get("attribution") is not None else None}
+        trades = pd.DataFrame(list(trades), columns=TRADE_COLUMNS)
+        trades.insert(0, "run_id", run["run_id"])
+        equity = pd.DataFrame(list(equity), columns=["timestamp", "equity"])
+        equity = equity.iloc[downsample(len(equity))]
+        equity.insert(0, "run_id", run["run_id"])
+        conn = self.connect()
+        try:
+            conn.execute("BEGIN TRANSACTION")
+            for table in ["backtest_run_trades", "backtest_run_equity", "backtest_runs"]:
+                conn.execute(f"DELETE FROM {table} WHERE run_id = ?", [run["run_id"]])
+            conn.execute(
+                f"INSERT INTO backtest_runs ({', '.join(RUN_COLUMNS)}) VALUES ({', '.join('?' for _ in RUN_COLUMNS)})",
+                [run.get(column) for column in RUN_COLUMNS],
+            )
+            if not trades.empty:
+                conn.execute(f"INSERT INTO backtest_run_trades (run_id, {', '.join(TRADE_COLUMNS)}) SELECT * FROM trades")
+            if not equity.empty:
+                conn.execute("INSERT INTO backtest_run_equity SELECT * FROM equity")
+            conn.execute("COMMIT")
+        finally:
+            conn.close()
+
+    def list_runs(self, batch_id=None, strategy=None, ticker=None, status=None, order_by="started_at",
+                  descending=True, limit=100, offset=0) -> pd.DataFrame:
+        """Runs matching every filter given, ordered by `order_by` (a metric or `started_at`)."""
+        if order_by not in METRIC_COLUMNS + ["started_at", "finished_at"]:
+            raise ValueError(f"Cannot order runs by {order_by!r}")
+        query = "SELECT * FROM backtest_runs WHERE true"
+        params = []
+        for column, value in [("batch_id", batch_id), ("status", status)]:
+            if value is not None:
+                query += f" AND {column} = ?"
+                params.append(value)
+        for column, value in [("strategies", strategy), ("tickers", ticker)]:
+            if value is not None:
+                query += f" AND list_contains({column}, ?)"
+                params.append(value)
+        query += f" ORDER BY {order_by} {'DESC' if descending else 'ASC'} NULLS LAST, run_id LIMIT ? OFFSET ?"
+        params += [limit, offset]
+        conn = self.connect(read_only=True)
+        try:
+            return conn.execute(query, params).df()
+        finally:
+            conn.close()
+
+    def compare_runs(self, run_ids):
+        """The runs side by side and their equity curves as one long frame, in the order of `run_ids`."""
+        conn = self.connect(read_only=True)
+        try:
+            runs = conn.execute("SELECT * FROM backtest_runs WHERE run_id IN (SELECT UNNEST(?::TEXT[]))", [list(run_ids)]).df()
+            equity = conn.execute(
+                "SELECT * FROM backtest_run_equity WHERE run_id IN (SELECT UNNEST(?::TEXT[])) ORDER BY run_id, timestamp",
+                [list(run_ids)],
+            ).df()
+        finally:
+            conn.close()
+        order = {run_id: i for i, run_id in enumerate(run_ids)}
+        runs = runs.sort_values("run_id", key=lambda ids: ids.map(order)).reset_index(drop=True)
+        return runs, equity
+
+    def get_trades(self, run_id) -> pd.DataFrame:
+        conn = self.connect(read_only=True)
+        try:
+            return conn.execute("SELECT * FROM backtest_run_trades WHERE run_id = ? ORDER BY timestamp", [run_id]).df()
+        finally:
+            conn.close()
+
+
+_run_stores = dict()
+
+
+def get_run_store(db_base_path="dbs") -> BacktestRunStore:
+    """The process-wide BacktestRunStore of `db_base_path`."""
+    db_path = os.path.join(db_base_path, RUN_STORE_FILENAME)
+    if db_path not in _run_stores:
+        _run_stores[db_path] = BacktestRunStore(db_path)
+    return _run_stores[db_path]
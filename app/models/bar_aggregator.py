@@ -0,0 +1,227 @@
+import logging
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+# bucket sizes in minutes: 5min, 15min, 1h, 4h & 1D. All divide a day so buckets are aligned to midnight,
+# the same bins pandas `resample` produces
+DEFAULT_INTERVALS = [5, 15, 60, 240, 1440]
+AGGREGATED_COLUMNS = ["timestamp", "open", "high", "low", "close", "volume", "vwap"]
+NS_PER_MINUTE = 60_000_000_000
+
+
+def interval_minutes(interval) -> int:
+    """Convert a pandas interval alias ('15min', '4hour', '1D', ...) into whole minutes."""
+    return int(pd.Timedelta(interval).total_seconds() // 60)
+
+
+def to_minute(timestamp) -> int:
+    """Whole minutes since the epoch of a naive UTC timestamp."""
+    return int(pd.Timestamp(timestamp).value // NS_PER_MINUTE)
+
+
+def resample_bars(data: pd.DataFrame, interval) -> pd.DataFrame:
+    """Resample minute candles into `interval` bars with pandas, dropping empty buckets."""
+    data = data.set_index(pd.to_datetime(data['timestamp']))
+    aggregated = data.resample(interval).agg({
+        'open': 'first',
+        'high': 'max',
+        'low': 'min',
+        'close': 'last',
+        'volume': 'sum',
+    }).dropna()
+    aggregated.reset_index(inplace=True)
+    return aggregated
+
+
+class _Buckets:
+    """Growable column arrays of one ticker's bars for one interval. The last row is the bucket still being filled."""
+    def __init__(self, capacity=256):
+        self.size = 0
+        self.start = np.empty(capacity, dtype=np.int64)  # bucket start in minutes since the epoch
+        self.values = np.empty((6, capacity), dtype=np.float64)  # open, high, low, close, volume, vwap * volume
+
+    def _grow(self):
+        capacity = len(self.start) * 2
+        self.start = np.resize(self.start, capacity)
+        values = np.empty((6, capacity), dtype=np.float64)
+        values[:, :self.size] = self.values[:, :self.size]
+        self.values = values
+
+    def add(self, bucket, open_, high, low, close, volume, vwap):
+        if self.size and self.start[self.size - 1] == bucket:
+            row = self.size - 1
+            self.values[1, row] = max(self.values[1, row], high)
+            self.values[2, row] = min(self.values[2, row], low)
+            self.values[3, row] = close
+            self.values[4, row] += volume
+            self.values[5, row] += vwap * volume
+            return
+        if self.size == len(self.start):
+            self._grow()
+        self.start[self.size] = bucket
+        self.values[:, self.size] = (open_, high, low, close, volume, vwap * volume)
+        self.size += 1
+
+    def extend(self, buckets, values):
+        """Append whole buckets, all newer than the last one."""
+        while self.size + len(buckets) > len(self.start):
+            self._grow()
+        self.start[self.size:self.size + len(buckets)] = buckets
+        self.values[:, self.size:self.size + len(buckets)] = values
+        self.size += len(buckets)
+
+    def frame(self, first_bucket=None) -> pd.DataFrame:
+        first = 0 if first_bucket is None else int(np.searchsorted(self.start[:self.size], first_bucket))
+        open_, high, low, close, volume, price_volume = self.values[:, first:self.size]
+        with np.errstate(divide="ignore", invalid="ignore"):
+            vwap = np.where(volume > 0, price_volume / volume, close)
+        return pd.DataFrame({
+            "timestamp": (self.start[first:self.size] * NS_PER_MINUTE).astype("datetime64[ns]"),
+            "open": open_.copy(),
+            "high": high.copy(),
+            "low": low.copy(),
+            "close": close.copy(),
+            "volume": volume.copy(),
+            "vwap": vwap,
+        }, columns=AGGREGATED_COLUMNS)
+
+
+class BarAggregator:
+    """
+    Shared multi-timeframe bars built incrementally from minute candles.
+    Every minute bar updates the open bucket of each interval in O(1) instead of every strategy resampling
+    the full minute history with pandas on each signal. The StrategyHandler feeds it the candles it hands to
+    the strategies, in live and backtest mode, so a ticker's bars always line up with the strategies' data.
+    """
+    def __init__(self, intervals=None):
+        self.intervals = list(intervals or DEFAULT_INTERVALS)
+        self._buckets = dict()  # ticker -> {minutes: _Buckets}
+        self._first = dict()  # ticker -> first minute ingested
+        self._last = dict()  # ticker -> last minute ingested
+
+    def reset(self, ticker=None):
+        tickers = [ticker] if ticker is not None else list(self._buckets.keys())
+        for ticker in tickers:
+            self._buckets.pop(ticker, None)
+            self._first.pop(ticker, None)
+            self._last.pop(ticker, None)
+
+    def get_ticker_state(self, ticker):
+        """Picklable bars of one ticker, e.g. to checkpoint a backtest."""
+        if ticker not in self._buckets:
+            return None
+        return {"buckets": self._buckets[ticker], "first": self._first[ticker], "last": self._last[ticker]}
+
+    def set_ticker_state(self, ticker, state):
+        self.reset(ticker)
+        if state is not None:
+            self._buckets[ticker] = state["buckets"]
+            self._first[ticker] = state["first"]
+            self._last[ticker] = state["last"]
+
+    def first_timestamp(self, ticker):
+        first = self._first.get(ticker)
+        return None if first is None else pd.Timestamp(first * NS_PER_MINUTE)
+
+    def last_timestamp(self, ticker):
+        last = self._last.get(ticker)
+        return None if last is None else pd.Timestamp(last * NS_PER_MINUTE)
+
+    def update(self, ticker, timestamp, open, high, low, close, volume, vwap=None):
+        """Add one minute candle. Candles at or before the last one ingested are ignored. Returns True when added."""
+        return self._add(ticker, to_minute(timestamp), open, high, low, close, volume, vwap)
+
+    def update_from_frame(self, ticker, frame: pd.DataFrame):
+        """Add every candle of a timestamp-sorted minute frame newer than the last one ingested. Returns the count."""
+        if frame.empty:
+            return 0
+        minutes = frame['timestamp'].values.astype("datetime64[m]").astype(np.int64)
+        last = self._last.get(ticker)
+        first = 0 if last is None else int(np.searchsorted(minutes, last, side="right"))
+        open_, high, low, close, volume = [frame[column].to_numpy(dtype=np.float64) for column in ["open", "high", "low", "close", "volume"]]
+        vwap = frame['vwap'].to_numpy(dtype=np.float64) if 'vwap' in frame.columns else close
+        if last is None:
+            self._seed(ticker, minutes, open_, high, low, close, volume, vwap)
+            return len(frame)
+        for i in range(first, len(frame)):
+            self._add(ticker, int(minutes[i]), open_[i], high[i], low[i], close[i], volume[i], vwap[i])
+        return len(frame) - first
+
+    def _seed(self, ticker, minutes, open_, high, low, close, volume, vwap):
+        """Build every interval of a new ticker at once with NumPy reductions over the bucket boundaries."""
+        self._buckets[ticker] = dict()
+        self._first[ticker] = int(minutes[0])
+        self._last[ticker] = int(minutes[-1])
+        price_volume = np.where(np.isnan(vwap), close, vwap) * volume
+        for interval in self.intervals:
+            buckets = minutes - minutes % interval
+            first = np.flatnonzero(np.r_[True, buckets[1:] != buckets[:-1]])
+            last = np.r_[first[1:] - 1, len(buckets) - 1]
+            values = np.vstack([
+                open_[first],
+                np.maximum.reduceat(high, first),
+                np.minimum.reduceat(low, first),
+                close[last],
+                np.add.reduceat(volume, first),
+                np.add.reduceat(price_volume, first),
+            ])
+            self._buckets[ticker][interval] = _Buckets(capacity=max(256, 2 * len(first)))
+            self._buckets[ticker][interval].extend(buckets[first], values)
+
+    def _add(self, ticker, minute, open, high, low, close, volume, vwap):
+        last = self._last.get(ticker)
+        if last is not None and minute <= last:
+            return False
+        if last is None:
+            self._buckets[ticker] = {interval: _Buckets() for interval in self.intervals}
+            self._first[ticker] = minute
+        self._last[ticker] = minute
+        vwap = close if vwap is None or np.isnan(vwap) else vwap
+        for interval, buckets in self._buckets[ticker].items():
+            buckets.add(minute - minute % interval, open, high, low, close, volume, vwap)
+        return True
+
+    def covers(self, ticker, end, start=None):
+        """True when `end` is the latest candle ingested for `ticker` and the candles reach back to `start`."""
+        if ticker not in self._last or self._last[ticker] != to_minute(end):
+            return False
+        return start is None or self._first[ticker] <= to_minute(start)
+
+    def frame(self, ticker, interval, start=None, end=None):
+        """
+        `interval` bars of `ticker` from `start`, including the bucket still being filled. The bucket holding `start`
+        is left out when it also holds earlier candles, `window` rebuilds it from the candles of the window.
+        Returns None when the interval is not kept or, given `end`, the ingested candles don't cover [start, end].
+        """
+        minutes = interval_minutes(interval)
+        if minutes not in self.intervals or ticker not in self._buckets:
+            return None
+        if end is not None and not self.covers(ticker, end, start=start):
+            return None
+        first_bucket = None
+        if start is not None:
+            start_minute = to_minute(start)
+            first_bucket = start_minute - start_minute % minutes
+            if first_bucket < start_minute and self._first[ticker] < start_minute:
+                first_bucket += minutes
+        return self._buckets[ticker][minutes].frame(first_bucket)
+
+    def window(self, ticker, interval, data: pd.DataFrame):
+        """
+        `interval` bars of exactly the minute candles of `data`, the same bars as resampling them. None when the
+        interval is not kept or the ingested candles don't cover `data`.
+        """
+        if data.empty:
+            return None
+        bars = self.frame(ticker, interval, start=data['timestamp'].iloc[0], end=data['timestamp'].iloc[-1])
+        if bars is None:
+            return None
+        head = data if bars.empty else data[data['timestamp'] < bars['timestamp'].iloc[0]]
+        if head.empty:
+            return bars
+        head_bars = BarAggregator([interval_minutes(interval)])
+        head_bars.update_from_frame(ticker, head)
+        return pd.concat([head_bars.frame(ticker, interval), bars], ignore_index=True)
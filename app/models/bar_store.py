@@ -0,0 +1,172 @@
+import logging
+import os
+import queue
+import threading
+from contextlib import contextmanager
+from datetime import datetime
+
+import duckdb
+import pandas as pd
+
+from app.utils.bar_ingestion import BAR_COLUMNS, upsert_frame
+
+logger = logging.getLogger("app")
+
+BAR_STORE_FILENAME = "market_data.db"
+
+
+class ConnectionPool:
+    """
+    A small pool of DuckDB cursors that all share one long-lived database connection.
+    DuckDB only allows one read/write connection per database file in a process, so every
+    handler borrows a cursor from here instead of calling `duckdb.connect` on each read or write.
+    """
+    def __init__(self, db_path, max_size=8, read_only=False):
+        self.db_path = db_path
+        self.max_size = max_size
+        self.read_only = read_only
+        self._connection = duckdb.connect(db_path, read_only=read_only)
+        self._idle = queue.LifoQueue()
+        self._created = 0
+        self._lock = threading.Lock()
+
+    def _acquire(self):
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            pass
+        with self._lock:
+            if self._created < self.max_size:
+                self._created += 1
+                return self._connection.cursor()
+        # every cursor is checked out, wait for one to be returned
+        return self._idle.get()
+
+    @contextmanager
+    def connection(self):
+        """Borrow a cursor for the duration of a `with` block."""
+        cursor = self._acquire()
+        try:
+            yield cursor
+        finally:
+            self._idle.put(cursor)
+
+    def close(self):
+        while not self._idle.empty():
+            self._idle.get_nowait().close()
+        self._connection.close()
+        logger.info("Closed bar store connection pool %r", self.db_path)
+
+
+class BarStore:
+    """
+    Consolidated market data store. All tickers and timeframes live in a single `bars` table
+    keyed by (ticker, timeframe, timestamp) instead of one `{ticker}_{timeframe}_data.db` file each.
+    Rows are written in (ticker, timestamp) order so DuckDB's zone maps can prune ticker and time ranges.
+    """
+    def __init__(self, db_path, pool_size=8):
+        self.db_path = db_path
+        self.pool = ConnectionPool(db_path, max_size=pool_size)
+        self.create_tables()
+
+    def create_tables(self):
+        with self.pool.connection() as conn:
+            conn.execute("""
+                CREATE TABLE IF NOT EXISTS bars (
+                    ticker TEXT NOT NULL,
+                    timeframe TEXT NOT NULL,
+                    timestamp TIMESTAMP NOT NULL,
+                    open FLOAT,
+                    high FLOAT,
+                    low FLOAT,
+                    close FLOAT,
+                    volume FLOAT,
+                    vwap FLOAT,
+                    PRIMARY KEY (ticker, timeframe, timestamp)
+                )
+            """)
+
+    def get_ticker_data(self, ticker, timeframe, start: datetime = None, end: datetime = None, columns=None, end_inclusive=False):
+        """
+        Return bars for a single ticker ordered by timestamp with the same columns as the legacy `ticker_data` table.
+        `start` is inclusive and `end` is exclusive, matching the backtest reads, or inclusive with `end_inclusive`.
+        """
+        columns = columns or BAR_COLUMNS
+        query = f"SELECT {', '.join(columns)} FROM bars WHERE ticker = ? AND timeframe = ?"
+        params = [ticker, str(timeframe)]
+        if start is not None:
+            query += " AND timestamp >= ?"
+            params.append(start)
+        if end is not None:
+            query += " AND timestamp <= ?" if end_inclusive else " AND timestamp < ?"
+            params.append(end)
+        query += " ORDER BY timestamp ASC"
+        with self.pool.connection() as conn:
+            return conn.execute(query, params).df()
+
+    def get_last_timestamp(self, ticker, timeframe, end: datetime = None):
+        """The timestamp of a ticker's most recent bar before `end`, None when it has none."""
+        query = "SELECT max(timestamp) FROM bars WHERE ticker = ? AND timeframe = ?"
+        params = [ticker, str(timeframe)]
+        if end is not None:
+            query += " AND timestamp < ?"
+            params.append(end)
+        with self.pool.connection() as conn:
+            last = conn.execute(query, params).fetchone()[0]
+        return None if last is None else pd.Timestamp(last)
+
+    def get_latest_bars(self, tickers, timeframe):
+        """Return the most recent bar for each ticker in a single query."""
+        query = f"""
+            SELECT {', '.join(BAR_COLUMNS)}
+            FROM bars
+            WHERE timeframe = ? AND ticker IN (SELECT UNNEST(?::TEXT[]))
+            QUALIFY ROW_NUMBER() OVER (PARTITION BY ticker ORDER BY timestamp DESC) = 1
+        """
+        with self.pool.connection() as conn:
+            return conn.execute(query, [str(timeframe), list(tickers)]).df()
+
+    def upsert_frame(self, frame: pd.DataFrame, timeframe):
+        """Upsert a columnar bar frame (see `app.utils.bar_ingestion`) in one statement."""
+        with self.pool.connection() as conn:
+            return upsert_frame(conn, frame, table="bars", constants={"timeframe": timeframe})
+
+    def import_ticker_db(self, db_path, ticker, timeframe):
+        """Copy every row of a legacy per-ticker database into the store. Returns the number of rows in the store for it."""
+        with self.pool.connection() as conn:
+            conn.execute(f"ATTACH '{db_path}' AS legacy (READ_ONLY)")
+            try:
+                conn.execute(f"""
+                    INSERT OR IGNORE INTO bars
+                    SELECT ?, ?, timestamp, open, high, low, close, volume, vwap
+                    FROM legacy.ticker_data
+                    ORDER BY timestamp
+                """, [ticker, str(timeframe)])
+            finally:
+                conn.execute("DETACH legacy")
+            return conn.execute(
+                "SELECT COUNT(*) FROM bars WHERE ticker = ? AND timeframe = ?", [ticker, str(timeframe)]
+            ).fetchone()[0]
+
+    def close(self):
+        self.pool.close()
+
+
+_bar_stores = dict()
+_bar_stores_lock = threading.Lock()
+
+
+def get_bar_store(db_base_path="dbs"):
+    """Return the process-wide BarStore for `db_base_path`, opening it on first use."""
+    db_path = os.path.join(db_base_path, BAR_STORE_FILENAME)
+    with _bar_stores_lock:
+        if db_path not in _bar_stores:
+            _bar_stores[db_path] = BarStore(db_path)
+        return _bar_stores[db_path]
+
+
+def close_bar_stores():
+    with _bar_stores_lock:
+        for store in _bar_stores.values():
+            store.close()
+        _bar_stores.clear()
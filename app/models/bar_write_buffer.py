@@ -0,0 +1,120 @@
+import logging
+import threading
+import time
+
+from app.utils.bar_ingestion import BarIngestor, bars_to_frame
+
+logger = logging.getLogger("app")
+
+
+class BarWriteBuffer:
+    """
+    Write-behind buffer for streamed bars.
+    `add` only appends to an in-memory list so the event loop never waits on DuckDB. A background thread
+    flushes every ticker's pending bars together once `max_rows` are queued or `flush_interval` seconds pass,
+    and `stop` flushes whatever is left.
+    """
+    def __init__(self, ingestor: BarIngestor, max_rows=500, flush_interval=1.0):
+        self.ingestor = ingestor
+        self.max_rows = max_rows
+        self.flush_interval = flush_interval
+        self._pending = []  # (ticker, Bar)
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._wake = threading.Event()
+        self._stopped = threading.Event()
+        self._thread = None
+
+        # counters
+        self.rows_buffered = 0
+        self.rows_flushed = 0
+        self.flush_count = 0
+        self.flush_errors = 0
+        self.last_flush_latency = 0.0
+        self.max_flush_latency = 0.0
+        self.total_flush_seconds = 0.0
+
+    @property
+    def queue_depth(self):
+        return len(self._pending)
+
+    @property
+    def is_running(self):
+        return self._thread is not None and self._thread.is_alive()
+
+    def start(self):
+        if self.is_running:
+            return
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run, name="bar-write-buffer", daemon=True)
+        self._thread.start()
+        logger.info("Bar write buffer started max_rows=%r flush_interval=%r", self.max_rows, self.flush_interval)
+
+    def add(self, ticker, bar):
+        with self._lock:
+            self._pending.append((ticker, bar))
+            self.rows_buffered += 1
+            queue_depth = len(self._pending)
+        if queue_depth >= self.max_rows:
+            self._wake.set()
+
+    def flush(self):
+        """Write every pending bar. Returns the number of rows flushed."""
+        with self._flush_lock:
+            with self._lock:
+                pending, self._pending = self._pending, []
+            if not pending:
+                return 0
+
+            started_at = time.perf_counter()
+            bars_by_ticker = dict()
+            for ticker, bar in pending:
+                bars_by_ticker.setdefault(ticker, []).append(bar)
+            try:
+                self.ingestor.ingest_frames({ticker: bars_to_frame(ticker, bars) for ticker, bars in bars_by_ticker.items()})
+            except Exception as e:
+                # put the rows back in front of anything that arrived meanwhile and retry on the next flush
+                with self._lock:
+                    self._pending = pending + self._pending
+                self.flush_errors += 1
+                logger.error("Error flushing %r buffered bars", len(pending), exc_info=e)
+                return 0
+
+            latency = time.perf_counter() - started_at
+            self.rows_flushed += len(pending)
+            self.flush_count += 1
+            self.last_flush_latency = latency
+            self.max_flush_latency = max(self.max_flush_latency, latency)
+            self.total_flush_seconds += latency
+            logger.debug("Flushed %r bars for %r tickers in %.4fs", len(pending), len(bars_by_ticker), latency)
+            return len(pending)
+
+    def stop(self):
+        """Stop the background worker and flush the remaining bars."""
+        self._stopped.set()
+        self._wake.set()
+        if self._thread is not None:
+            self._thread.join()
+            self._thread = None
+        self.flush()
+        logger.info("Bar write buffer stopped: %r", self.stats())
+
+    def stats(self):
+        return {
+            "queue_depth": self.queue_depth,
+            "rows_buffered": self.rows_buffered,
+            "rows_flushed": self.rows_flushed,
+            "flush_count": self.flush_count,
+            "flush_errors": self.flush_errors,
+            "last_flush_latency": self.last_flush_latency,
+            "max_flush_latency": self.max_flush_latency,
+            "avg_flush_latency": self.total_flush_seconds / self.flush_count if self.flush_count else 0.0,
+        }
+
+    def _run(self):
+        while not self._stopped.is_set():
+            self._wake.wait(self.flush_interval)
+            self._wake.clear()
+            if self._stopped.is_set():
+                break
+            self.flush()
@@ -0,0 +1,65 @@
+import logging
+import threading
+
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+BAR_FIELDS = ["open", "high", "low", "close", "volume", "vwap"]
+
+
+def _to_naive_utc(timestamp):
+    timestamp = pd.Timestamp(timestamp)
+    if timestamp.tz is not None:
+        timestamp = timestamp.tz_convert("UTC").tz_localize(None)
+    return timestamp
+
+
+class LatestBarCache:
+    """
+    In-memory map of ticker -> most recent bar. The stream handler and ingestion path update it as bars arrive,
+    so price lookups never touch the databases. Older bars never replace newer ones.
+    """
+    def __init__(self):
+        self._bars = dict()
+        self._lock = threading.Lock()
+        self.is_seeded = False
+
+    def update(self, ticker, timestamp, **fields):
+        timestamp = _to_naive_utc(timestamp)
+        with self._lock:
+            current = self._bars.get(ticker)
+            if current is not None and current["timestamp"] > timestamp:
+                return
+            self._bars[ticker] = dict(timestamp=timestamp, **fields)
+
+    def update_from_bar(self, bar):
+        """Update from an alpaca `Bar`."""
+        self.update(bar.symbol, bar.timestamp, **{field: getattr(bar, field) for field in BAR_FIELDS})
+
+    def update_from_frame(self, ticker, frame: pd.DataFrame):
+        """Update from the last row of a timestamp sorted bar frame."""
+        if frame.empty:
+            return
+        row = frame.iloc[-1]
+        self.update(ticker, row["timestamp"], **{field: row[field] for field in BAR_FIELDS if field in row})
+
+    def seed(self, latest_bars: pd.DataFrame):
+        """Seed from a frame holding one row per ticker, e.g. `BarStore.get_latest_bars`."""
+        for row in latest_bars.itertuples(index=False):
+            self.update(row.ticker, row.timestamp, **{field: getattr(row, field) for field in BAR_FIELDS if hasattr(row, field)})
+        self.is_seeded = True
+        logger.info("Latest bar cache seeded with %r tickers", len(latest_bars))
+
+    def clear(self):
+        with self._lock:
+            self._bars.clear()
+        self.is_seeded = False
+
+    def get(self, ticker):
+        return self._bars.get(ticker)
+
+    def price_map(self, tickers):
+        """Return {ticker: close} for every ticker with a cached bar."""
+        bars = self._bars
+        return {ticker: bars[ticker]["close"] for ticker in tickers if ticker in bars}
@@ -0,0 +1,70 @@
+import logging
+from bisect import bisect_left, insort
+from collections import deque
+
+logger = logging.getLogger("app")
+
+
+class LevelIndex:
+    """
+    Support & resistance levels of one ticker's bars, kept sorted as the bars complete.
+    A bar's low (high) is confirmed as a support (resistance) once `order` bars on each side of it have completed
+    and its low (high) is strictly below (above) all of theirs, `argrelextrema(..., order=order)` done one bar at a
+    time. Levels expire once their bar falls out of the lookback window, and the level nearest to a price is found
+    by bisection instead of scanning every level.
+    """
+    def __init__(self, order=5):
+        self.order = order
+        self.window = deque(maxlen=2 * order + 1)  # (timestamp, high, low) of the last completed bars
+        self.supports = []  # sorted (low, timestamp)
+        self.resistances = []  # sorted (high, timestamp)
+        self.confirmed = deque()  # (timestamp, support, resistance) in bar order, None for the side that isn't a level
+        self.last_timestamp = None
+        self.start = None  # levels of bars before this timestamp have expired
+
+    def __len__(self):
+        return len(self.supports) + len(self.resistances)
+
+    def update(self, timestamp, high, low):
+        """Add a completed bar, confirming the bar `order` bars before it."""
+        self.window.append((timestamp, high, low))
+        self.last_timestamp = timestamp
+        if len(self.window) < self.window.maxlen:
+            return
+        center_timestamp, center_high, center_low = self.window[self.order]
+        neighbours = [bar for i, bar in enumerate(self.window) if i != self.order]
+        support = center_low if all(center_low < low for _, _, low in neighbours) else None
+        resistance = center_high if all(center_high > high for _, high, _ in neighbours) else None
+        if support is None and resistance is None:
+            return
+        if self.start is not None and center_timestamp < self.start:
+            return
+        if support is not None:
+            insort(self.supports, (support, center_timestamp))
+        if resistance is not None:
+            insort(self.resistances, (resistance, center_timestamp))
+        self.confirmed.append((center_timestamp, support, resistance))
+
+    def expire(self, start):
+        """Drop the levels of bars before `start`. The window only moves forward, `start` never goes back."""
+        self.start = start if self.start is None else max(self.start, start)
+        while self.confirmed and self.confirmed[0][0] < self.start:
+            timestamp, support, resistance = self.confirmed.popleft()
+            if support is not None:
+                del self.supports[bisect_left(self.supports, (support, timestamp))]
+            if resistance is not None:
+                del self.resistances[bisect_left(self.resistances, (resistance, timestamp))]
+
+    def _nearest(self, levels, price, accepts):
+        # only the levels either side of the price can be the nearest accepted one
+        position = bisect_left(levels, (price,))
+        candidates = [levels[i][0] for i in [position - 1, position] if 0 <= i < len(levels) and accepts(levels[i][0])]
+        return min(candidates, key=lambda level: abs(level - price)) if candidates else None
+
+    def nearest_support(self, price, threshold):
+        """The support nearest to `price` among those with `support * (1 + threshold) >= price`, None if there is none."""
+        return self._nearest(self.supports, price, lambda support: support * (1 + threshold) >= price)
+
+    def nearest_resistance(self, price, threshold):
+        """The resistance nearest to `price` among those with `price >= resistance * (1 - threshold)`, None if there is none."""
+        return self._nearest(self.resistances, price, lambda resistance: price >= resistance * (1 - threshold))
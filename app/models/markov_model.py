@@ -0,0 +1,200 @@
+import json
+import logging
+import os
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+MARKOV_FEATURES = ['close', 'volume', 'vwap', 'vxx']
+
+
+class MarkovTransitionModel:
+    """
+    A Markov chain over a bounded, discretized state space.
+    Each feature is binned into `n_bins` quantile bins whose edges are fit on the first bars seen, so a state is
+    one of at most n_bins ** len(features) ids however many bars have been seen. Transition counts are stored sparsely
+    as {state: {next_state: count}} and updated incrementally with the bars completed since the last update.
+    Each state remembers the mean close of the bars observed in it, which is the close predicted for that state.
+    The features are price & volume levels, so when more than `refit_share` of the bars updating the model fall
+    outside the range its bins were fit on, e.g. once prices trend away, the model is refit on those bars.
+    """
+    def __init__(self, n_bins=10, features=None, refit_share=0.1):
+        self.n_bins = n_bins
+        self.features = list(features or MARKOV_FEATURES)
+        self.refit_share = refit_share
+        self.edges = None  # per feature inner bin edges
+        self.ranges = None  # per feature (min, max) of the data the edges were fit on
+        self.counts = dict()
+        self.close_sums = dict()
+        self.close_counts = dict()
+        self.last_state = None
+        self.last_timestamp = None
+
+    @property
+    def n_states(self):
+        return len(self.close_counts)
+
+    @property
+    def n_transitions(self):
+        return sum(sum(row.values()) for row in self.counts.values())
+
+    def reset(self):
+        self.edges = None
+        self.ranges = None
+        self.counts = dict()
+        self.close_sums = dict()
+        self.close_counts = dict()
+        self.last_state = None
+        self.last_timestamp = None
+
+    def fit_edges(self, data: pd.DataFrame):
+        quantiles = np.linspace(0, 1, self.n_bins + 1)[1:-1]
+        values = [data[feature].to_numpy(dtype=np.float64) for feature in self.features]
+        self.edges = [np.quantile(feature_values, quantiles) for feature_values in values]
+        self.ranges = [(float(np.nanmin(feature_values)), float(np.nanmax(feature_values))) for feature_values in values]
+
+    def out_of_range(self, data: pd.DataFrame) -> float:
+        """The share of rows with a feature outside the range the edges were fit on, 1 when the range is unknown."""
+        if self.ranges is None or data.empty:
+            return 1.0 if self.ranges is None else 0.0
+        outside = np.zeros(len(data), dtype=bool)
+        for feature, (low, high) in zip(self.features, self.ranges):
+            values = data[feature].to_numpy(dtype=np.float64)
+            outside |= (values < low) | (values > high)
+        return float(outside.mean())
+
+    def states(self, data: pd.DataFrame) -> np.ndarray:
+        """Encode every row's binned features as a single state id."""
+        states = np.zeros(len(data), dtype=np.int64)
+        for i, (feature, edges) in enumerate(zip(self.features, self.edges)):
+            bins = np.searchsorted(edges, data[feature].to_numpy(dtype=np.float64), side="right")
+            states += bins * self.n_bins ** i
+        return states
+
+    def update(self, data: pd.DataFrame):
+        """
+        Count the transitions of the timestamp-sorted bars newer than the last update. Returns the number of bars added.
+        The model restarts from `data` when it goes back in time, e.g. a backtest starting earlier than the saved model,
+        or when more than `refit_share` of `data` is outside the range its bins were fit on.
+        """
+        if data.empty:
+            return 0
+        timestamps = pd.to_datetime(data['timestamp'])
+        if self.last_timestamp is not None and timestamps.iloc[-1] < self.last_timestamp:
+            logger.info("Markov model is ahead of the data (%r > %r), refitting", self.last_timestamp, timestamps.iloc[-1])
+            self.reset()
+        elif self.edges is not None:
+            outside = self.out_of_range(data)
+            if outside > self.refit_share:
+                logger.info("%.0f%% of the bars are outside the Markov model's bins, refitting", 100 * outside)
+                self.reset()
+        if self.edges is None:
+            self.fit_edges(data)
+        if self.last_timestamp is not None:
+            data = data[(timestamps > self.last_timestamp).values]
+        if data.empty:
+            return 0
+
+        states = self.states(data)
+        for state, close in zip(states.tolist(), data['close'].tolist()):
+            self.close_sums[state] = self.close_sums.get(state, 0.0) + close
+            self.close_counts[state] = self.close_counts.get(state, 0) + 1
+        previous = np.concatenate([[self.last_state], states[:-1]]) if self.last_state is not None else states[:-1]
+        following = states if self.last_state is not None else states[1:]
+        for state, next_state in zip(previous.tolist(), following.tolist()):
+            row = self.counts.setdefault(state, dict())
+            row[next_state] = row.get(next_state, 0) + 1
+        self.last_state = int(states[-1])
+        self.last_timestamp = pd.Timestamp(data['timestamp'].iloc[-1])
+        return len(data)
+
+    def state_close(self, state, default=None):
+        """The mean close observed in `state`, `default` for states never observed."""
+        if state not in self.close_counts:
+            return default
+        return self.close_sums[state] / self.close_counts[state]
+
+    def transitions(self, state):
+        """(next states, probabilities) of `state`. States never left stay where they are."""
+        row = self.counts.get(state)
+        if not row:
+            return np.array([state]), np.array([1.0])
+        next_states = np.fromiter(row.keys(), dtype=np.int64, count=len(row))
+        counts = np.fromiter(row.values(), dtype=np.float64, count=len(row))
+        return next_states, counts / counts.sum()
+
+    def simulate(self, state, n_steps=1, n_simulations=5000, rng=None):
+        """Final states of `n_simulations` paths of `n_steps` transitions, sampling every path on a state at once."""
+        rng = rng or np.random.default_rng()
+        states = np.full(n_simulations, state, dtype=np.int64)
+        for _ in range(n_steps):
+            draws = rng.random(n_simulations)
+            current_states, inverse = np.unique(states, return_inverse=True)
+            for i, current in enumerate(current_states.tolist()):
+                paths = inverse == i
+                next_states, probabilities = self.transitions(current)
+                cumulative = np.cumsum(probabilities)
+                cumulative /= cumulative[-1]
+                picks = np.minimum(np.searchsorted(cumulative, draws[paths], side="right"), len(next_states) - 1)
+                states[paths] = next_states[picks]
+        return states
+
+    def predict_close(self, state, current_close, n_steps=1, n_simulations=5000, rng=None):
+        """The mean close of simulated paths from `state`, paths ending in unobserved states keep `current_close`."""
+        final_states, counts = np.unique(self.simulate(state, n_steps, n_simulations, rng), return_counts=True)
+        closes = [self.state_close(final_state, current_close) for final_state in final_states.tolist()]
+        return float(np.dot(closes, counts) / n_simulations)
+
+    def expected_close(self, state, current_close, n_steps=1):
+        """The analytic expectation of the close `n_steps` transitions ahead, what the simulations converge to."""
+        distribution = {state: 1.0}
+        for _ in range(n_steps):
+            following = dict()
+            for current, weight in distribution.items():
+                for next_state, probability in zip(*self.transitions(current)):
+                    following[int(next_state)] = following.get(int(next_state), 0.0) + weight * probability
+            distribution = following
+        return sum(weight * self.state_close(state, current_close) for state, weight in distribution.items())
+
+    def to_dict(self):
+        return {
+            "n_bins": self.n_bins,
+            "features": self.features,
+            "refit_share": self.refit_share,
+            "edges": [edges.tolist() for edges in self.edges] if self.edges is not None else None,
+            "ranges": [list(feature_range) for feature_range in self.ranges] if self.ranges is not None else None,
+            "counts": {str(state): {str(next_state): count for next_state, count in row.items()} for state, row in self.counts.items()},
+            "close_sums": {str(state): value for state, value in self.close_sums.items()},
+            "close_counts": {str(state): value for state, value in self.close_counts.items()},
+            "last_state": self.last_state,
+            "last_timestamp": self.last_timestamp.isoformat() if self.last_timestamp is not None else None,
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        model = cls(n_bins=data["n_bins"], features=data["features"], refit_share=data.get("refit_share", 0.1))
+        model.edges = [np.array(edges) for edges in data["edges"]] if data["edges"] is not None else None
+        # models saved before ranges were kept are refit on their next update
+        model.ranges = [tuple(feature_range) for feature_range in data["ranges"]] if data.get("ranges") is not None else None
+        model.counts = {int(state): {int(next_state): count for next_state, count in row.items()} for state, row in data["counts"].items()}
+        model.close_sums = {int(state): value for state, value in data["close_sums"].items()}
+        model.close_counts = {int(state): value for state, value in data["close_counts"].items()}
+        model.last_state = data["last_state"]
+        model.last_timestamp = pd.Timestamp(data["last_timestamp"]) if data["last_timestamp"] else None
+        return model
+
+    def save(self, path):
+        tmp_path = f"{path}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self.to_dict(), f)
+        os.replace(tmp_path, path)
+
+    @classmethod
+    def load(cls, path, **kwargs):
+        """Load a saved model, or return a new one when there is none."""
+        if not os.path.exists(path):
+            return cls(**kwargs)
+        with open(path, "r") as f:
+            return cls.from_dict(json.load(f))
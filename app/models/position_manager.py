@@ -367,6 +367,38 @@ class PositionManager:
         position.update_pl(latest_price)
     
 
+    def get_backtest_state(self):
+        """Picklable simulated account: cash, equity & positions, e.g. to checkpoint a backtest."""
+        return {
+            "cash_balance": self.cash_balance,
+            "equity": self.equity,
+            "unrealized_pnl": self.unrealized_pnl,
+            "positions": self.positions,
+            "pending_closes": self.pending_closes,
+        }
+
+    def reset_backtest_account(self):
+        """Back to the starting balance with no positions, for a new backtest."""
+        self.set_backtest_state({
+            "cash_balance": self.starting_balance,
+            "equity": self.starting_balance,
+            "unrealized_pnl": 0,
+            "positions": dict(),
+            "pending_closes": set(),
+            "pending_orders": [],
+        })
+
+    def set_backtest_state(self, state):
+        for name, value in state.items():
+            setattr(self, name, value)
+
+    def mark_positions(self, ticker_to_price_map):
+        """Reprice the open positions of the given tickers, so exposure checks see current prices across the portfolio."""
+        for ticker, price in ticker_to_price_map.items():
+            position = self.positions.get(ticker)
+            if position is not None:
+                position.update_pl(price)
+
     def update_backtest_account_position_values(self, timestamp, ticker_to_price_mapping):
         for ticker, price in ticker_to_price_mapping.items():
             if ticker in self.positions:
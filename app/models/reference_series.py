@@ -0,0 +1,125 @@
+import logging
+import threading
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+NS_PER_MINUTE = 60_000_000_000
+
+
+def to_minutes(timestamps) -> np.ndarray:
+    """Naive UTC timestamps as whole minutes since the epoch, floored onto the minute grid."""
+    return np.asarray(pd.to_datetime(timestamps).values.astype("datetime64[m]").astype(np.int64))
+
+
+class ReferenceSeries:
+    """
+    An append-only, in-memory copy of one reference series (e.g. VXX closes) on the minute grid.
+    `refresh` only loads the rows newer than the last one held, and the as-of helpers align it to any other
+    timestamps with a binary search, so every ticker joins against the same copy instead of re-reading and
+    merging the full history.
+    `loader(start)` returns a timestamp-sorted frame of `timestamp` and `name` columns from `start` onwards
+    (everything when `start` is None).
+    """
+    def __init__(self, name, loader):
+        self.name = name
+        self.loader = loader
+        self.size = 0
+        self.minutes = np.empty(1024, dtype=np.int64)
+        self.values = np.empty(1024, dtype=np.float64)
+        self.loaded_until = None  # minute up to which the source has been read
+        self._lock = threading.Lock()
+
+    @property
+    def last_minute(self):
+        return int(self.minutes[self.size - 1]) if self.size else None
+
+    def append(self, frame: pd.DataFrame):
+        """Append rows past the last one held. Returns the number of rows added."""
+        if frame.empty:
+            return 0
+        minutes = to_minutes(frame['timestamp'])
+        values = frame[self.name].to_numpy(dtype=np.float64)
+        keep = np.r_[True, minutes[1:] != minutes[:-1]]  # one value per minute
+        if self.size:
+            keep &= minutes > self.last_minute
+        minutes, values = minutes[keep], values[keep]
+        if self.size + len(minutes) > len(self.minutes):
+            capacity = max(2 * len(self.minutes), self.size + len(minutes))
+            self.minutes = np.resize(self.minutes, capacity)
+            self.values = np.resize(self.values, capacity)
+        self.minutes[self.size:self.size + len(minutes)] = minutes
+        self.values[self.size:self.size + len(minutes)] = values
+        self.size += len(minutes)
+        return len(minutes)
+
+    def refresh(self, end=None):
+        """Make sure every row before `end` the source holds is loaded, reading only the rows not loaded yet."""
+        with self._lock:
+            end_minute = None if end is None else int(pd.Timestamp(end).value // NS_PER_MINUTE)
+            if end_minute is not None and self.loaded_until is not None and end_minute <= self.loaded_until:
+                return 0
+            start = None if not self.size else pd.Timestamp((self.last_minute + 1) * NS_PER_MINUTE)
+            added = self.append(self.loader(start))
+            loaded_until = self.last_minute + 1 if self.size else None
+            if end_minute is not None:
+                loaded_until = max(loaded_until or end_minute, end_minute)
+            self.loaded_until = loaded_until
+            if added:
+                logger.debug("Reference series %r appended %r rows", self.name, added)
+            return added
+
+    def asof(self, timestamps) -> np.ndarray:
+        """The last value at or before each timestamp, NaN before the series starts."""
+        index = np.searchsorted(self.minutes[:self.size], to_minutes(timestamps), side="right") - 1
+        values = np.full(len(index), np.nan)
+        found = index >= 0
+        values[found] = self.values[index[found]]
+        return values
+
+    def frame(self, end=None, start=None) -> pd.DataFrame:
+        """
+        The rows before `end` as a `timestamp`, `name` frame. With `start` it begins at the last row at or before
+        `start`, so `asof` of any time from `start` on gives the same value on the frame as on the whole series.
+        """
+        first, last = 0, self.size
+        if start is not None:
+            start_minute = int(pd.Timestamp(start).value // NS_PER_MINUTE)
+            first = max(0, int(np.searchsorted(self.minutes[:self.size], start_minute, side="right")) - 1)
+        if end is not None:
+            last = int(np.searchsorted(self.minutes[:self.size], int(pd.Timestamp(end).value // NS_PER_MINUTE)))
+        return pd.DataFrame({
+            "timestamp": (self.minutes[first:last] * NS_PER_MINUTE).astype("datetime64[ns]"),
+            self.name: self.values[first:last].copy(),
+        })
+
+
+class ReferenceSeriesCache:
+    """Process-wide registry of ReferenceSeries, one per source & series so every strategy shares one copy."""
+    def __init__(self):
+        self.series_by_key = dict()
+        self._lock = threading.Lock()
+
+    def series(self, key, name, loader) -> ReferenceSeries:
+        with self._lock:
+            if key not in self.series_by_key:
+                self.series_by_key[key] = ReferenceSeries(name, loader)
+            return self.series_by_key[key]
+
+    def install(self, key, series: ReferenceSeries):
+        """Replace the series held under `key`, e.g. with a copy shipped to a worker process."""
+        with self._lock:
+            self.series_by_key[key] = series
+
+    def clear(self):
+        with self._lock:
+            self.series_by_key.clear()
+
+
+_reference_cache = ReferenceSeriesCache()
+
+
+def get_reference_cache() -> ReferenceSeriesCache:
+    return _reference_cache
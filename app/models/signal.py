@@ -34,6 +34,11 @@ class Signal:
         self.direction = 'short'
         return self
 
+    def __setstate__(self, state):
+        # `__dict__` is shadowed by the method below, so unpickling restores the attributes one by one
+        for key, value in state.items():
+            setattr(self, key, value)
+
     @property
     def side(self):
         side = OrderSide.BUY if self.action == 'buy' else OrderSide.SELL if self.action == 'sell' else None
@@ -1,27 +1,163 @@
 from fastapi import WebSocket
-from typing import List
+from collections import deque
+from typing import Dict
+import asyncio
+import json
 import logging
 
 logger = logging.getLogger("app")
 
+POLICIES = ("drop_oldest", "coalesce")
+
+
+class ClientWriter:
+    """
+    One connection's send side: its position in the manager's broadcast log, its own queue of direct messages
+    and the task writing both to the socket, so a slow client only ever delays itself.
+    """
+    def __init__(self, websocket: WebSocket, cursor):
+        self.websocket = websocket
+        self.cursor = cursor  # seq of the next broadcast message to send
+        self.direct = deque()  # messages for this client only, sent before broadcasts
+        self.resync = True  # send the manager's snapshot before the next broadcast
+        self.sent = 0
+        self.dropped = 0
+        self.task = None
+
+
 class WebSocketManager:
-    def __init__(self):
-        self.active_connections: List[WebSocket] = []
+    """
+    Broadcasts to every connection without waiting on any of them. A message is encoded once and appended to a
+    bounded log of the last `max_queue` messages, and one shared event wakes the writers, so broadcasting costs the
+    producer the same however many clients are connected. Each connection has a writer task sending the log from
+    its own cursor: the messages between its cursor and the newest are its send queue. With the `coalesce` policy
+    only the newest pending message of each `key` is sent. A connection whose send fails or takes over
+    `send_timeout` seconds is evicted.
+    When `snapshot` is set, a new connection is first sent the message it returns: the full state that the
+    broadcasts from then on update, e.g. the backtest frames' deltas. A writer that falls more than `max_queue`
+    messages behind is sent the snapshot again in place of the messages it lost, without one it skips them.
+    """
+    def __init__(self, max_queue=256, policy="coalesce", send_timeout=5.0):
+        if policy not in POLICIES:
+            raise ValueError(f"Unknown queue policy {policy!r}, expected one of {POLICIES}")
+        self.max_queue = max_queue
+        self.policy = policy
+        self.send_timeout = send_timeout
+        self.clients: Dict[WebSocket, ClientWriter] = dict()
+        self.log = deque(maxlen=max_queue)  # (seq, key, data) of the newest broadcasts
+        self.seq = 0  # seq of the newest broadcast
+        self.published = asyncio.Event()
+        self.snapshot = None  # callable returning the current state as one message, e.g. BacktestPublisher.snapshot
+
+    @property
+    def active_connections(self):
+        return list(self.clients)
 
     async def connect(self, websocket: WebSocket):
-        """Accepts a WebSocket connection and stores it."""
+        """Accepts a WebSocket connection and starts its writer, it receives the messages broadcast from now on."""
         await websocket.accept()
-        self.active_connections.append(websocket)
+        client = ClientWriter(websocket, self.seq + 1)
+        self.clients[websocket] = client
+        client.task = asyncio.create_task(self.write(client))
 
     async def disconnect(self, websocket: WebSocket):
-        """Removes a WebSocket connection when it disconnects."""
-        self.active_connections.remove(websocket)
-
-    async def send_message(self, message: dict):
-        """Sends a message to all active WebSocket connections."""
-        logger.debug('Sending message to all active connections')
-        for connection in self.active_connections:
-            try:
-                await connection.send_json(message)
-            except Exception as e:
-                logger.exception("Error sending message", exc_info=e)
+        """Removes a WebSocket connection when it disconnects, nothing happens when it was already evicted."""
+        client = self.clients.pop(websocket, None)
+        if client is not None and client.task is not asyncio.current_task():
+            client.task.cancel()
+
+    async def close(self):
+        for websocket in list(self.clients):
+            await self.disconnect(websocket)
+
+    @staticmethod
+    def encode(message):
+        """A dict as compact JSON text, bytes as they are."""
+        return message if isinstance(message, bytes) else json.dumps(message, separators=(",", ":"), default=str)
+
+    async def send_message(self, message, key=None):
+        """
+        Broadcasts a message (a dict sent as JSON text or bytes sent as a binary message) to all active WebSocket
+        connections. Pending messages sharing a `key` replace each other under the `coalesce` policy.
+        """
+        self.seq += 1
+        self.log.append((self.seq, key, self.encode(message)))
+        self.wake()
+
+    async def send_to(self, websocket: WebSocket, message):
+        """Sends a message to one connection only, through its writer."""
+        client = self.clients.get(websocket)
+        if client is not None:
+            client.direct.append(self.encode(message))
+            self.wake()
+
+    def wake(self):
+        # waiting writers are released by `set`, clearing straight away makes the next `wait` block again
+        self.published.set()
+        self.published.clear()
+
+    def lost(self, client: ClientWriter) -> int:
+        """The broadcasts `client` has yet to send that are no longer in the log."""
+        return max(0, self.seq - len(self.log) + 1 - client.cursor)
+
+    def pending(self, client: ClientWriter):
+        """The broadcasts `client` has yet to send under the queue policy, counting the ones it fell too far behind for."""
+        oldest = self.seq - len(self.log) + 1
+        if client.cursor < oldest:
+            client.dropped += oldest - client.cursor
+            logger.warning("WebSocket client fell behind, %r messages dropped", oldest - client.cursor)
+            client.cursor = oldest
+        pending = [self.log[i] for i in range(client.cursor - oldest, len(self.log))]
+        if self.policy == "coalesce" and len(pending) > 1:
+            newest = {key: seq for seq, key, _ in pending if key is not None}
+            pending = [message for message in pending if message[1] is None or newest[message[1]] == message[0]]
+        return pending
+
+    async def write(self, client: ClientWriter):
+        """The writer task of one connection, runs until the connection is removed or evicted."""
+        try:
+            while True:
+                if client.direct:
+                    await self._send(client, client.direct.popleft())
+                    continue
+                if self.snapshot is not None and self.lost(client):
+                    logger.warning("WebSocket client fell %r messages behind, resending the snapshot", self.lost(client))
+                    client.dropped += self.lost(client)
+                    client.resync = True
+                if client.resync:
+                    client.resync = False
+                    if self.snapshot is not None:
+                        await self.send_snapshot(client)
+                        continue
+                pending = self.pending(client)
+                if not pending:
+                    await self.published.wait()
+                    continue
+                for seq, _, data in pending:
+                    await self._send(client, data)
+                    client.cursor = seq + 1
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("Evicting WebSocket client after a failed send: %r", e)
+            await self.evict(client)
+
+    async def send_snapshot(self, client: ClientWriter):
+        """Send `client` the snapshot, it then receives the broadcasts made after it was taken."""
+        data = self.encode(self.snapshot())
+        client.cursor = self.seq + 1
+        await self._send(client, data)
+
+    async def _send(self, client: ClientWriter, data):
+        if isinstance(data, bytes):
+            await asyncio.wait_for(client.websocket.send_bytes(data), self.send_timeout)
+        else:
+            await asyncio.wait_for(client.websocket.send_text(data), self.send_timeout)
+        client.sent += 1
+
+    async def evict(self, client: ClientWriter):
+        await self.disconnect(client.websocket)
+        try:
+            await client.websocket.close()
+        except Exception:
+            pass  # the connection is already gone
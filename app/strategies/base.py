@@ -1,40 +1,127 @@
 import duckdb
 import logging
+import math
+import pandas as pd
 from alpaca.data import TimeFrame
-from datetime import datetime
+from datetime import datetime, timedelta
+from typing import Optional
+
+from app.models.bar_aggregator import resample_bars
+from app.models.reference_series import ReferenceSeries, get_reference_cache
 
 logger = logging.getLogger("app")
 
+SESSION_MINUTES = 390  # 9:30 - 16:00
+HOLIDAY_PADDING_DAYS = 4
+
+
 class BaseStrategy:
+    bar_store = None  # set to a BarStore to read reference data from the consolidated store
+    db_base_path = 'dbs'
+    bar_aggregator = None  # shared BarAggregator, set by the StrategyHandler
+    # history the strategy needs to produce a signal: `lookback_bars` bars of `lookback_interval`
+    # the StrategyHandler only loads that window, None loads the full history
+    lookback_interval = "1min"
+    lookback_bars = None
+    uses_vxx = False  # reads the VXX reference series
+    # minutes of the hour the strategy evaluates the latest candle at, None evaluates every candle
+    evaluation_minutes = None
+    # minute candles the strategy needs before it can produce a signal
+    warmup_candles = 0
+
+    def is_due(self, timestamp) -> bool:
+        """True when the strategy evaluates a latest candle stamped `timestamp`."""
+        return self.evaluation_minutes is None or timestamp.minute in self.evaluation_minutes
+
+    def is_warm(self, data: pd.DataFrame) -> bool:
+        """True when `data` holds enough candles to evaluate."""
+        return len(data) >= self.warmup_candles
+
+    def history_window(self) -> Optional[timedelta]:
+        """Calendar time covering `lookback_bars` bars of `lookback_interval` of regular trading sessions."""
+        if self.lookback_bars is None:
+            return None
+        bar_minutes = min(pd.Timedelta(self.lookback_interval).total_seconds() / 60, SESSION_MINUTES)
+        sessions = math.ceil(self.lookback_bars * bar_minutes / SESSION_MINUTES)
+        return timedelta(days=math.ceil(sessions * 7 / 5) + HOLIDAY_PADDING_DAYS)
+
+    def configure(self, **params):
+        """Override tunable attributes, e.g. thresholds & lookbacks in a parameter sweep."""
+        for name, value in params.items():
+            if not hasattr(self, name) or callable(getattr(self, name)):
+                raise ValueError(f"{self.name} has no parameter {name!r}")
+            setattr(self, name, value)
+
+    def resample_data(self, data: pd.DataFrame, interval="15min") -> pd.DataFrame:
+        """Resample minute-level data into the specified interval."""
+        return resample_bars(data, interval)
+
+    def aggregate(self, ticker, data: pd.DataFrame, interval) -> pd.DataFrame:
+        """
+        `interval` bars covering `data`. Read from the shared BarAggregator when its candles cover these,
+        otherwise resampled from `data`.
+        """
+        if self.bar_aggregator is not None:
+            aggregated = self.bar_aggregator.window(ticker, interval, data)
+            if aggregated is not None:
+                return aggregated
+        return self.resample_data(data, interval=interval)
+
+    def get_ticker_state(self, ticker):
+        """Picklable per ticker state carried between signals, so a ticker can be evaluated in another process."""
+        return None
+
+    def set_ticker_state(self, ticker, state):
+        pass
+
     def generate_signal(self, ticker, data):
         raise NotImplementedError("generate_signal method must be implemented in child class")
 
-    def fetch_vxx_data(self, end: datetime=None):
-        if end:
-            end_timestamp = end.strftime('%Y-%m-%d %H:%M:%S')
-            query = f"""
-            SELECT timestamp, close as vxx
-            FROM ticker_data
-            WHERE timestamp < TIMESTAMP '{end_timestamp}'
-            ORDER BY timestamp ASC
-            """
-        else:
-            query = """
-            SELECT timestamp, close as vxx
-            FROM ticker_data
-            ORDER BY timestamp ASC
-            """
+    def generate_signals_vectorized(self, ticker, frame: pd.DataFrame, ends) -> Optional[pd.DataFrame]:
+        """
+        Optional whole-history mode for backtests: the signal `generate_signal` gives at every backtest clock time
+        in `ends`, each computed only from the candles of `frame` before that time.
+        Returns a frame indexed by `ends` with `action` (None when there is no signal), `price` & `reason` columns and
+        optionally `direction` (long by default), `stop_loss` & `take_profit`. None when the strategy has no
+        vectorized implementation and is evaluated candle by candle.
+        """
+        return None
+
+    def vxx_key(self):
+        source = self.bar_store.db_path if self.bar_store is not None else self.db_base_path
+        return ('VXX', source)
+
+    def vxx_series(self) -> ReferenceSeries:
+        """The process-wide, append-only VXX closes of this strategy's data source."""
+        return get_reference_cache().series(self.vxx_key(), 'vxx', self.load_vxx_data)
+
+    def load_vxx_data(self, start: datetime=None):
+        """Read VXX closes from `start` onwards, the whole history when None."""
+        if self.bar_store is not None:
+            return self.bar_store.get_ticker_data('VXX', TimeFrame.Minute, start=start, columns=['timestamp', 'close AS vxx'])
+        query = "SELECT timestamp, close as vxx FROM ticker_data"
+        params = []
+        if start is not None:
+            query += " WHERE timestamp >= ?"
+            params.append(start)
+        query += " ORDER BY timestamp ASC"
         conn = duckdb.connect(f"{self.db_base_path}/VXX_1Min_data.db")
-        df = conn.sql(query).fetchdf()
-        conn.close()
+        try:
+            return conn.execute(query, params).df()
+        finally:
+            conn.close()
 
-        return df
+    def fetch_vxx_data(self, end: datetime=None):
+        series = self.vxx_series()
+        series.refresh(end)
+        return series.frame(end)
 
 
-def get_ticker_data(ticker, connection, timeframe=TimeFrame.Minute, db_base_path='dbs'):
-    # Query the minute-level data
+def get_ticker_data(ticker, connection, timeframe=TimeFrame.Minute, db_base_path='dbs', start: datetime = None):
+    # Query the minute-level data, only from `start` onwards when given
     connection_str = f"{db_base_path}/{ticker}_{timeframe}_data.db"
-    query = f"SELECT * FROM ticker_data ORDER BY timestamp ASC"
+    where = f"WHERE timestamp >= TIMESTAMP '{start.strftime('%Y-%m-%d %H:%M:%S')}'" if start is not None else ""
+    query = f"SELECT * FROM ticker_data {where} ORDER BY timestamp ASC"
     try:
         logger.debug("Connecting to database: %r", connection_str)
         data = connection.sql(query).df()  # Convert to Pandas DataFrame
@@ -51,17 +138,18 @@ def get_ticker_data(ticker, connection, timeframe=TimeFrame.Minute, db_base_path
     return data
 
 
-def get_ticker_data_by_timeframe(ticker, connection, timeframe=TimeFrame.Minute, db_base_path='dbs', end: datetime = None):
+def get_ticker_data_by_timeframe(ticker, connection, timeframe=TimeFrame.Minute, db_base_path='dbs', end: datetime = None, start: datetime = None):
     if end is None:
         raise ValueError("The 'end' parameter cannot be None.")
     
     # Format the `end` timestamp as a string that DuckDB can interpret
     end_timestamp_str = end.strftime('%Y-%m-%d %H:%M:%S')
+    start_filter = f"AND timestamp >= TIMESTAMP '{start.strftime('%Y-%m-%d %H:%M:%S')}'" if start is not None else ""
 
     query = f"""
         SELECT timestamp, open, high, low, close, volume, vwap 
         FROM ticker_data 
-        WHERE timestamp < TIMESTAMP '{end_timestamp_str}' 
+        WHERE timestamp < TIMESTAMP '{end_timestamp_str}' {start_filter}
         ORDER BY timestamp ASC
     """
     
@@ -1,5 +1,6 @@
 from app.models.signal import Signal
 from app.strategies.base import BaseStrategy
+from app.utils.indicators import MACD, RSI, VWAP, IndicatorEngine
 import pandas as pd
 import numpy as np
 import logging
@@ -8,6 +9,11 @@ from alpaca.data import TimeFrame
 
 logger = logging.getLogger("app")
 
+
+def market_profile_indicators():
+    return {"rsi": RSI(14), "macd": MACD(12, 26, 9), "vwap": VWAP()}
+
+
 class MarketProfileStrategy(BaseStrategy):
     def __init__(self, timeframe: TimeFrame.Hour):
         super().__init__()
@@ -16,6 +22,13 @@ class MarketProfileStrategy(BaseStrategy):
         self.timeframe = timeframe
         self.name = 'market_profile'
         self.display_name = 'Market Profile'
+        self.lookback_interval = "1min"
+        self.lookback_bars = 60 * 7 * 10  # 10 DAYS: 60 min * 7 hours * 10 days
+        # every hour on the hour, once 10 days of minute candles are loaded
+        self.evaluation_minutes = frozenset([0])
+        self.warmup_candles = self.lookback_bars
+        # streaming RSI, MACD & VWAP per ticker and interval, updated with the bars completed since the last signal
+        self.indicators = IndicatorEngine(market_profile_indicators)
 
     def calculate_rsi(self, data: pd.DataFrame, period: int = 14) -> pd.Series:
         """Calculate Relative Strength Index (RSI)."""
@@ -44,6 +57,52 @@ class MarketProfileStrategy(BaseStrategy):
         cumulative_volume = data['volume'].cumsum()
         return cumulative_price_volume / cumulative_volume
 
+    def latest_indicators(self, ticker, interval, aggregated_data: pd.DataFrame) -> Dict:
+        """
+        RSI, MACD and VWAP of the last aggregated bar. Only bars completed since the previous call are streamed
+        into the indicators and the last bar, which is still being filled, is peeked without being committed.
+        The indicator state is rebuilt when the bars don't continue from it, e.g. when a backtest restarts.
+        """
+        timestamps = aggregated_data['timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        closes = aggregated_data['close'].to_numpy(dtype=np.float64)
+        volumes = aggregated_data['volume'].to_numpy(dtype=np.float64)
+        completed = len(timestamps) - 1
+
+        indicator_set = self.indicators.get(ticker, interval)
+        first = 0
+        if indicator_set.last_timestamp is not None:
+            first = int(np.searchsorted(timestamps[:completed], indicator_set.last_timestamp))
+            if first == completed or timestamps[first] != indicator_set.last_timestamp:
+                self.indicators.reset(ticker, interval)
+                indicator_set = self.indicators.get(ticker, interval)
+                first = 0
+            else:
+                first += 1
+        for i in range(first, completed):
+            indicator_set.update({"timestamp": int(timestamps[i]), "close": float(closes[i]), "volume": float(volumes[i])})
+        # the VWAP is anchored at the start of the aggregated window like `calculate_vwap`
+        indicator_set.indicators["vwap"].trim(int(timestamps[0]))
+
+        latest = indicator_set.peek({"timestamp": int(timestamps[-1]), "close": float(closes[-1]), "volume": float(volumes[-1])})
+        return {
+            "close": closes[-1],
+            "vwap": latest["vwap"],
+            "rsi": latest["rsi"],
+            "macd": latest["macd"]["macd"],
+            "signal_line": latest["macd"]["signal"],
+        }
+
+    def configure(self, **params):
+        super().configure(**params)
+        if 'lookback_bars' in params:
+            self.warmup_candles = self.lookback_bars
+
+    def get_ticker_state(self, ticker):
+        return self.indicators.ticker_sets(ticker)
+
+    def set_ticker_state(self, ticker, state):
+        self.indicators.set_ticker_sets(ticker, state)
+
     def generate_signal(self, ticker, data: pd.DataFrame) -> Signal:
         """Generate buy/sell signals based on market profile and technical indicators."""
         price = data.iloc[-1]['close']
@@ -56,39 +115,19 @@ class MarketProfileStrategy(BaseStrategy):
             return signal
         
         timestamp = data['timestamp'].iloc[-1]
-        # Ensure there are enough 1-minute candles for aggregation
-        required_candles = 60 * 7 * 10  #  10 DAYS: 60 min * 7 hours * 10 days
-        if data.shape[0] < required_candles:
-            return signal
-        elif timestamp.minute != 0: # Check every hour on the hour
+        # Ensure there are enough 1-minute candles for aggregation & check every hour on the hour
+        if not self.is_warm(data) or not self.is_due(timestamp):
             return signal
 
-        # Resample data to the required timeframe (e.g., 1 hour)
-        data['timestamp'] = pd.to_datetime(data['timestamp'])
-        data.set_index('timestamp', inplace=True)
-        aggregated_data = data.resample(self.timeframe.value).agg({
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum',
-        }).dropna()
-
-        # Add VWAP to the aggregated data
-        aggregated_data['vwap'] = self.calculate_vwap(aggregated_data)
+        # Aggregate data to the required timeframe (e.g., 1 hour)
+        aggregated_data = self.aggregate(ticker, data, self.timeframe.value)
 
         # Check if there are enough aggregated intervals for analysis
         if aggregated_data.shape[0] < 90:  # Minimum 90 intervals for reliable signal generation
             return signal
 
-        # Add technical indicators
-        aggregated_data['rsi'] = self.calculate_rsi(aggregated_data)
-        macd_data = self.calculate_macd(aggregated_data)
-        aggregated_data['macd'] = macd_data['macd']
-        aggregated_data['signal_line'] = macd_data['signal']
-
-        # Get the most recent row for signal calculation
-        latest_row = aggregated_data.iloc[-1]
+        # Technical indicators of the most recent row for signal calculation
+        latest_row = self.latest_indicators(ticker, self.timeframe.value, aggregated_data)
 
         # Conditions for a buy signal
         if latest_row['rsi'] < self.low_rsi_threshold and latest_row['close'] > latest_row['vwap'] and latest_row['macd'] > latest_row['signal_line']:
@@ -1,4 +1,7 @@
+import os
+import zlib
 from datetime import datetime
+from app.models.markov_model import MarkovTransitionModel
 from app.models.signal import Signal
 from app.strategies.base import BaseStrategy
 import numpy as np
@@ -10,13 +13,26 @@ logger = logging.getLogger("app")
 
 class MarkovPredictionStrategy(BaseStrategy):
 
-    def __init__(self, db_base_path='dbs'):
+    def __init__(self, db_base_path='dbs', bar_store=None, seed=None, n_steps=1, n_bins=10, model_dir=None):
         super().__init__()
-        self.transition_matrix = None
-        self.unique_states = None
+        self.seed = seed  # seed it for reproducible simulations
+        self.rng = np.random.default_rng(seed)
+        self.rngs = dict()  # per ticker generators so results don't depend on the order tickers are evaluated in
+        self.n_steps = n_steps  # prediction horizon in resampled intervals
+        self.n_bins = n_bins  # quantile bins per feature
+        self.model_dir = model_dir  # per ticker models are saved here between runs, None keeps them in memory
+        self.models = dict()
         self.db_base_path = db_base_path
+        self.bar_store = bar_store
         self.name = 'markov'
         self.display_name = 'Markov Prediction'
+        self.uses_vxx = True
+        # train the chain on ~3 months of hourly states
+        self.lookback_interval = "60min"
+        self.lookback_bars = 600
+        # every hour on the 29th minute
+        self.evaluation_minutes = frozenset([29])
+        self.warmup_candles = 15
         # self.signal_strategy = SignalStrategy()
 
     def discretize_features(self, data, n_bins=10):
@@ -44,11 +60,10 @@ class MarkovPredictionStrategy(BaseStrategy):
             return signal
         # Ensure the timestamp aligns with 15-minute intervals and there are enough data points
         timestamp = data['timestamp'].iloc[-1]
-        # check every hour on the 29th minute
-        if timestamp.minute != 29 or data.shape[0] < 15:
+        if not self.is_due(timestamp) or not self.is_warm(data):
             return signal
         try:
-            current_close, predicted_close = self.make_prediction(data)
+            current_close, predicted_close = self.make_prediction(data, ticker=ticker)
             logger.debug("Predicted close price for %r: %d -> %d", ticker, current_close, predicted_close)
         except ValueError as e:
             logger.error("Failed to make prediction for %r", exc_info=e)
@@ -63,7 +78,7 @@ class MarkovPredictionStrategy(BaseStrategy):
         logger.debug("Signal generated for %r: %r", ticker, signal)
         return signal
 
-    def make_prediction(self, ticker_data, interval="60min", n_simulations=5000):
+    def make_prediction(self, ticker_data, interval="60min", n_simulations=5000, ticker=None):
         """
         Predict the next close price using Markov chain simulations.
         
@@ -71,67 +86,89 @@ class MarkovPredictionStrategy(BaseStrategy):
             ticker_data: DataFrame containing ticker data.
             interval: Resampling interval (e.g., "15T" for 15 minutes).
             n_simulations: Number of simulations to run.
+            ticker: read the ticker's bars from the shared BarAggregator when given.
         
         Returns:
             current_close: The current close price.
             predicted_close: The most commonly predicted close price.
         """
-        # Fetch and preprocess VXX data
-        vxx_data = self.fetch_vxx_data(end=ticker_data['timestamp'].iloc[-1])
-        logger.debug("VXX data: %r", vxx_data.head())
-        ticker_data = pd.merge(ticker_data, vxx_data, on='timestamp', how='outer').sort_values(by='timestamp')
-        ticker_data.infer_objects(copy=False)
-        ticker_data.interpolate(method='linear', inplace=True)
-        ticker_data.dropna(inplace=True)
-        logger.debug("Merged data: %r", ticker_data.head())
-
-        # Resample data
-        ticker_data = self.resample_data(ticker_data, interval=interval)
+        # Align the shared VXX series to the candles, only the rows not seen yet are read
+        end = ticker_data['timestamp'].iloc[-1]
+        vxx = self.vxx_series()
+        vxx.refresh(end)
+
+        bars = None
+        if ticker is not None and self.bar_aggregator is not None:
+            bars = self.bar_aggregator.window(ticker, interval, ticker_data)
+        if bars is not None:
+            # the VXX value as of each bar's last candle
+            bar_ends = (bars['timestamp'] + pd.Timedelta(interval) - pd.Timedelta(minutes=1)).clip(upper=end)
+            ticker_data = bars.assign(vxx=vxx.asof(bar_ends)).dropna()
+        else:
+            ticker_data = ticker_data.assign(vxx=vxx.asof(ticker_data['timestamp'])).dropna()
+            logger.debug("Merged data: %r", ticker_data.head())
+
+            # Resample data
+            ticker_data = self.resample_data(ticker_data, interval=interval)
         if ticker_data.empty:
             raise ValueError(f"Resampled data is empty. Cannot make predictions for interval {interval}.")
 
         logger.debug("Resampled data: %r", ticker_data.iloc[-1])
-        # Train Markov chain
-        self.train_markov_chain(ticker_data)
-        
+        # Count the transitions of the completed bars, the last one is still being filled
+        model = self.get_model(ticker, interval)
+        model.update(ticker_data.iloc[:-1])
+        if model.edges is None:
+            model.fit_edges(ticker_data)
+
         # Get the current state
-        current_state = ticker_data[['close', 'volume', 'vwap', 'vxx']].values[-1]
+        current_state = int(model.states(ticker_data.iloc[-1:])[0])
+        current_close = ticker_data['close'].iloc[-1]
         logger.debug('Current state: %r', current_state)
-        # Simulate future states
-        predictions = []
-        for _ in range(n_simulations):
-            state_index = np.where((self.unique_states == current_state).all(axis=1))[0]
-            if len(state_index) == 0:
-                raise ValueError("Current state not found in unique states.")
-            state_index = state_index[0]
-
-            # Predict the next state
-            next_state_index = np.random.choice(
-                range(len(self.unique_states)),
-                p=self.transition_matrix[state_index]
-            )
-            predictions.append(self.unique_states[next_state_index][0])  # Append the predicted close price
-
-        # Determine the most common predicted close price
-        predicted_close = np.mean(predictions)  # Alternatively, use np.median or mode
-        logger.debug("Close price: %d", ticker_data['close'].iloc[-1])
+        # Simulate every future path at once
+        predicted_close = model.predict_close(current_state, current_close, n_steps=self.n_steps, n_simulations=n_simulations, rng=self.ticker_rng(ticker))
+        logger.debug("Close price: %d", current_close)
         logger.debug("Predicted close price: %d", predicted_close)
-        current_close = ticker_data['close'].iloc[-1]
+        if ticker is not None and self.model_dir is not None:
+            os.makedirs(self.model_dir, exist_ok=True)
+            model.save(self.model_path(ticker, interval))
         return current_close, predicted_close
 
-
-    def predict_next_state(self, current_state, n_steps=1):
-        state_index = np.where((self.unique_states == current_state).all(axis=1))[0][0]
-        for _ in range(n_steps):
-            next_state_index = np.random.choice(range(len(self.unique_states)), p=self.transition_matrix[state_index])
-            next_state = self.unique_states[next_state_index]
-            state_index = next_state_index
-        return next_state
+    def ticker_rng(self, ticker):
+        if ticker is None:
+            return self.rng
+        if ticker not in self.rngs:
+            self.rngs[ticker] = np.random.default_rng(None if self.seed is None else [self.seed, zlib.crc32(ticker.encode())])
+        return self.rngs[ticker]
+
+    def get_ticker_state(self, ticker):
+        models = {key: model for key, model in self.models.items() if key[0] == ticker}
+        return {"models": models, "rng": self.rngs.get(ticker)}
+
+    def set_ticker_state(self, ticker, state):
+        if not state:
+            return
+        self.models.update(state["models"])
+        if state["rng"] is not None:
+            self.rngs[ticker] = state["rng"]
+
+    def model_path(self, ticker, interval):
+        return os.path.join(self.model_dir, f"{ticker}_{interval}_markov.json")
+
+    def get_model(self, ticker, interval) -> MarkovTransitionModel:
+        """The ticker's transition model, loaded from `model_dir` on first use. Without a ticker a throwaway model is fit."""
+        if ticker is None:
+            return MarkovTransitionModel(n_bins=self.n_bins)
+        key = (ticker, interval)
+        if key not in self.models:
+            if self.model_dir is not None:
+                self.models[key] = MarkovTransitionModel.load(self.model_path(ticker, interval), n_bins=self.n_bins)
+            else:
+                self.models[key] = MarkovTransitionModel(n_bins=self.n_bins)
+        return self.models[key]
 
     def resample_data(self, data, interval="15min"):
         """Resample minute-level data into 15-minute intervals."""
-        data['timestamp'] = pd.to_datetime(data['timestamp'])  # Ensure timestamp is datetime
-        data.set_index('timestamp', inplace=True)
+        data = data.set_index(pd.to_datetime(data['timestamp']))  # Ensure timestamp is datetime
         def safe_last(x):
             return x.iloc[-1] if len(x) > 0 else np.nan
         
@@ -148,22 +185,6 @@ class MarkovPredictionStrategy(BaseStrategy):
         aggregated.reset_index(inplace=True)
         return aggregated
 
-    def train_markov_chain(self, data):
-        logger.debug("Training Markov chain with data: %r", data.head())
-        # data = self.discretize_features(data)
-        states = data[['close', 'volume', 'vwap', 'vxx']].values
-        unique_states, indices = np.unique(states, axis=0, return_inverse=True)
-        n_states = len(unique_states)
-        transition_matrix = np.zeros((n_states, n_states))
-        
-        for (i, j) in zip(indices, indices[1:]):
-            transition_matrix[i, j] += 1
-        
-        transition_matrix = (transition_matrix + 1) / (transition_matrix.sum(axis=1, keepdims=True) + n_states)
-        self.transition_matrix = transition_matrix
-        self.unique_states = unique_states
-
-
     def to_dict(self):
         return {
             'name': self.name,
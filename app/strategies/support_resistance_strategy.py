@@ -1,3 +1,5 @@
+from app.models.bar_aggregator import NS_PER_MINUTE, interval_minutes
+from app.models.level_index import LevelIndex
 from app.models.signal import Signal
 from app.strategies.base import BaseStrategy
 import pandas as pd
@@ -17,35 +19,123 @@ class SupportResistanceStrategy(BaseStrategy):
         self.name = 'support_resistance'
         self.display_name = 'Support & Resistance'
         self.time_interval = "15min"
-
-    def resample_data(self, data: pd.DataFrame, interval="4hour") -> pd.DataFrame:
-        """Resample minute-level data into 4-hour intervals."""
-        data['timestamp'] = pd.to_datetime(data['timestamp'])
-        data.set_index('timestamp', inplace=True)
-
-        aggregated = data.resample(interval).agg({
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum'
-        }).dropna()
-
-        aggregated.reset_index(inplace=True)
-        return aggregated
+        # 60 minute candles per `lookback` interval are required before resampling
+        self.lookback_interval = "1min"
+        self.lookback_bars = 60 * self.lookback
+        # every minute but on the hour, once a full lookback of minute candles is loaded
+        self.evaluation_minutes = frozenset(range(1, 60))
+        self.warmup_candles = 60 * self.lookback
+        self.order = 5  # bars on each side a local extreme must beat to become a level
+        self.levels = dict()  # ticker -> LevelIndex of its current window
 
     def find_support_resistance(self, data: pd.DataFrame):
         """Identify support and resistance levels using local minima and maxima."""
         # Find local minima (support levels)
-        local_mins = argrelextrema(data['low'].values, np.less, order=5)[0]
+        local_mins = argrelextrema(data['low'].values, np.less, order=self.order)[0]
         support_levels = data.iloc[local_mins]['low'].values
 
         # Find local maxima (resistance levels)
-        local_maxs = argrelextrema(data['high'].values, np.greater, order=5)[0]
+        local_maxs = argrelextrema(data['high'].values, np.greater, order=self.order)[0]
         resistance_levels = data.iloc[local_maxs]['high'].values
 
         return support_levels, resistance_levels
 
+    def latest_levels(self, ticker, data: pd.DataFrame) -> LevelIndex:
+        """
+        The level index of `ticker` over the window of aggregated bars `data`. Only the bars completed since the
+        previous call are added and levels older than the window expire, the last bar is still being filled.
+        The index is rebuilt when the bars don't continue from it, e.g. when a backtest restarts.
+        """
+        timestamps = data['timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        completed = len(timestamps) - 1
+        levels = self.levels.get(ticker)
+        first = 0
+        if levels is not None and levels.last_timestamp is not None:
+            first = int(np.searchsorted(timestamps[:completed], levels.last_timestamp))
+            if first == completed or timestamps[first] != levels.last_timestamp or timestamps[0] < levels.start:
+                levels = None
+                first = 0
+            else:
+                first += 1
+        if levels is None:
+            levels = self.levels[ticker] = LevelIndex(order=self.order)
+        highs, lows = data['high'].to_numpy(dtype=np.float64), data['low'].to_numpy(dtype=np.float64)
+        for i in range(first, completed):
+            levels.update(int(timestamps[i]), float(highs[i]), float(lows[i]))
+        levels.expire(int(timestamps[0]))
+        return levels
+
+    def nearest_level(self, levels: LevelIndex, price):
+        """(action, reason) of a price near a support (buy) or else near a resistance (sell), (None, None) otherwise."""
+        # Buy signal: Price is near support
+        support = levels.nearest_support(price, self.support_threshold)
+        if support is not None:
+            return 'buy', f"Price near support at {support:.2f}"
+
+        # Sell signal: Price is near resistance
+        resistance = levels.nearest_resistance(price, self.resistance_threshold)
+        if resistance is not None:
+            return 'sell', f"Price near resistance at {resistance:.2f}"
+        return None, None
+
+    def configure(self, **params):
+        super().configure(**params)
+        if 'lookback' in params:
+            self.lookback_bars = self.warmup_candles = 60 * self.lookback
+        self.levels = dict()  # levels indexed with the previous parameters
+
+    def get_ticker_state(self, ticker):
+        return self.levels.get(ticker)
+
+    def set_ticker_state(self, ticker, state):
+        self.levels.pop(ticker, None)
+        if state is not None:
+            self.levels[ticker] = state
+
+    def generate_signals_vectorized(self, ticker, frame: pd.DataFrame, ends) -> pd.DataFrame:
+        """
+        `generate_signal` for every backtest clock time in `ends` at once, each from the candles of `frame` before
+        that time and bars built like the shared BarAggregator builds them from `frame`. Eligible clock times are
+        found with array operations, a single level index then walks the bars once for all of them.
+        """
+        ends = pd.DatetimeIndex(ends)
+        actions, reasons, prices = np.full(len(ends), None, dtype=object), np.full(len(ends), None, dtype=object), np.full(len(ends), np.nan)
+        signals = pd.DataFrame({"action": actions, "price": prices, "reason": reasons}, index=ends)
+        if frame.empty or ends.empty:
+            return signals
+        timestamps = frame['timestamp'].values.astype("datetime64[ns]")
+        latest = np.searchsorted(timestamps, ends.values.astype("datetime64[ns]"), side="left") - 1
+        first = np.searchsorted(timestamps, (ends - self.history_window()).values.astype("datetime64[ns]"), side="left")
+        valid = latest >= first
+        latest, first = np.maximum(latest, 0), np.minimum(first, len(timestamps) - 1)
+
+        minutes = timestamps.astype("datetime64[m]").astype(np.int64)
+        buckets = minutes - minutes % interval_minutes(self.time_interval)
+        new_bar = np.r_[True, buckets[1:] != buckets[:-1]]
+        bar_of = np.cumsum(new_bar) - 1
+        low, high = frame['low'].to_numpy(dtype=np.float64), frame['high'].to_numpy(dtype=np.float64)
+        lows, highs = np.minimum.reduceat(low, np.flatnonzero(new_bar)), np.maximum.reduceat(high, np.flatnonzero(new_bar))
+
+        first_bar, last_bar = bar_of[first], bar_of[latest]
+        due = np.isin(minutes[latest] % 60, list(self.evaluation_minutes))
+        rows = np.flatnonzero(valid & due & (latest - first + 1 >= self.warmup_candles) & (last_bar - first_bar + 1 >= self.lookback))
+        if not len(rows):
+            return signals
+        latest, first_bar, last_bar = latest[rows], first_bar[rows], last_bar[rows]
+        prices[rows] = frame['close'].to_numpy(dtype=np.float64)[latest]
+        bar_starts = buckets[new_bar] * NS_PER_MINUTE
+
+        # the bars stream in from the first evaluated window, like the index `latest_levels` keeps
+        levels = LevelIndex(order=self.order)
+        streamed = first_bar[0]
+        for row, window_bar, open_bar in zip(rows.tolist(), first_bar.tolist(), last_bar.tolist()):
+            for bar in range(streamed, open_bar):
+                levels.update(int(bar_starts[bar]), float(highs[bar]), float(lows[bar]))
+            streamed = max(streamed, open_bar)
+            levels.expire(int(bar_starts[window_bar]))
+            actions[row], reasons[row] = self.nearest_level(levels, prices[row])
+        return pd.DataFrame({"action": actions, "price": prices, "reason": reasons}, index=ends)
+
     def generate_signal(self, ticker, data: pd.DataFrame) -> Signal:
         """Generate buy/sell signals based on support and resistance levels."""
         if data.empty:
@@ -59,8 +149,7 @@ class SupportResistanceStrategy(BaseStrategy):
         signal = Signal(strategy=self.name, ticker=ticker, price=current_price)
 
         timestamp = data['timestamp'].iloc[-1]
-        # check every hour on the 29th minute
-        if timestamp.minute == 0 or data.shape[0] < (60 * self.lookback):
+        if not self.is_due(timestamp) or not self.is_warm(data):
             # convert timestamp to local PST
             if timestamp.tz is None:  # If timestamp is naive, localize it first
                 timestamp = timestamp.tz_localize('UTC')
@@ -71,30 +160,21 @@ class SupportResistanceStrategy(BaseStrategy):
         else:
             logger.debug(f"Generating signal for %r at %r", ticker, timestamp)
         
-        # Resample data into 15-minute intervals
-        data = self.resample_data(data, interval=self.time_interval)
+        # Aggregate data into 15-minute intervals
+        data = self.aggregate(ticker, data, self.time_interval)
 
         # Ensure enough historical data for support/resistance analysis
         if data.shape[0] < self.lookback:
             return Signal(strategy="support_resistance", ticker=ticker)
 
-        # Identify support and resistance levels
-        support_levels, resistance_levels = self.find_support_resistance(data)
-
-        # Buy signal: Price is near support
-        for support in support_levels:
-            if (current_price <= support * (1 + self.support_threshold)):
-                signal.buy()
-                signal.reason = f"Price near support at {support:.2f}"
-                return signal
-
-        # Sell signal: Price is near resistance
-        for resistance in resistance_levels:
-            if (current_price >= resistance * (1 - self.resistance_threshold)):
-                signal.close()
-                signal.reason = f"Price near resistance at {resistance:.2f}"
-                return signal
+        # Support and resistance levels of the window, updated with the bars completed since the last signal
+        levels = self.latest_levels(ticker, data)
 
+        action, signal.reason = self.nearest_level(levels, current_price)
+        if action == 'buy':
+            signal.buy()
+        elif action == 'sell':
+            signal.close()
         return signal
 
     def to_dict(self) -> Dict:
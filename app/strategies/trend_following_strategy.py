@@ -1,5 +1,6 @@
 from app.models.signal import Signal
 from app.strategies.base import BaseStrategy
+from app.utils.indicators import IndicatorEngine, SwingPoints
 import pandas as pd
 import numpy as np
 import logging
@@ -7,6 +8,11 @@ from typing import Dict, Optional
 
 logger = logging.getLogger("app")
 
+
+def trend_indicators():
+    return {"swing_points": SwingPoints()}
+
+
 class TrendFollowingStrategy(BaseStrategy):
     def __init__(self):
         super().__init__()
@@ -16,22 +22,11 @@ class TrendFollowingStrategy(BaseStrategy):
         self.take_profit_multiplier = 0.02  # 2% take profit from the recent high
         self.name = 'trend_following'
         self.display_name = 'Trend Following'
-
-    def resample_data(self, data: pd.DataFrame, interval="15min") -> pd.DataFrame:
-        """Resample minute-level data into the specified interval."""
-        data['timestamp'] = pd.to_datetime(data['timestamp'])
-        data.set_index('timestamp', inplace=True)
-
-        aggregated = data.resample(interval).agg({
-            'open': 'first',
-            'high': 'max',
-            'low': 'min',
-            'close': 'last',
-            'volume': 'sum'
-        }).dropna()
-
-        aggregated.reset_index(inplace=True)
-        return aggregated
+        self.lookback_interval = "15min"
+        self.lookback_bars = self.lookback
+        self.time_interval = "15min"
+        # latest higher high & higher low per ticker, updated with the bars completed since the last signal
+        self.swings = IndicatorEngine(trend_indicators)
 
     def detect_trend(self, data: pd.DataFrame) -> Optional[Dict[str, any]]:
         """
@@ -47,44 +42,77 @@ class TrendFollowingStrategy(BaseStrategy):
         highs = data['high'].values
         lows = data['low'].values
 
-        # Look for higher highs followed by a higher low
-        higher_highs = []
-        higher_lows = []
-
-        for i in range(len(data) - 1):
-            if highs[i] > highs[i - 1]:
-                higher_highs.append(i)
-            if lows[i] > lows[i - 1]:
-                higher_lows.append(i)
-
-        # Check if the last candle is a breakout from the higher low
-        if len(higher_highs) > 0 and len(higher_lows) > 0:
-            # Find the most recent higher low
-            higher_low_index = higher_lows[-1]
-
-            # Ensure the higher low is after the last higher high
-            if higher_low_index > higher_highs[-1]:
-                # Check if the last candle is a breakout (closes above the higher low candle's high)
-                breakout_candle = data.iloc[-1]
-                higher_low_candle = data.iloc[higher_low_index]
-
-                if breakout_candle['close'] > higher_low_candle['high']:
-                    # Define the demand zone as the range of the higher low candle
-                    demand_zone = {
-                        "low": higher_low_candle['low'],
-                        "high": higher_low_candle['high']
-                    }
-
-                    # Find the previous high before the higher low
-                    previous_high = max(highs[higher_highs[-1]:higher_low_index])
-
-                    return {
-                        "trend": "uptrend",
-                        "demand_zone": demand_zone,
-                        "previous_high": previous_high
-                    }
-
-        return None
+        # Look for higher highs followed by a higher low, among every candle but the first and the last one
+        higher_highs = np.flatnonzero(highs[1:-1] > highs[:-2]) + 1
+        higher_lows = np.flatnonzero(lows[1:-1] > lows[:-2]) + 1
+        if len(higher_highs) == 0 or len(higher_lows) == 0:
+            return None
+        return self.uptrend(
+            {"high": highs[higher_highs[-1]], "low": lows[higher_highs[-1]], "index": higher_highs[-1]},
+            {"high": highs[higher_lows[-1]], "low": lows[higher_lows[-1]], "index": higher_lows[-1]},
+            data['close'].values[-1],
+        )
+
+    def uptrend(self, higher_high, higher_low, close) -> Optional[Dict[str, any]]:
+        # Ensure the higher low is after the last higher high
+        if higher_low["index"] <= higher_high["index"]:
+            return None
+        # Check if the last candle is a breakout (closes above the higher low candle's high)
+        if not close > higher_low["high"]:
+            return None
+        return {
+            "trend": "uptrend",
+            # Define the demand zone as the range of the higher low candle
+            "demand_zone": {"low": higher_low["low"], "high": higher_low["high"]},
+            # no candle after the last higher high is higher, so it is the highest one before the higher low
+            "previous_high": higher_high["high"],
+        }
+
+    def latest_trend(self, ticker, data: pd.DataFrame) -> Optional[Dict[str, any]]:
+        """
+        `detect_trend` from swing points kept per ticker, only the candles completed since the previous call are
+        streamed into them so a signal costs O(1) amortized. The last candle is still being filled and only breaks out.
+        The swing points are rebuilt when the candles don't continue from them, e.g. when a backtest restarts.
+        """
+        if len(data) < 200:
+            return None
+        timestamps = data['timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+        completed = len(timestamps) - 1
+
+        swings = self.swings.get(ticker, self.time_interval)
+        first = 0
+        if swings.last_timestamp is not None:
+            first = int(np.searchsorted(timestamps[:completed], swings.last_timestamp))
+            if first == completed or timestamps[first] != swings.last_timestamp:
+                self.swings.reset(ticker, self.time_interval)
+                swings = self.swings.get(ticker, self.time_interval)
+                first = 0
+            else:
+                first += 1
+        highs, lows = data['high'].to_numpy(dtype=np.float64), data['low'].to_numpy(dtype=np.float64)
+        for i in range(first, completed):
+            swings.update({"timestamp": int(timestamps[i]), "high": float(highs[i]), "low": float(lows[i])})
+
+        points = swings.indicators["swing_points"]
+        # swing points at or before the first candle are outside of this window
+        if points.higher_high is None or points.higher_low is None or points.higher_high["timestamp"] <= timestamps[0] or points.higher_low["timestamp"] <= timestamps[0]:
+            return None
+        return self.uptrend(
+            {**points.higher_high, "index": points.higher_high["timestamp"]},
+            {**points.higher_low, "index": points.higher_low["timestamp"]},
+            data['close'].values[-1],
+        )
+
+    def configure(self, **params):
+        super().configure(**params)
+        if 'lookback' in params:
+            self.lookback_bars = self.lookback
+
+    def get_ticker_state(self, ticker):
+        return self.swings.ticker_sets(ticker)
+
+    def set_ticker_state(self, ticker, state):
+        self.swings.set_ticker_sets(ticker, state)
 
     def generate_signal(self, ticker, data: pd.DataFrame) -> Signal:
         """Generate buy/sell signals based on trend detection and demand zone."""
@@ -92,8 +120,8 @@ class TrendFollowingStrategy(BaseStrategy):
             logger.debug(f"No data available for ticker {ticker}. Skipping signal generation.")
             return Signal(strategy="trend_following", ticker=ticker)
 
-        # Resample data into 15-minute intervals
-        data = self.resample_data(data, interval="15min")
+        # Aggregate data into 15-minute intervals
+        data = self.aggregate(ticker, data, self.time_interval)
 
         # Ensure enough historical data for trend analysis
         if data.shape[0] < 200:
@@ -106,7 +134,7 @@ class TrendFollowingStrategy(BaseStrategy):
         signal = Signal(strategy="trend_following", ticker=ticker, price=current_price)
 
         # Detect the current trend
-        trend_info = self.detect_trend(data)
+        trend_info = self.latest_trend(ticker, data)
 
         if trend_info and trend_info["trend"] == "uptrend":
             demand_zone = trend_info["demand_zone"]
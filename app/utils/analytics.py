@@ -0,0 +1,266 @@
+import logging
+import math
+
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+TRADING_DAYS = 252
+FLAT = 1e-9  # positions smaller than this many shares are closed
+
+
+def _as_ns(timestamps) -> np.ndarray:
+    """Timestamps of any kind as int64 nanoseconds, tz-aware ones in UTC."""
+    timestamps = pd.to_datetime(pd.Series(timestamps) if not isinstance(timestamps, pd.Series) else timestamps)
+    if getattr(timestamps.dt, "tz", None) is not None:
+        timestamps = timestamps.dt.tz_convert("UTC").dt.tz_localize(None)
+    return timestamps.to_numpy(dtype="datetime64[ns]").astype(np.int64)
+
+
+def normalize_trades(trades) -> pd.DataFrame:
+    """
+    A trade ledger (a DataFrame or rows with timestamp, ticker, side, qty & price, optionally strategy) as a frame
+    sorted by time with int64 `ns` stamps and `signed_qty`, positive for buys and negative for sells.
+    Frames it already normalized are returned as they are.
+    """
+    frame = pd.DataFrame(trades)
+    if "signed_qty" in frame.columns:
+        return frame
+    if frame.empty:
+        return pd.DataFrame(columns=["ns", "ticker", "signed_qty", "price", "strategy"])
+    # sides are OrderSide members or strings, only their few distinct values are looked at
+    sides, names = pd.factorize(frame["side"])
+    is_buy = np.array([str(getattr(name, "value", name)).lower() == "buy" for name in names], dtype=bool)[sides]
+    qty = np.abs(frame["qty"].to_numpy(dtype=np.float64))
+    frame = pd.DataFrame({
+        "ns": _as_ns(frame["timestamp"]),
+        "ticker": frame["ticker"].astype(str).to_numpy(),
+        "signed_qty": np.where(is_buy, qty, -qty),
+        "price": frame["price"].to_numpy(dtype=np.float64),
+        "strategy": frame["strategy"].to_numpy() if "strategy" in frame.columns else None,
+    })
+    return frame.sort_values("ns", kind="stable").reset_index(drop=True)
+
+
+def _group_starts(codes) -> np.ndarray:
+    """For codes sorted into runs, the index of the first row of every row's run."""
+    starts = np.r_[True, codes[1:] != codes[:-1]] if len(codes) else np.empty(0, dtype=bool)
+    return np.maximum.accumulate(np.where(starts, np.arange(len(codes)), 0))
+
+
+def _group_cumsum(values, codes) -> np.ndarray:
+    """Cumulative sums restarting at every run of equal `codes`."""
+    totals = np.cumsum(values)
+    starts = _group_starts(codes)
+    return totals - totals[starts] + values[starts]
+
+
+def mark_to_market(trades, prices: dict, starting_balance) -> pd.DataFrame:
+    """
+    Equity at every bar close and trade of the ledger: cash plus every position marked at its ticker's latest price.
+    `prices` maps a ticker to (timestamps, closes) of its bars. A position is marked at the latest of its last bar
+    close and its last trade price, so tickers without bars are still marked at their fills.
+    Every trade and bar is one event: positions are cumulative sums per ticker and each event's change of market
+    value is summed across tickers in time order, so the whole curve costs a few sorts however many events there are.
+    Returns a frame of timestamp, cash, long_value, short_value (negative), equity and gross_exposure.
+    """
+    trades = normalize_trades(trades)
+    tickers = sorted(set(trades["ticker"].unique()) | set(prices))
+    codes = {ticker: i for i, ticker in enumerate(tickers)}
+
+    # trades sort before the bar sharing their timestamp, a fill at `end` comes before the candle stamped `end` closes
+    trade_codes = np.searchsorted(np.array(tickers, dtype=object), trades["ticker"].to_numpy()).astype(np.int64)
+    ns, code, kind, dq, price = [trades["ns"].to_numpy(dtype=np.int64)], [trade_codes], \
+        [np.zeros(len(trades), dtype=np.int8)], [trades["signed_qty"].to_numpy()], [trades["price"].to_numpy()]
+    for ticker, (timestamps, closes) in prices.items():
+        closes = np.asarray(closes, dtype=np.float64)
+        priced = ~np.isnan(closes)
+        ns.append(_as_ns(timestamps)[priced])
+        code.append(np.full(len(ns[-1]), codes[ticker], dtype=np.int64))
+        kind.append(np.ones(len(ns[-1]), dtype=np.int8))
+        dq.append(np.zeros(len(ns[-1])))
+        price.append(closes[priced])
+    ns, code, kind, dq, price = (np.concatenate(a) for a in (ns, code, kind, dq, price))
+    if not len(ns):
+        return pd.DataFrame(columns=["timestamp", "cash", "long_value", "short_value", "equity", "gross_exposure"])
+
+    # market value of every ticker after each of its events, then as a change from its previous event
+    by_ticker = np.lexsort((kind, ns, code))
+    ns, code, dq, price = ns[by_ticker], code[by_ticker], dq[by_ticker], price[by_ticker]
+    positions = _group_cumsum(dq, code)
+    positions[np.abs(positions) < FLAT] = 0.0
+    value = positions * price
+    long_value, short_value = np.maximum(value, 0.0), np.minimum(value, 0.0)
+    first = _group_starts(code) == np.arange(len(code))
+    long_change = np.where(first, long_value, long_value - np.r_[0.0, long_value[:-1]])
+    short_change = np.where(first, short_value, short_value - np.r_[0.0, short_value[:-1]])
+    cash_change = -dq * price
+
+    # back in time order, each distinct timestamp keeps the totals after its last event
+    by_time = np.argsort(ns, kind="stable")
+    ns = ns[by_time]
+    last = np.r_[ns[1:] != ns[:-1], True]
+    cash = starting_balance + np.cumsum(cash_change[by_time])[last]
+    long_total = np.cumsum(long_change[by_time])[last]
+    short_total = np.cumsum(short_change[by_time])[last]
+    equity = cash + long_total + short_total
+    with np.errstate(divide="ignore", invalid="ignore"):
+        gross_exposure = np.where(equity > 0, (long_total - short_total) / equity, np.nan)
+    return pd.DataFrame({
+        "timestamp": ns[last].astype("datetime64[ns]"),
+        "cash": cash,
+        "long_value": long_total,
+        "short_value": short_total,
+        "equity": equity,
+        "gross_exposure": gross_exposure,
+    })
+
+
+def daily(curve: pd.DataFrame) -> pd.DataFrame:
+    """The last row of every day of an equity curve."""
+    if curve.empty:
+        return curve
+    days = curve["timestamp"].to_numpy(dtype="datetime64[D]")
+    return curve[np.r_[days[1:] != days[:-1], True]].reset_index(drop=True)
+
+
+def round_trips(trades, marks: dict = None, as_of=None) -> pd.DataFrame:
+    """
+    Every position from the trade that opens it to the one that brings it back to flat, per ticker. A trade that
+    flips a position is split into the part closing it and the part opening the next one. Positions still open
+    are marked at `marks` ({ticker: price}, their last fill when missing) and held until `as_of` (the last trade).
+    Returns ticker, strategy (of the opening trade), direction, entry_time, exit_time, holding_seconds, qty
+    (the largest position held), pnl and closed.
+    """
+    trades = normalize_trades(trades)
+    columns = ["ticker", "strategy", "direction", "entry_time", "exit_time", "holding_seconds", "qty", "pnl", "closed"]
+    if trades.empty:
+        return pd.DataFrame(columns=columns)
+    codes, _ = pd.factorize(trades["ticker"])
+    order = np.lexsort((trades["ns"].to_numpy(dtype=np.int64), codes))
+    trades = trades.iloc[order].reset_index(drop=True)
+    tickers, dq = codes[order], trades["signed_qty"].to_numpy(dtype=np.float64)
+    after = _group_cumsum(dq, tickers)
+    before = after - dq
+    flips = (np.sign(before) * np.sign(after) < 0) & (np.abs(after) >= FLAT) & (np.abs(before) >= FLAT)
+    if flips.any():
+        rows = np.repeat(np.arange(len(trades)), np.where(flips, 2, 1))
+        second = np.r_[False, rows[1:] == rows[:-1]]
+        closing = flips[rows] & ~second
+        dq = np.where(closing, -before[rows], np.where(second, after[rows], dq[rows]))
+        trades, tickers = trades.iloc[rows].reset_index(drop=True), tickers[rows]
+        after = _group_cumsum(dq, tickers)
+        before = after - dq
+    after[np.abs(after) < FLAT] = 0.0
+    before[np.abs(before) < FLAT] = 0.0
+
+    opens = (before == 0) | (_group_starts(tickers) == np.arange(len(tickers)))
+    starts = np.flatnonzero(opens)
+    ns, price = trades["ns"].to_numpy(), trades["price"].to_numpy()
+    ends = np.r_[starts[1:], len(trades)] - 1
+    cash_flow = np.add.reduceat(-dq * price, starts)
+    held = np.maximum.reduceat(np.abs(after), starts)
+    remaining = after[ends]
+    closed = remaining == 0
+
+    names = trades["ticker"].to_numpy()
+    episode_tickers = names[starts]
+    latest = pd.Series(price).groupby(names).last()
+    latest.update(pd.Series(marks or dict(), dtype=np.float64))
+    mark = latest.reindex(episode_tickers).to_numpy(dtype=np.float64)
+    as_of_ns = ns.max() if as_of is None else _as_ns([as_of])[0]
+    exit_ns = np.where(closed, ns[ends], as_of_ns)
+    return pd.DataFrame({
+        "ticker": episode_tickers,
+        "strategy": trades["strategy"].to_numpy()[starts],
+        "direction": np.where(dq[starts] > 0, "long", "short"),
+        "entry_time": ns[starts].astype("datetime64[ns]"),
+        "exit_time": exit_ns.astype("datetime64[ns]"),
+        "holding_seconds": (exit_ns - ns[starts]) / 1e9,
+        "qty": held,
+        "pnl": cash_flow + np.where(closed, 0.0, remaining * mark),
+        "closed": closed,
+    })[columns]
+
+
+def curve_metrics(curve: pd.DataFrame, starting_balance, periods_per_year=TRADING_DAYS) -> dict:
+    """Return, max drawdown & its length, Sharpe & Sortino of daily returns and average gross exposure of a curve."""
+    metrics = {"final_equity": None, "return_pct": None, "max_drawdown": None, "max_drawdown_seconds": None,
+               "sharpe": None, "sortino": None, "exposure": None}
+    if curve.empty:
+        return metrics
+    equity = np.r_[starting_balance, curve["equity"].to_numpy(dtype=np.float64)]
+    ns = curve["timestamp"].to_numpy(dtype="datetime64[ns]").astype(np.int64)
+    ns = np.r_[ns[0], ns]
+    peaks = np.maximum.accumulate(equity)
+    drawdown = (peaks - equity) / peaks
+    # how long the curve stayed under a peak: the time since the last row at a new high
+    peak_ns = np.maximum.accumulate(np.where(equity >= peaks, ns, ns[0]))
+    metrics.update(
+        final_equity=float(equity[-1]),
+        return_pct=float(equity[-1] / starting_balance - 1),
+        max_drawdown=float(drawdown.max()),
+        max_drawdown_seconds=float((ns - peak_ns).max() / 1e9),
+        exposure=float(np.nanmean(curve["gross_exposure"].to_numpy(dtype=np.float64))) if curve["gross_exposure"].notna().any() else None,
+    )
+    closes = np.r_[starting_balance, daily(curve)["equity"].to_numpy(dtype=np.float64)]
+    returns = np.diff(closes) / closes[:-1]
+    if len(returns) > 1:
+        mean, std = returns.mean(), returns.std(ddof=1)
+        downside = math.sqrt(np.mean(np.minimum(returns, 0.0) ** 2))
+        metrics["sharpe"] = float(mean / std * math.sqrt(periods_per_year)) if std > 0 else None
+        metrics["sortino"] = float(mean / downside * math.sqrt(periods_per_year)) if downside > 0 else None
+    return metrics
+
+
+def trade_metrics(trades, trips: pd.DataFrame, average_equity=None) -> dict:
+    """Trade count, turnover, win rate, average win & loss, profit factor and holding time of closed round trips."""
+    trades = normalize_trades(trades)
+    notional = float(np.abs(trades["signed_qty"].to_numpy() * trades["price"].to_numpy()).sum())
+    closed = trips[trips["closed"].astype(bool)] if len(trips) else trips
+    pnl = closed["pnl"].to_numpy(dtype=np.float64) if len(closed) else np.empty(0)
+    wins, losses = pnl[pnl > 0], pnl[pnl < 0]
+    return {
+        "trades": len(trades),
+        "turnover": notional / average_equity if average_equity else notional,
+        "round_trips": len(pnl),
+        "win_rate": float(len(wins) / len(pnl)) if len(pnl) else None,
+        "avg_win": float(wins.mean()) if len(wins) else None,
+        "avg_loss": float(losses.mean()) if len(losses) else None,
+        "profit_factor": float(wins.sum() / -losses.sum()) if len(losses) else None,
+        "avg_holding_seconds": float(closed["holding_seconds"].mean()) if len(pnl) else None,
+    }
+
+
+def strategy_attribution(trips: pd.DataFrame) -> pd.DataFrame:
+    """P&L, round trips, win rate and holding time per strategy, open positions counted at their mark."""
+    columns = ["strategy", "pnl", "round_trips", "win_rate", "avg_holding_seconds", "pnl_share"]
+    if trips.empty:
+        return pd.DataFrame(columns=columns)
+    trips = trips.assign(strategy=trips["strategy"].fillna("unknown"), win=(trips["pnl"] > 0).astype(float))
+    grouped = trips.groupby("strategy", sort=True)
+    attribution = pd.DataFrame({
+        "pnl": grouped["pnl"].sum(),
+        "round_trips": grouped.size(),
+        "win_rate": grouped["win"].mean(),
+        "avg_holding_seconds": grouped["holding_seconds"].mean(),
+    }).reset_index()
+    total = np.abs(attribution["pnl"]).sum()
+    attribution["pnl_share"] = attribution["pnl"] / total if total else 0.0
+    return attribution[columns].sort_values("pnl", ascending=False, kind="stable").reset_index(drop=True)
+
+
+def performance_report(trades, prices: dict, starting_balance, periods_per_year=TRADING_DAYS) -> dict:
+    """
+    Everything above from one trade ledger and the bars of its tickers: the mark-to-market `equity` curve,
+    the `round_trips`, the per-strategy `attribution` and the summary `metrics`.
+    """
+    trades = normalize_trades(trades)
+    curve = mark_to_market(trades, prices, starting_balance)
+    marks = {ticker: float(closes[-1]) for ticker, (_, closes) in prices.items() if len(closes)}
+    as_of = curve["timestamp"].iloc[-1] if len(curve) else None
+    trips = round_trips(trades, marks=marks, as_of=as_of)
+    average_equity = float(curve["equity"].mean()) if len(curve) else starting_balance
+    metrics = {**curve_metrics(curve, starting_balance, periods_per_year), **trade_metrics(trades, trips, average_equity)}
+    return {"equity": curve, "round_trips": trips, "attribution": strategy_attribution(trips), "metrics": metrics}
@@ -0,0 +1,121 @@
+import logging
+import time
+
+import duckdb
+import numpy as np
+import pandas as pd
+
+logger = logging.getLogger("app")
+
+BAR_COLUMNS = ["timestamp", "ticker", "open", "high", "low", "close", "volume", "vwap"]
+PRICE_COLUMNS = ["open", "high", "low", "close", "volume", "vwap"]
+DEFAULT_CHUNK_SIZE = 50_000
+
+
+def bars_to_frame(ticker, bars) -> pd.DataFrame:
+    """
+    Convert a list of alpaca `Bar` objects into a columnar DataFrame backed by NumPy arrays.
+    Timestamps are normalized to naive UTC, the same value the string-built INSERTs stored.
+    """
+    n = len(bars)
+    columns = {"timestamp": pd.to_datetime([bar.timestamp for bar in bars], utc=True).tz_localize(None)}
+    columns["ticker"] = np.full(n, ticker, dtype=object)
+    for column in PRICE_COLUMNS:
+        columns[column] = np.fromiter(
+            (np.nan if getattr(bar, column) is None else getattr(bar, column) for bar in bars),
+            dtype=np.float64, count=n,
+        )
+    return pd.DataFrame(columns, columns=BAR_COLUMNS)
+
+
+def barset_to_frames(data: dict) -> dict:
+    """Convert `BarSet.data` ({ticker: [Bar, ...]}) into {ticker: DataFrame}, skipping empty tickers."""
+    return {ticker: bars_to_frame(ticker, bars) for ticker, bars in data.items() if bars}
+
+
+def iter_chunks(frame: pd.DataFrame, chunk_size=DEFAULT_CHUNK_SIZE):
+    for offset in range(0, len(frame), chunk_size):
+        yield frame.iloc[offset:offset + chunk_size]
+
+
+def upsert_frame(conn, frame: pd.DataFrame, table="ticker_data", constants=None):
+    """
+    Insert a bar frame in a single vectorized `INSERT OR IGNORE ... SELECT` statement.
+    The frame is registered with DuckDB which scans the NumPy columns directly, so no SQL is built per row.
+    `constants` maps extra table columns to a value shared by every row, e.g. the timeframe for the bar store.
+    """
+    if frame.empty:
+        return 0
+    constants = constants or dict()
+    insert_columns = BAR_COLUMNS + list(constants.keys())
+    select_columns = BAR_COLUMNS + [f"'{value}'" for value in constants.values()]
+    conn.register("incoming_bars", frame)
+    try:
+        conn.execute(f"""
+            INSERT OR IGNORE INTO {table} ({', '.join(insert_columns)})
+            SELECT {', '.join(select_columns)}
+            FROM incoming_bars
+            ORDER BY ticker, timestamp
+        """)
+    finally:
+        conn.unregister("incoming_bars")
+    return len(frame)
+
+
+class BarIngestor:
+    """
+    Writes alpaca bars to either the per-ticker `{ticker}_{timeframe}_data.db` files or the consolidated
+    BarStore with one upsert per ticker per chunk. Tracks the rows written and time spent for throughput reporting.
+    """
+    def __init__(self, db_base_path="dbs", timeframe=None, bar_store=None, chunk_size=DEFAULT_CHUNK_SIZE):
+        self.db_base_path = db_base_path
+        self.timeframe = timeframe
+        self.bar_store = bar_store
+        self.chunk_size = chunk_size
+        self.rows_written = 0
+        self.seconds_spent = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows_written / self.seconds_spent if self.seconds_spent > 0 else 0.0
+
+    def ingest_barset(self, data: dict):
+        """Ingest `BarSet.data` and return {ticker: frame} so callers can reuse the columnar batches."""
+        frames = barset_to_frames(data)
+        for ticker, frame in frames.items():
+            self.ingest_frame(ticker, frame)
+        return frames
+
+    def ingest_frames(self, frames: dict):
+        """
+        Ingest {ticker: frame}. The bar store takes all tickers in one upsert, the per-ticker files need one each.
+        """
+        frames = {ticker: frame for ticker, frame in frames.items() if not frame.empty}
+        if not frames:
+            return
+        if self.bar_store is None:
+            for ticker, frame in frames.items():
+                self.ingest_frame(ticker, frame)
+            return
+        start = time.perf_counter()
+        combined = pd.concat(list(frames.values()), ignore_index=True)
+        for chunk in iter_chunks(combined, self.chunk_size):
+            self.bar_store.upsert_frame(chunk, self.timeframe)
+        self.seconds_spent += time.perf_counter() - start
+        self.rows_written += len(combined)
+
+    def ingest_frame(self, ticker, frame: pd.DataFrame):
+        start = time.perf_counter()
+        if self.bar_store is not None:
+            for chunk in iter_chunks(frame, self.chunk_size):
+                self.bar_store.upsert_frame(chunk, self.timeframe)
+        else:
+            conn = duckdb.connect(f"{self.db_base_path}/{ticker}_{self.timeframe}_data.db")
+            try:
+                for chunk in iter_chunks(frame, self.chunk_size):
+                    upsert_frame(conn, chunk)
+            finally:
+                conn.close()
+        self.seconds_spent += time.perf_counter() - start
+        self.rows_written += len(frame)
+        logger.debug("Ingested %r rows for %r", len(frame), ticker)
@@ -0,0 +1,407 @@
+import logging
+import math
+from collections import deque
+
+logger = logging.getLogger("app")
+
+NAN = float("nan")
+
+
+class Indicator:
+    """
+    A technical indicator updated one bar at a time in O(1).
+    `update(bar)` commits a bar and returns the new value, `peek(bar)` returns the value the bar would give
+    without committing it, for bars that are still being filled. Bars are mappings with open/high/low/close/volume.
+    `to_dict` / `indicator_from_dict` round trip the full state so it can be persisted between runs, bar timestamps
+    are integers (nanoseconds since the epoch) to keep that state JSON serializable.
+    """
+    name = None
+
+    def update(self, bar):
+        raise NotImplementedError("update method must be implemented in child class")
+
+    def peek(self, bar):
+        raise NotImplementedError("peek method must be implemented in child class")
+
+    def params(self):
+        return dict()
+
+    def state(self):
+        raise NotImplementedError("state method must be implemented in child class")
+
+    def load_state(self, state):
+        raise NotImplementedError("load_state method must be implemented in child class")
+
+    def to_dict(self):
+        return {"type": self.name, "params": self.params(), "state": self.state()}
+
+
+class EMA(Indicator):
+    """Exponential moving average, matching pandas `ewm(span=span, adjust=False).mean()`."""
+    name = "ema"
+
+    def __init__(self, span, field="close"):
+        self.span = span
+        self.field = field
+        self.alpha = 2 / (span + 1)
+        self.value = None
+
+    def _next(self, x):
+        return x if self.value is None else self.alpha * x + (1 - self.alpha) * self.value
+
+    def update(self, bar):
+        self.value = self._next(bar[self.field])
+        return self.value
+
+    def peek(self, bar):
+        return self._next(bar[self.field])
+
+    def params(self):
+        return {"span": self.span, "field": self.field}
+
+    def state(self):
+        return {"value": self.value}
+
+    def load_state(self, state):
+        self.value = state["value"]
+
+
+class MACD(Indicator):
+    """MACD line and signal line, matching `MarketProfileStrategy.calculate_macd`."""
+    name = "macd"
+
+    def __init__(self, short_window=12, long_window=26, signal_window=9):
+        self.short_window = short_window
+        self.long_window = long_window
+        self.signal_window = signal_window
+        self.short_ema = EMA(short_window)
+        self.long_ema = EMA(long_window)
+        self.signal_ema = EMA(signal_window, field="macd")
+
+    def update(self, bar):
+        macd = self.short_ema.update(bar) - self.long_ema.update(bar)
+        return {"macd": macd, "signal": self.signal_ema.update({"macd": macd})}
+
+    def peek(self, bar):
+        macd = self.short_ema.peek(bar) - self.long_ema.peek(bar)
+        return {"macd": macd, "signal": self.signal_ema.peek({"macd": macd})}
+
+    def params(self):
+        return {"short_window": self.short_window, "long_window": self.long_window, "signal_window": self.signal_window}
+
+    def state(self):
+        return {"short": self.short_ema.value, "long": self.long_ema.value, "signal": self.signal_ema.value}
+
+    def load_state(self, state):
+        self.short_ema.value = state["short"]
+        self.long_ema.value = state["long"]
+        self.signal_ema.value = state["signal"]
+
+
+class RSI(Indicator):
+    """
+    Relative Strength Index over simple rolling means of gains and losses, matching
+    `MarketProfileStrategy.calculate_rsi` (pandas `rolling(window=period, min_periods=1).mean()`).
+    """
+    name = "rsi"
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.changes = deque()  # (gain, loss) of the last `period` bars
+        self.gain_sum = 0.0
+        self.loss_sum = 0.0
+        self.updates = 0
+
+    def _resum(self):
+        # re-summing the window once per period discards floating point drift from the running sums, amortized O(1)
+        self.gain_sum = math.fsum(gain for gain, _ in self.changes)
+        self.loss_sum = math.fsum(loss for _, loss in self.changes)
+
+    def _next(self, close):
+        delta = 0.0 if self.prev_close is None else close - self.prev_close
+        gain, loss = max(delta, 0.0), max(-delta, 0.0)
+        gain_sum, loss_sum, count = self.gain_sum + gain, self.loss_sum + loss, len(self.changes) + 1
+        if count > self.period:
+            old_gain, old_loss = self.changes[0]
+            gain_sum, loss_sum, count = gain_sum - old_gain, loss_sum - old_loss, self.period
+        return gain, loss, gain_sum, loss_sum, count
+
+    def _rsi(self, gain_sum, loss_sum, count):
+        avg_gain, avg_loss = gain_sum / count, loss_sum / count
+        if avg_loss == 0:
+            return NAN if avg_gain == 0 else 100.0
+        return 100 - (100 / (1 + avg_gain / avg_loss))
+
+    def update(self, bar):
+        gain, loss, gain_sum, loss_sum, count = self._next(bar["close"])
+        self.changes.append((gain, loss))
+        if len(self.changes) > self.period:
+            self.changes.popleft()
+        self.gain_sum, self.loss_sum = gain_sum, loss_sum
+        self.prev_close = bar["close"]
+        self.updates += 1
+        if self.updates % self.period == 0:
+            self._resum()
+        return self._rsi(gain_sum, loss_sum, count)
+
+    def peek(self, bar):
+        _, _, gain_sum, loss_sum, count = self._next(bar["close"])
+        return self._rsi(gain_sum, loss_sum, count)
+
+    def params(self):
+        return {"period": self.period}
+
+    def state(self):
+        return {"prev_close": self.prev_close, "changes": [list(change) for change in self.changes]}
+
+    def load_state(self, state):
+        self.prev_close = state["prev_close"]
+        self.changes = deque(tuple(change) for change in state["changes"])
+        self._resum()
+
+
+class VWAP(Indicator):
+    """
+    Cumulative volume weighted close, matching `MarketProfileStrategy.calculate_vwap`.
+    `trim(start)` drops bars before `start`, so it also tracks a VWAP anchored at a moving window start.
+    """
+    name = "vwap"
+
+    def __init__(self):
+        self.bars = deque()  # (timestamp, close * volume, volume)
+        self.price_volume = 0.0
+        self.volume = 0.0
+
+    def _vwap(self, price_volume, volume):
+        return price_volume / volume if volume else NAN
+
+    def update(self, bar):
+        price_volume = bar["close"] * bar["volume"]
+        self.bars.append((bar.get("timestamp"), price_volume, bar["volume"]))
+        self.price_volume += price_volume
+        self.volume += bar["volume"]
+        return self._vwap(self.price_volume, self.volume)
+
+    def peek(self, bar):
+        return self._vwap(self.price_volume + bar["close"] * bar["volume"], self.volume + bar["volume"])
+
+    def trim(self, start):
+        while self.bars and self.bars[0][0] is not None and self.bars[0][0] < start:
+            _, price_volume, volume = self.bars.popleft()
+            self.price_volume -= price_volume
+            self.volume -= volume
+
+    def state(self):
+        return {"bars": [[timestamp, price_volume, volume] for timestamp, price_volume, volume in self.bars]}
+
+    def load_state(self, state):
+        self.bars = deque(tuple(bar) for bar in state["bars"])
+        self.price_volume = math.fsum(bar[1] for bar in self.bars)
+        self.volume = math.fsum(bar[2] for bar in self.bars)
+
+
+class RollingExtreme(Indicator):
+    """Rolling max (or min) of a field over the last `window` bars with a monotonic deque, amortized O(1)."""
+    name = "rolling_extreme"
+
+    def __init__(self, window, field="high", mode="max"):
+        self.window = window
+        self.field = field
+        self.mode = mode
+        self.count = 0  # bars committed
+        self.candidates = deque()  # (bar number, value), values monotonic from the front
+
+    def _beats(self, x, y):
+        return x >= y if self.mode == "max" else x <= y
+
+    def update(self, bar):
+        x = bar[self.field]
+        while self.candidates and self._beats(x, self.candidates[-1][1]):
+            self.candidates.pop()
+        self.candidates.append((self.count, x))
+        self.count += 1
+        if self.candidates[0][0] <= self.count - 1 - self.window:
+            self.candidates.popleft()
+        return self.candidates[0][1]
+
+    def peek(self, bar):
+        x = bar[self.field]
+        # the extreme of the previous window, excluding the bar the new one would push out
+        for number, value in self.candidates:
+            if number > self.count - self.window:
+                return x if self._beats(x, value) else value
+        return x
+
+    def params(self):
+        return {"window": self.window, "field": self.field, "mode": self.mode}
+
+    def state(self):
+        return {"count": self.count, "candidates": [list(candidate) for candidate in self.candidates]}
+
+    def load_state(self, state):
+        self.count = state["count"]
+        self.candidates = deque(tuple(candidate) for candidate in state["candidates"])
+
+
+class ATR(Indicator):
+    """Average True Range as a simple rolling mean of the true range, like the rolling means in `calculate_rsi`."""
+    name = "atr"
+
+    def __init__(self, period=14):
+        self.period = period
+        self.prev_close = None
+        self.ranges = deque()
+        self.range_sum = 0.0
+
+    def _true_range(self, bar):
+        if self.prev_close is None:
+            return bar["high"] - bar["low"]
+        return max(bar["high"] - bar["low"], abs(bar["high"] - self.prev_close), abs(bar["low"] - self.prev_close))
+
+    def update(self, bar):
+        true_range = self._true_range(bar)
+        self.ranges.append(true_range)
+        self.range_sum += true_range
+        if len(self.ranges) > self.period:
+            self.range_sum -= self.ranges.popleft()
+        self.prev_close = bar["close"]
+        return self.range_sum / len(self.ranges)
+
+    def peek(self, bar):
+        true_range = self._true_range(bar)
+        if len(self.ranges) < self.period:
+            return (self.range_sum + true_range) / (len(self.ranges) + 1)
+        return (self.range_sum + true_range - self.ranges[0]) / self.period
+
+    def params(self):
+        return {"period": self.period}
+
+    def state(self):
+        return {"prev_close": self.prev_close, "ranges": list(self.ranges)}
+
+    def load_state(self, state):
+        self.prev_close = state["prev_close"]
+        self.ranges = deque(state["ranges"])
+        self.range_sum = math.fsum(self.ranges)
+
+
+class SwingPoints(Indicator):
+    """
+    The latest higher high and higher low, the last bars whose high (low) is above the previous bar's, as
+    {"timestamp", "high", "low"} of the bar. Matches `TrendFollowingStrategy.detect_trend`'s scan over the same bars.
+    """
+    name = "swing_points"
+
+    def __init__(self):
+        self.previous = None  # (high, low) of the last bar
+        self.higher_high = None
+        self.higher_low = None
+
+    def _next(self, bar):
+        point = {"timestamp": bar.get("timestamp"), "high": bar["high"], "low": bar["low"]}
+        higher_high, higher_low = self.higher_high, self.higher_low
+        if self.previous is not None:
+            if bar["high"] > self.previous[0]:
+                higher_high = point
+            if bar["low"] > self.previous[1]:
+                higher_low = point
+        return {"higher_high": higher_high, "higher_low": higher_low}
+
+    def update(self, bar):
+        points = self._next(bar)
+        self.higher_high, self.higher_low = points["higher_high"], points["higher_low"]
+        self.previous = (bar["high"], bar["low"])
+        return points
+
+    def peek(self, bar):
+        return self._next(bar)
+
+    def state(self):
+        return {"previous": list(self.previous) if self.previous is not None else None,
+                "higher_high": self.higher_high, "higher_low": self.higher_low}
+
+    def load_state(self, state):
+        self.previous = tuple(state["previous"]) if state["previous"] is not None else None
+        self.higher_high = state["higher_high"]
+        self.higher_low = state["higher_low"]
+
+
+INDICATORS = {indicator.name: indicator for indicator in [EMA, MACD, RSI, VWAP, RollingExtreme, ATR, SwingPoints]}
+
+
+def indicator_from_dict(data) -> Indicator:
+    indicator = INDICATORS[data["type"]](**data["params"])
+    indicator.load_state(data["state"])
+    return indicator
+
+
+class IndicatorSet:
+    """The indicators of one ticker & timeframe, fed the same bars. Tracks the last committed bar's timestamp."""
+    def __init__(self, indicators: dict):
+        self.indicators = indicators
+        self.last_timestamp = None
+
+    def update(self, bar):
+        self.last_timestamp = bar.get("timestamp", self.last_timestamp)
+        return {name: indicator.update(bar) for name, indicator in self.indicators.items()}
+
+    def peek(self, bar):
+        return {name: indicator.peek(bar) for name, indicator in self.indicators.items()}
+
+    def to_dict(self):
+        return {
+            "last_timestamp": self.last_timestamp,
+            "indicators": {name: indicator.to_dict() for name, indicator in self.indicators.items()},
+        }
+
+    @classmethod
+    def from_dict(cls, data):
+        indicator_set = cls({name: indicator_from_dict(indicator) for name, indicator in data["indicators"].items()})
+        indicator_set.last_timestamp = data["last_timestamp"]
+        return indicator_set
+
+
+class IndicatorEngine:
+    """
+    Streaming indicator state kept separately per ticker & timeframe.
+    `factory` returns a fresh {name: Indicator} dict for a key the first time it is seen.
+    """
+    def __init__(self, factory):
+        self.factory = factory
+        self.sets = dict()
+
+    def _key(self, ticker, timeframe):
+        return f"{ticker};{timeframe}"
+
+    def get(self, ticker, timeframe) -> IndicatorSet:
+        key = self._key(ticker, timeframe)
+        if key not in self.sets:
+            self.sets[key] = IndicatorSet(self.factory())
+        return self.sets[key]
+
+    def reset(self, ticker, timeframe):
+        self.sets.pop(self._key(ticker, timeframe), None)
+
+    def update(self, ticker, timeframe, bar):
+        return self.get(ticker, timeframe).update(bar)
+
+    def peek(self, ticker, timeframe, bar):
+        return self.get(ticker, timeframe).peek(bar)
+
+    def ticker_sets(self, ticker) -> dict:
+        """Every indicator set of `ticker`, e.g. to hand its state to another process."""
+        return {key: indicator_set for key, indicator_set in self.sets.items() if key.startswith(f"{ticker};")}
+
+    def set_ticker_sets(self, ticker, sets: dict):
+        """Replace every indicator set of `ticker` with `sets` returned by `ticker_sets`."""
+        for key in self.ticker_sets(ticker):
+            del self.sets[key]
+        self.sets.update(sets or dict())
+
+    def to_dict(self):
+        return {key: indicator_set.to_dict() for key, indicator_set in self.sets.items()}
+
+    def load(self, data):
+        """Restore state saved with `to_dict`."""
+        self.sets = {key: IndicatorSet.from_dict(indicator_set) for key, indicator_set in data.items()}
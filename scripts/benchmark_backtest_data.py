@@ -0,0 +1,58 @@
+# benchmark per-candle data access in backtests as the backtest grows
+# compares re-querying DuckDB for every candle (the pre-engine StrategyHandler path) with the in-memory
+# BacktestDataEngine views. The DuckDB cost per candle grows with the history read so the total is quadratic,
+# the engine's stays flat so the total is linear in the candle count.
+# synthetic minute candles are written to a temporary directory, nothing under `dbs/` is touched
+#
+# usage: poetry run python scripts/benchmark_backtest_data.py [--days 1 2 4 8]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.handlers.strategy_handler import StrategyHandler
+from app.models.backtest_data import BacktestDataEngine
+from app.strategies.base import BaseStrategy
+from tests.utils import create_ticker_db, generate_minute_bars
+
+
+class LastCloseStrategy(BaseStrategy):
+    """Reads the full history it is given and never trades, so only data access is measured."""
+    def generate_signal(self, ticker, data):
+        data['close'].values[-1]
+        return None
+
+
+def run(handler, timestamps):
+    start = time.perf_counter()
+    for end in timestamps:
+        handler.generate_signals(is_backtest=True, backtest_data={"end": end})
+    return time.perf_counter() - start
+
+
+def report(name, candles, seconds):
+    print(f"{name:<10} {candles:>8,} candles {seconds:>8.2f}s {seconds / candles * 1e6:>10,.0f} us/candle")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark backtest data access scaling.")
+    parser.add_argument("--days", type=int, nargs="+", default=[1, 2, 4, 8], help="backtest lengths in sessions")
+    args = parser.parse_args()
+
+    candles = generate_minute_bars("AAPL", datetime(2024, 1, 1), days=max(args.days))
+    with tempfile.TemporaryDirectory() as tmp:
+        create_ticker_db(tmp, "AAPL", candles)
+        handler = StrategyHandler(["AAPL"], db_base_path=tmp)
+        handler.strategies = {"last_close": LastCloseStrategy()}
+        engine = BacktestDataEngine({"AAPL": candles})
+
+        for days in args.days:
+            timestamps = list(candles['timestamp'].iloc[:days * 390])
+            handler.backtest_engine = None
+            report("duckdb", len(timestamps), run(handler, timestamps))
+            handler.backtest_engine = engine
+            report("engine", len(timestamps), run(handler, timestamps))
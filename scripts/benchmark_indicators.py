@@ -0,0 +1,53 @@
+# benchmark the per-bar cost of RSI, MACD & VWAP
+# compares MarketProfileStrategy's pandas path, which recomputes every indicator over the whole series for each
+# new bar, with the streaming indicators from app.utils.indicators which update in constant time per bar
+#
+# usage: poetry run python scripts/benchmark_indicators.py [--bars 500 2000 8000]
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+from alpaca.data import TimeFrame
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.strategies.market_profile_strategy import MarketProfileStrategy
+from app.utils.indicators import MACD, RSI, VWAP, IndicatorEngine
+from tests.utils import generate_minute_bars
+
+SAMPLES = 200  # new bars timed at the end of each series
+
+
+def bench_pandas(strategy, bars):
+    start = time.perf_counter()
+    for end in range(len(bars) - SAMPLES, len(bars)):
+        series = bars.iloc[:end + 1]
+        strategy.calculate_rsi(series).iloc[-1]
+        strategy.calculate_macd(series).iloc[-1]
+        strategy.calculate_vwap(series).iloc[-1]
+    return (time.perf_counter() - start) / SAMPLES
+
+
+def bench_streaming(bars):
+    engine = IndicatorEngine(lambda: {"rsi": RSI(14), "macd": MACD(12, 26, 9), "vwap": VWAP()})
+    records = bars[["close", "volume"]].to_dict(orient="records")
+    for bar in records[:-SAMPLES]:
+        engine.update("AAPL", "1Min", bar)
+    start = time.perf_counter()
+    for bar in records[-SAMPLES:]:
+        engine.update("AAPL", "1Min", bar)
+    return (time.perf_counter() - start) / SAMPLES
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-bar indicator cost.")
+    parser.add_argument("--bars", type=int, nargs="+", default=[500, 2000, 8000], help="series lengths")
+    args = parser.parse_args()
+
+    strategy = MarketProfileStrategy(TimeFrame.Minute)
+    for n_bars in args.bars:
+        bars = generate_minute_bars("AAPL", datetime(2024, 1, 1), days=n_bars // 390 + 1).iloc[:n_bars]
+        pandas_cost, streaming_cost = bench_pandas(strategy, bars), bench_streaming(bars)
+        print(f"{n_bars:>8,} bars  pandas {pandas_cost * 1e6:>10,.1f} us/bar  streaming {streaming_cost * 1e6:>8,.1f} us/bar  {pandas_cost / streaming_cost:>8,.0f}x")
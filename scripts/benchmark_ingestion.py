@@ -0,0 +1,87 @@
+# benchmark the bar ingestion paths in rows per second
+# compares the legacy string-built `INSERT OR IGNORE ... VALUES` statement with the columnar
+# BarIngestor upsert, for both the per-ticker db files and the consolidated bar store
+# synthetic alpaca `Bar` objects are written to a temporary directory, nothing under `dbs/` is touched
+#
+# usage: poetry run python scripts/benchmark_ingestion.py [--tickers 5] [--bars 50000]
+
+import argparse
+import os
+import sys
+import tempfile
+import time
+from datetime import datetime, timedelta, timezone
+
+import duckdb
+import numpy as np
+from alpaca.data import Bar, TimeFrame
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models.bar_store import BarStore
+from app.utils.bar_ingestion import BarIngestor
+
+
+def generate_barset(tickers, n_bars):
+    start = datetime(2024, 1, 2, 14, 30, tzinfo=timezone.utc)
+    data = dict()
+    for ticker in tickers:
+        closes = 100 + np.cumsum(np.random.normal(0, 0.1, n_bars))
+        data[ticker] = [
+            Bar(ticker, {"t": start + timedelta(minutes=i), "o": c, "h": c + 0.1, "l": c - 0.1, "c": c, "v": 1000.0, "n": 10, "vw": c})
+            for i, c in enumerate(closes)
+        ]
+    return data
+
+
+def create_ticker_db(db_base_path, ticker, timeframe):
+    conn = duckdb.connect(f"{db_base_path}/{ticker}_{timeframe}_data.db")
+    conn.sql("CREATE TABLE IF NOT EXISTS ticker_data (timestamp TIMESTAMP, ticker TEXT, open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume FLOAT, vwap FLOAT, PRIMARY KEY (timestamp, ticker))")
+    conn.close()
+
+
+def bench_string_insert(db_base_path, data, timeframe):
+    """The pre-existing DataHandler.save_market_data path."""
+    start = time.perf_counter()
+    for ticker, bars in data.items():
+        value_strs = [f"('{row.timestamp}', '{ticker}', {row.open}, {row.high}, {row.low}, {row.close}, {row.volume}, {row.vwap})" for row in bars]
+        conn = duckdb.connect(f"{db_base_path}/{ticker}_{timeframe}_data.db")
+        conn.execute(f"INSERT OR IGNORE INTO ticker_data VALUES {', '.join(value_strs)}")
+        conn.close()
+    return time.perf_counter() - start
+
+
+def bench_ingestor(ingestor, data):
+    start = time.perf_counter()
+    ingestor.ingest_barset(data)
+    return time.perf_counter() - start
+
+
+def report(name, rows, seconds):
+    print(f"{name:<32} {rows:>10,} rows {seconds:>8.2f}s {rows / seconds:>14,.0f} rows/s")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark bar ingestion throughput.")
+    parser.add_argument("--tickers", type=int, default=5)
+    parser.add_argument("--bars", type=int, default=50_000, help="bars per ticker")
+    args = parser.parse_args()
+
+    timeframe = TimeFrame.Minute
+    tickers = [f"T{i}" for i in range(args.tickers)]
+    data = generate_barset(tickers, args.bars)
+    rows = args.tickers * args.bars
+
+    with tempfile.TemporaryDirectory() as tmp:
+        legacy_path = os.path.join(tmp, "legacy")
+        columnar_path = os.path.join(tmp, "columnar")
+        for path in [legacy_path, columnar_path]:
+            os.makedirs(path)
+            for ticker in tickers:
+                create_ticker_db(path, ticker, timeframe)
+
+        report("string INSERT VALUES", rows, bench_string_insert(legacy_path, data, timeframe))
+        report("columnar upsert (ticker files)", rows, bench_ingestor(BarIngestor(columnar_path, timeframe), data))
+
+        store = BarStore(os.path.join(tmp, "market_data.db"))
+        report("columnar upsert (bar store)", rows, bench_ingestor(BarIngestor(tmp, timeframe, bar_store=store), data))
+        store.close()
@@ -0,0 +1,55 @@
+# benchmark backtest signal generation for SupportResistanceStrategy
+# compares calling `generate_signal` once per candle through the StrategyHandler with computing every signal of the
+# backtest at once with `generate_signals_vectorized`, and checks both give the same signals
+# synthetic minute candles are kept in memory, nothing under `dbs/` is touched
+#
+# usage: poetry run python scripts/benchmark_vectorized_signals.py [--sessions 1 5 20]
+
+import argparse
+import os
+import sys
+import time
+from datetime import datetime
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.handlers.strategy_handler import StrategyHandler
+from app.models.backtest_data import BacktestDataEngine
+from tests.utils import generate_minute_bars
+
+WARMUP_SESSIONS = 60  # the default lookback needs 56 sessions of candles before the first signal
+
+
+def run(handler, ends):
+    actions = []
+    for end in ends:
+        signal = handler.generate_signals(is_backtest=True, backtest_data={"end": end}).get("AAPL")
+        actions.append((signal.action, signal.reason) if signal is not None else None)
+    return actions
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark per-candle vs vectorized backtest signals.")
+    parser.add_argument("--sessions", type=int, nargs="+", default=[1, 5, 20], help="backtested sessions")
+    args = parser.parse_args()
+
+    for sessions in args.sessions:
+        engine = BacktestDataEngine({"AAPL": generate_minute_bars("AAPL", datetime(2024, 1, 1), days=WARMUP_SESSIONS + sessions)})
+        ends = engine.frame("AAPL")['timestamp'].iloc[-sessions * 390:]
+
+        handler = StrategyHandler(["AAPL"])
+        handler.backtest_engine = engine
+        start = time.perf_counter()
+        expected = run(handler, ends)
+        per_candle = time.perf_counter() - start
+
+        handler = StrategyHandler(["AAPL"])
+        handler.backtest_engine = engine
+        start = time.perf_counter()
+        handler.vectorize_backtest(ends)
+        precompute = time.perf_counter() - start
+        actions = run(handler, ends)
+        vectorized = time.perf_counter() - start
+
+        assert actions == expected, "vectorized signals differ from the per-candle ones"
+        print(f"{len(ends):>7,} candles  per candle {per_candle:>7.2f}s  vectorized {vectorized:>6.2f}s "
+              f"(precompute {precompute:.2f}s)  {per_candle / vectorized:>6.1f}x")
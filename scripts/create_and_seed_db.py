@@ -4,21 +4,28 @@
 # the database file contains a table for minute data
 # the table has columns for timestamp, ticker, open, high, low, close, and volume
 # the table is created if it does not exist
-# download the data for the last 5 months of minute data for each ticker
+# download the data for the last 12 months of minute data for each ticker
 # store the data in the database
+# downloads run concurrently and per ticker checkpoints are kept in dbs/backfill_checkpoints.json,
+# an interrupted run resumes where it stopped when the script is run again
 
 # use alpaca-py to get minute data for the last 5 months
 # store the data in a duckdb database
 
 from datetime import datetime, timedelta
 import os
-import time
+import sys
 
 import duckdb
 from alpaca.data.historical import StockHistoricalDataClient
-from alpaca.data import StockBarsRequest, TimeFrame, BarSet
+from alpaca.data import TimeFrame
 import logging
 
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.handlers.backfill import DEFAULT_REQUESTS_PER_MINUTE, BackfillCheckpoints, BackfillEngine, RequestBudget
+from app.models.bar_store import get_bar_store
+from app.utils.bar_ingestion import BarIngestor
+
 logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
 
 
@@ -26,6 +33,12 @@ logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(level
 USE_PAPER = os.getenv('USE_PAPER', '1') == '1'
 ALPACA_API_KEY = os.getenv('ALPACA_API_KEY_PAPER' if USE_PAPER else 'ALPACA_API_KEY')
 ALPACA_API_SECRET = os.getenv('ALPACA_SECRET_KEY_PAPER' if USE_PAPER else 'ALPACA_SECRET_KEY')
+# seed the consolidated dbs/market_data.db instead of one db file per ticker
+USE_BAR_STORE = os.getenv('USE_BAR_STORE', '0') == '1'
+bar_store = get_bar_store('dbs') if USE_BAR_STORE else None
+# backfill tuning
+REQUESTS_PER_MINUTE = int(os.getenv('ALPACA_REQUESTS_PER_MINUTE', DEFAULT_REQUESTS_PER_MINUTE))
+BACKFILL_WORKERS = int(os.getenv('BACKFILL_WORKERS', '4'))
 
 # keys required for stock historical data client
 client = StockHistoricalDataClient(ALPACA_API_KEY, ALPACA_API_SECRET)
@@ -37,19 +50,28 @@ with open('tickers.txt', 'r') as f:
 
 end = datetime.now()
 start = end - timedelta(days=1 * 365)
-get_data_for_tickers = []
+checkpoints = BackfillCheckpoints('dbs/backfill_checkpoints.json')
+get_data_for_tickers = {str(TimeFrame.Minute): [], str(TimeFrame.Day): []}
 
 for timeframe in [TimeFrame.Minute, TimeFrame.Day]:
     for ticker in tickers:
         db_path = f"dbs/{ticker}_{timeframe}_data.db"
-        if os.path.exists(db_path):
+        if checkpoints.get(ticker, timeframe) is not None:
+            logging.info("Resuming backfill for %r from %r", ticker, checkpoints.get(ticker, timeframe).isoformat())
+            get_data_for_tickers[str(timeframe)].append(ticker)
+        elif bar_store is not None:
+            if bar_store.get_latest_bars([ticker], timeframe).empty:
+                get_data_for_tickers[str(timeframe)].append(ticker)
+            else:
+                logging.info("Bar store already has data for %r", ticker)
+        elif os.path.exists(db_path):
             logging.info("Database already exists for %r", ticker)
         else:
             conn = duckdb.connect(db_path)
             conn.sql(f"CREATE TABLE IF NOT EXISTS ticker_data (timestamp TIMESTAMP, ticker TEXT, open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume FLOAT, vwap FLOAT, PRIMARY KEY (timestamp, ticker))")
             conn.close()
             logging.info("Database created for %r", ticker)
-            get_data_for_tickers.append(f'{ticker};{timeframe}')
+            get_data_for_tickers[str(timeframe)].append(ticker)
 
 
 # create trades table
@@ -61,53 +83,26 @@ for trades_db_path in trades_db_paths:
         conn.close()
 
 
-def save_to_db(ticker, data, timeframe):
-    db_path = f"dbs/{ticker}_{timeframe}_data.db"
-    conn = duckdb.connect(db_path)
-    conn.execute(f"INSERT OR IGNORE INTO ticker_data VALUES {data}")
-    conn.close()
-
-
-curr_date = end - timedelta(days=1)
-while curr_date > start:
-    time_frames = [x.split(';')[-1] for x in get_data_for_tickers]
-    tickers = [x.split(';')[0] for x in get_data_for_tickers]
-    for timeframe in time_frames:
-        logging.info("Downloading data for %r\nFrom %r-%r", tickers, curr_date.isoformat(), end.isoformat())
-        request = StockBarsRequest(
-            symbol_or_symbols=tickers,
-            start=curr_date,
-            end=end,
-            timeframe=TimeFrame.Minute if timeframe == '1min' else TimeFrame.Day,
-        )
-        logging.info("Request built -> sending request symbols=%r start=%r end=%r timeframe=%r", tickers, curr_date.isoformat(), end.isoformat(), timeframe)
-        bar_set_data = client.get_stock_bars(request)
-
-        # convert the data to duckdb expected format
-        # logging.info("received data", data.data)
-        if isinstance(bar_set_data, BarSet):
-            for ticker in tickers:
-                ticker_data = bar_set_data.data
-                for row in ticker_data:
-                    if isinstance(row, str):
-                        continue
-                    else:
-                        row_str = f"('{row.timestamp}', '{ticker}', {row.open}, {row.high}, {row.low}, {row.close}, {row.volume}, {row.vwap})"
-                        save_to_db(ticker, row_str, timeframe)
-                
-                logging.info('Data saved for ticker=%r timeframe=%r timestamp=%r', ticker, timeframe, curr_date.isoformat())
-        elif bar_set_data.data is None or get_data_for_tickers[0] not in bar_set_data.data.keys():
-            logging.info("No data received %r", bar_set_data)
-        else:    
-            for ticker in get_data_for_tickers:
-                ticker_data = bar_set_data.data.get(ticker, [])
-                for row in ticker_data:
-                    row_str = f"('{row.timestamp}', '{ticker}', {row.open}, {row.high}, {row.low}, {row.close}, {row.volume}, {row.vwap})"
-                    save_to_db(ticker, row_str, timeframe)
-                
-                logging.info('Data saved for ticker=%r', ticker)
-        end = curr_date
-        curr_date = curr_date - timedelta(days=1)
-    time.sleep(1)
-
-logging.info("Data saved to database")
\ No newline at end of file
+budget = RequestBudget(max_requests=REQUESTS_PER_MINUTE)
+for timeframe in [TimeFrame.Minute, TimeFrame.Day]:
+    timeframe_tickers = get_data_for_tickers[str(timeframe)]
+    if not timeframe_tickers:
+        continue
+    ingestor = BarIngestor(db_base_path='dbs', timeframe=timeframe, bar_store=bar_store)
+    is_minute = str(timeframe) == str(TimeFrame.Minute)
+    engine = BackfillEngine(
+        client,
+        ingestor.ingest_barset,
+        timeframe=timeframe,
+        # a week of minute bars for one ticker fits in a single 10k page
+        window=timedelta(days=7) if is_minute else timedelta(days=365),
+        max_workers=BACKFILL_WORKERS,
+        batch_size=1 if is_minute else len(timeframe_tickers),
+        budget=budget,
+        checkpoints=checkpoints,
+    )
+    logging.info("Downloading %r data for %r from %r to %r", timeframe.value, timeframe_tickers, start.isoformat(), end.isoformat())
+    stats = engine.run(timeframe_tickers, start, end)
+    logging.info('Ingested %r rows for timeframe=%r (%.0f rows/s) stats=%r', ingestor.rows_written, timeframe.value, ingestor.rows_per_second, stats)
+
+logging.info("Data saved to database")
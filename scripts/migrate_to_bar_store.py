@@ -0,0 +1,53 @@
+# this script imports the legacy per-ticker databases into the consolidated bar store
+# every `dbs/{ticker}_{timeframe}_data.db` file is copied into the `bars` table of `dbs/market_data.db`
+# the script is idempotent, rows that already exist in the store are skipped
+# the legacy files are left untouched so the import can be verified before they are removed
+#
+# usage: poetry run python scripts/migrate_to_bar_store.py [--db-base-path dbs]
+
+import argparse
+import glob
+import logging
+import os
+import re
+import sys
+
+sys.path.append(os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from app.models.bar_store import BAR_STORE_FILENAME, BarStore
+
+logging.basicConfig(level=logging.INFO, format='%(asctime)s - %(name)s - %(levelname)s - %(message)s')
+
+LEGACY_DB_PATTERN = re.compile(r"^(?P<ticker>[A-Z0-9.]+)_(?P<timeframe>\d+[A-Za-z]+)_data\.db$")
+
+
+def find_legacy_dbs(db_base_path):
+    """Yield (path, ticker, timeframe) for every per-ticker database in `db_base_path` sorted by ticker."""
+    for path in sorted(glob.glob(os.path.join(db_base_path, "*_data.db"))):
+        if os.path.basename(path) == BAR_STORE_FILENAME:
+            continue
+        match = LEGACY_DB_PATTERN.match(os.path.basename(path))
+        if match is None:
+            logging.warning("Skipping unrecognized database file %r", path)
+            continue
+        yield path, match.group("ticker"), match.group("timeframe")
+
+
+def migrate(db_base_path):
+    store = BarStore(os.path.join(db_base_path, BAR_STORE_FILENAME))
+    try:
+        for path, ticker, timeframe in find_legacy_dbs(db_base_path):
+            try:
+                row_count = store.import_ticker_db(path, ticker, timeframe)
+            except Exception as e:
+                logging.error("Failed to import %r", path, exc_info=e)
+                continue
+            logging.info("Imported %r -> ticker=%r timeframe=%r rows=%r", path, ticker, timeframe, row_count)
+    finally:
+        store.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Import per-ticker DuckDB files into the consolidated bar store.")
+    parser.add_argument("--db-base-path", default="dbs")
+    args = parser.parse_args()
+    migrate(args.db_base_path)
@@ -0,0 +1,100 @@
+import math
+from datetime import datetime
+
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+
+from alpaca.trading import OrderSide
+from app.handlers.data_handler import DataHandler
+from app.utils import analytics
+from tests import utils
+
+START = pd.Timestamp("2024-01-02 09:30")
+
+
+@pytest.fixture
+def trades():
+    minute = pd.Timedelta(minutes=1)
+    return pd.DataFrame([
+        (START, "A", "buy", 10, 100.0, "breakout"),
+        (START + minute, "B", OrderSide.BUY, 2, 50.0, "trend"),
+        (START + 2 * minute, "A", "sell", 15, 102.0, "breakout"),  # closes the long and opens a 5 share short
+        (START + 4 * minute, "A", "buy", 5, 101.0, "trend"),
+    ], columns=["timestamp", "ticker", "side", "qty", "price", "strategy"])
+
+
+@pytest.fixture
+def prices():
+    timestamps = pd.date_range(START, periods=6, freq="1min").values
+    return {"A": (timestamps, np.array([100, 101, 102, 103, 101, 99.0])), "B": (timestamps, np.array([50, 51, 52, 53, 54, 55.0]))}
+
+
+def test_mark_to_market(trades, prices):
+    curve = analytics.mark_to_market(trades, prices, 1000.0)
+
+    assert list(curve["timestamp"]) == list(pd.date_range(START, periods=6, freq="1min"))
+    assert list(curve["cash"]) == [0.0, -100.0, 1430.0, 1430.0, 925.0, 925.0]
+    assert list(curve["short_value"]) == [0.0, 0.0, -510.0, -515.0, 0.0, 0.0]
+    assert list(curve["equity"]) == [1000.0, 1012.0, 1024.0, 1021.0, 1033.0, 1035.0]
+    assert curve["gross_exposure"].iloc[2] == pytest.approx((104.0 + 510.0) / 1024.0)
+
+
+def test_positions_without_bars_are_marked_at_their_fills(trades):
+    curve = analytics.mark_to_market(trades, dict(), 1000.0)
+
+    # A at its last fill of 101, B at 50
+    assert curve["equity"].iloc[-1] == pytest.approx(1000.0 + 20.0 + 5.0)
+
+
+def test_round_trips_split_flips_and_mark_open_positions(trades):
+    trips = analytics.round_trips(trades, marks={"B": 55.0}, as_of=START + pd.Timedelta(minutes=5))
+
+    assert list(trips["ticker"]) == ["A", "A", "B"]
+    assert list(trips["direction"]) == ["long", "short", "long"]
+    assert list(trips["pnl"]) == [20.0, 5.0, 10.0]
+    assert list(trips["closed"]) == [True, True, False]
+    assert list(trips["holding_seconds"]) == [120.0, 120.0, 240.0]
+    assert list(trips["strategy"]) == ["breakout", "breakout", "trend"]
+
+
+def test_performance_report(trades, prices):
+    report = analytics.performance_report(trades, prices, 1000.0)
+
+    metrics = report["metrics"]
+    assert metrics["final_equity"] == 1035.0 and metrics["return_pct"] == pytest.approx(0.035)
+    assert metrics["max_drawdown"] == pytest.approx(3.0 / 1024.0)
+    assert metrics["max_drawdown_seconds"] == 60.0  # under the 09:32 peak at 09:33, recovered at 09:34
+    assert metrics["trades"] == 4 and metrics["round_trips"] == 2 and metrics["win_rate"] == 1.0
+    assert metrics["avg_holding_seconds"] == 120.0
+    attribution = report["attribution"].set_index("strategy")
+    assert attribution.loc["breakout", "pnl"] == 25.0 and attribution.loc["trend", "pnl"] == 10.0
+    assert attribution["pnl"].sum() == metrics["final_equity"] - 1000.0
+
+
+def test_sharpe_and_sortino_use_daily_closes():
+    days = pd.bdate_range("2024-01-01", periods=5) + pd.Timedelta(hours=16)
+    equity = np.array([101.0, 99.0, 102.0, 104.0, 103.0])
+    curve = pd.DataFrame({"timestamp": days, "equity": equity, "gross_exposure": 1.0})
+
+    metrics = analytics.curve_metrics(curve, 100.0)
+
+    returns = np.diff(np.r_[100.0, equity]) / np.r_[100.0, equity][:-1]
+    assert metrics["sharpe"] == pytest.approx(returns.mean() / returns.std(ddof=1) * math.sqrt(252))
+    assert metrics["sortino"] == pytest.approx(returns.mean() / math.sqrt(np.mean(np.minimum(returns, 0) ** 2)) * math.sqrt(252))
+    assert metrics["exposure"] == 1.0
+
+
+def test_equity_curve_chart_marks_trades_to_market(tmp_path):
+    bars = utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=2)
+    utils.create_ticker_db(tmp_path, "AAPL", bars)
+    conn = duckdb.connect(str(tmp_path / "trades.db"))
+    conn.execute("CREATE TABLE trades (timestamp TIMESTAMP, ticker TEXT, action TEXT, qty INT, price FLOAT, order_id TEXT, strategy TEXT, reason TEXT)")
+    conn.execute("INSERT INTO trades VALUES (?, 'AAPL', 'buy', 10, ?, 'id', 'breakout', 'test')", [bars["timestamp"][5], float(bars["close"][4])])
+    conn.close()
+    handler = DataHandler(["AAPL"], "mock_api_key", "mock_secret_key", db_base_path=str(tmp_path))
+
+    chart = handler.generate_equity_curve_chart()
+
+    assert "Account Equity Curve (max drawdown" in chart
@@ -0,0 +1,120 @@
+import threading
+import time
+import pytest
+from datetime import datetime, timedelta
+from types import SimpleNamespace
+from alpaca.data import Bar, TimeFrame
+
+from app.handlers.backfill import BackfillCheckpoints, BackfillEngine, RequestBudget
+from app.handlers.data_handler import DataHandler
+from app.models.bar_store import BarStore
+
+START = datetime(2024, 1, 1)
+END = datetime(2024, 1, 11)
+
+
+class StubHistoricalDataClient:
+    """Local stand-in for StockHistoricalDataClient serving one bar per symbol per hour."""
+    def __init__(self, fail_windows=None):
+        self.requests = []
+        self.fail_windows = fail_windows or set()
+        self.lock = threading.Lock()
+
+    def get_stock_bars(self, request):
+        with self.lock:
+            self.requests.append(request)
+        start = request.start.replace(tzinfo=None)
+        end = request.end.replace(tzinfo=None)
+        if start in self.fail_windows:
+            raise ConnectionError("stub failure")
+        symbols = request.symbol_or_symbols
+        symbols = [symbols] if isinstance(symbols, str) else symbols
+        first_hour = start.replace(minute=0, second=0, microsecond=0)
+        if first_hour < start:
+            first_hour += timedelta(hours=1)
+        data = dict()
+        remaining = request.limit
+        for symbol in sorted(symbols):
+            bars = []
+            ts = first_hour
+            while ts < end and remaining > 0:
+                bars.append(Bar(symbol, {"t": ts, "o": 1.0, "h": 1.0, "l": 1.0, "c": 1.0, "v": 1.0, "n": 1, "vw": 1.0}))
+                ts += timedelta(hours=1)
+                remaining -= 1
+            if bars:
+                data[symbol] = bars
+        return SimpleNamespace(data=data)
+
+
+def collect():
+    saved = dict()
+    def on_data(data):
+        for ticker, bars in data.items():
+            saved.setdefault(ticker, set()).update(bar.timestamp for bar in bars)
+    return saved, on_data
+
+
+def make_engine(client, on_data, **kwargs):
+    kwargs.setdefault("budget", RequestBudget(max_requests=10_000))
+    return BackfillEngine(client, on_data, timeframe=TimeFrame.Hour, window=timedelta(days=2), max_workers=4,
+                          max_retries=0, **kwargs)
+
+
+def test_backfill_fetches_every_bar_concurrently():
+    client = StubHistoricalDataClient()
+    saved, on_data = collect()
+    stats = make_engine(client, on_data).run(["AAPL", "QQQ", "VXX"], START, END)
+
+    assert stats["windows"] == 15 and stats["failed"] == 0
+    for ticker in ["AAPL", "QQQ", "VXX"]:
+        assert len(saved[ticker]) == 10 * 24
+
+
+def test_backfill_follows_pagination_for_batched_tickers():
+    """Full pages are continued for the truncated symbol and the symbols that were not returned yet."""
+    client = StubHistoricalDataClient()
+    saved, on_data = collect()
+    engine = make_engine(client, on_data, batch_size=3, page_limit=20)
+    stats = engine.run(["AAPL", "QQQ", "VXX"], START, END)
+
+    assert all(len(saved[ticker]) == 10 * 24 for ticker in ["AAPL", "QQQ", "VXX"])
+    assert stats["requests"] == len(client.requests) > stats["windows"]
+
+
+def test_data_handler_catches_up_every_ticker_in_one_request_per_day(tmp_path):
+    store = BarStore(str(tmp_path / "market_data.db"))
+    handler = DataHandler(["AAPL", "QQQ", "VXX"], "mock_api_key", "mock_secret_key", db_base_path=str(tmp_path),
+                          timeframe=TimeFrame.Hour, bar_store=store)
+    handler.data_store = StubHistoricalDataClient()
+
+    handler.fetch_data(start=START, end=START + timedelta(days=3))
+
+    assert len(handler.data_store.requests) == 3
+    assert all(sorted(request.symbol_or_symbols) == ["AAPL", "QQQ", "VXX"] for request in handler.data_store.requests)
+    assert len(store.get_ticker_data("QQQ", TimeFrame.Hour)) == 3 * 24
+    store.close()
+
+
+def test_backfill_resumes_from_checkpoint(tmp_path):
+    checkpoint_path = str(tmp_path / "checkpoints.json")
+    failing_client = StubHistoricalDataClient(fail_windows={datetime(2024, 1, 5)})
+    saved, on_data = collect()
+    stats = make_engine(failing_client, on_data, checkpoints=BackfillCheckpoints(checkpoint_path)).run(["AAPL"], START, END)
+    assert stats["failed"] == 1
+    # windows after the failure completed but the checkpoint stops before the gap
+    assert BackfillCheckpoints(checkpoint_path).get("AAPL", TimeFrame.Hour) == datetime(2024, 1, 5)
+
+    client = StubHistoricalDataClient()
+    make_engine(client, on_data, checkpoints=BackfillCheckpoints(checkpoint_path)).run(["AAPL"], START, END)
+    assert min(request.start.replace(tzinfo=None) for request in client.requests) == datetime(2024, 1, 5)
+    assert len(saved["AAPL"]) == 10 * 24
+    assert BackfillCheckpoints(checkpoint_path).get("AAPL", TimeFrame.Hour) == END
+
+
+def test_request_budget_blocks_when_exhausted():
+    budget = RequestBudget(max_requests=2, period=0.2)
+    started_at = time.monotonic()
+    for _ in range(4):
+        budget.acquire()
+    assert time.monotonic() - started_at >= 0.2
+    assert budget.requests_made == 4
@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime
+
+from app.backtester import BacktestingSystem
+from app.models.backtest_checkpoint import BacktestCheckpoint
+from app.models.backtest_data import BacktestDataEngine
+from app.models.reference_series import get_reference_cache
+from tests import utils
+
+TICKERS = ["AAPL", "MSFT"]
+
+
+@pytest.fixture
+def db_base_path(tmp_path):
+    for seed, ticker in enumerate(TICKERS + ["VXX"]):
+        utils.create_ticker_db(tmp_path, ticker, utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=5, seed=seed))
+    yield str(tmp_path)
+    get_reference_cache().clear()
+
+
+def make_system(db_base_path, vectorized):
+    system = BacktestingSystem(TICKERS, "mock_api_key", "mock_api_secret", db_base_path=db_base_path)
+    system.use_vectorized_signals = vectorized
+    system.strategy_handler.select_strategies(["support_resistance", "trend_following", "markov"])
+    system.strategy_handler.support_resistance_strategy.configure(lookback=5)
+    system.strategy_handler.markov_prediction.seed = 7
+    return system
+
+
+def outcome(system):
+    position_manager = system.execution_handler.position_manager
+    # the Markov draws depend on every prediction made before the checkpoint
+    rngs = {ticker: rng.bit_generator.state for ticker, rng in system.strategy_handler.markov_prediction.rngs.items()}
+    return system.trade_ledger(), system.equity_curve, position_manager.cash_balance, sorted(position_manager.positions), rngs
+
+
+@pytest.mark.parametrize("vectorized", [True, False])
+def test_resumed_backtest_matches_an_uninterrupted_one(db_base_path, tmp_path, vectorized):
+    engine = BacktestDataEngine(make_system(db_base_path, vectorized).data_handler.get_backtest_data())
+    uninterrupted = make_system(db_base_path, vectorized)
+    uninterrupted.run_headless(data_engine=engine)
+
+    path = str(tmp_path / "backtest.ckpt")
+    interrupted = make_system(db_base_path, vectorized)
+    interrupted.checkpoint_path, interrupted.checkpoint_every = path, 500
+    steps = 0
+    for kind, *_ in interrupted.replay(data_engine=engine):
+        steps += kind == "candle"
+        if steps == 1300:
+            break  # stopped mid-backtest, the last checkpoint was taken before step 1000
+
+    checkpoint = BacktestCheckpoint.load(path)
+    assert checkpoint.candle_index == 1000
+    resumed = make_system(db_base_path, vectorized)
+    resumed.run_headless(data_engine=engine, checkpoint=checkpoint)
+
+    assert uninterrupted.trade_results, "the backtest should trade for the comparison to mean something"
+    assert outcome(resumed) == outcome(uninterrupted)
+    assert resumed.throughput["bars"] < uninterrupted.throughput["bars"]
+    assert resumed.run["run_id"] == checkpoint.run["run_id"]  # recorded as the run that was interrupted
+    assert resumed.run["final_equity"] == uninterrupted.run["final_equity"]
+
+
+def test_checkpoint_on_other_candles_is_refused(db_base_path, tmp_path):
+    path = str(tmp_path / "backtest.ckpt")
+    system = make_system(db_base_path, True)
+    system.checkpoint_path, system.checkpoint_every = path, 500
+    system.run_headless()
+
+    other = BacktestDataEngine({ticker: utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=4) for ticker in TICKERS})
+    with pytest.raises(ValueError):
+        make_system(db_base_path, True).run_headless(data_engine=other, checkpoint=BacktestCheckpoint.load(path))
+    assert BacktestCheckpoint.load(str(tmp_path / "missing.ckpt")) is None
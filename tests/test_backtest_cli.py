@@ -0,0 +1,62 @@
+import asyncio
+import json
+import subprocess
+import sys
+from datetime import datetime
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app import backtest_cli
+from app.backtester import BacktestingSystem
+from tests import utils
+
+TICKERS = ["AAPL", "MSFT"]
+
+
+@pytest.fixture
+def db_base_path(tmp_path):
+    for seed, ticker in enumerate(TICKERS):
+        utils.create_ticker_db(tmp_path, ticker, utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=4, seed=seed))
+    return str(tmp_path)
+
+
+def make_system(db_base_path):
+    system = BacktestingSystem(TICKERS, "mock_api_key", "mock_api_secret", db_base_path=db_base_path)
+    system.strategy_handler.support_resistance_strategy.configure(lookback=5)
+    system.ws_manager = AsyncMock()
+    return system
+
+
+def test_headless_run_matches_the_dashboard_backtest(db_base_path, tmp_path):
+    dashboard = make_system(db_base_path)
+    asyncio.run(dashboard.run_backtest())
+    headless = make_system(db_base_path)
+
+    summary = backtest_cli.run(headless)
+    backtest_cli.write_results(tmp_path / "results.json", summary, headless)
+
+    assert headless.trade_ledger() == dashboard.trade_ledger()
+    assert headless.equity_curve == dashboard.equity_curve
+    headless.ws_manager.send_message.assert_not_called()
+    assert summary["candles"] == 2 * 4 * 390 and summary["trades"] == len(dashboard.trade_results) > 0
+    with open(tmp_path / "results.json") as f:
+        results = json.load(f)
+    assert results["summary"]["candles_per_second"] > 0
+    assert len(results["trades"]["price"]) == summary["trades"]
+    assert len(results["equity"]["equity"]) == 3
+
+
+def test_cli_writes_a_results_file(db_base_path, tmp_path):
+    output = tmp_path / "out.json"
+    completed = subprocess.run(
+        [sys.executable, "-m", "app.backtest_cli", "--tickers", *TICKERS, "--strategies", "trend_following",
+         "--db-base-path", db_base_path, "--output", str(output)],
+        capture_output=True, text=True, timeout=300,
+    )
+
+    assert completed.returncode == 0, completed.stderr
+    assert "candles/s" in completed.stdout
+    with open(output) as f:
+        summary = json.load(f)["summary"]
+    assert summary["strategies"] == ["trend_following"] and summary["candles"] == 2 * 4 * 390
@@ -0,0 +1,98 @@
+import duckdb
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+
+from app.handlers.strategy_handler import StrategyHandler
+from app.models.backtest_data import BacktestDataEngine
+from app.strategies.base import get_ticker_data_by_timeframe
+from tests import utils
+
+
+@pytest.fixture
+def candles():
+    return utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=5)
+
+
+def test_window_matches_duckdb_read(tmp_path, candles):
+    utils.create_ticker_db(tmp_path, "AAPL", candles)
+    engine = BacktestDataEngine({"AAPL": candles})
+    start, end = datetime(2024, 1, 2, 10, 0), datetime(2024, 1, 4, 13, 17)
+
+    conn = duckdb.connect(f"{tmp_path}/AAPL_1Min_data.db")
+    expected = get_ticker_data_by_timeframe("AAPL", conn, db_base_path=str(tmp_path), end=end, start=start)
+    conn.close()
+    window = engine.window("AAPL", end=end, start=start)
+
+    assert len(window) == len(expected)
+    assert (window['timestamp'].values == expected['timestamp'].values).all()
+    # the databases store FLOAT (float32) prices
+    np.testing.assert_allclose(window['close'].values, expected['close'].values, rtol=1e-6)
+
+
+def test_window_is_a_view_of_the_loaded_candles(candles):
+    engine = BacktestDataEngine({"AAPL": candles})
+    window = engine.window("AAPL", end=datetime(2024, 1, 3, 12, 0))
+    arrays = engine.arrays("AAPL", end=datetime(2024, 1, 3, 12, 0))
+
+    assert np.shares_memory(window['close'].values, engine.frame("AAPL")['close'].values)
+    assert np.shares_memory(arrays['close'], engine.frame("AAPL")['close'].values)
+    assert window['timestamp'].iloc[-1] == datetime(2024, 1, 3, 11, 59)
+
+
+def test_unsorted_and_partial_columns_are_normalized():
+    engine = BacktestDataEngine({
+        "end": datetime(2024, 1, 1),
+        "AAPL": {"timestamp": [datetime(2024, 1, 1, 9, 31), datetime(2024, 1, 1, 9, 30)], "close": [2.0, 1.0]},
+    })
+
+    assert engine.tickers == ["AAPL"]
+    assert list(engine.frame("AAPL")['close']) == [1.0, 2.0]
+    assert engine.frame("AAPL")['open'].isna().all()
+    assert engine.last_candle("AAPL", datetime(2024, 1, 1, 9, 31))['close'] == 1.0
+    assert engine.last_candle("AAPL", datetime(2024, 1, 1, 9, 30)) is None
+
+
+def test_strategy_handler_reads_from_the_engine_during_backtests(candles):
+    handler = StrategyHandler(["AAPL"], db_base_path="does-not-exist")
+    handler.backtest_engine = BacktestDataEngine({"AAPL": candles})
+
+    with patch("app.handlers.strategy_handler.duckdb.connect", side_effect=AssertionError("DuckDB was queried")):
+        data = handler.load_ticker_data("AAPL", end=datetime(2024, 1, 5, 15, 0), start=datetime(2024, 1, 5))
+
+    assert len(data) == 330
+
+
+def test_clock_merges_every_tickers_candles():
+    engine = BacktestDataEngine({
+        "AAPL": {"timestamp": [datetime(2024, 1, 1, 9, 30), datetime(2024, 1, 1, 9, 32)], "close": [1.0, 2.0]},
+        "MSFT": {"timestamp": [datetime(2024, 1, 1, 9, 31), datetime(2024, 1, 1, 9, 32), datetime(2024, 1, 1, 9, 33)], "close": [3.0, 4.0, 5.0]},
+    })
+    clock = engine.clock()
+
+    assert len(clock) == 4 and clock.bars == 5
+    assert [clock.timestamp(i).minute for i in range(len(clock))] == [30, 31, 32, 33]
+    assert clock.events(0) == [("AAPL", 0)]
+    assert clock.events(2) == [("AAPL", 1), ("MSFT", 1)]
+    assert clock.events(3) == [("MSFT", 2)]
+    assert clock.bars_between(1, 3) == 3
+    assert engine.clock(["MSFT", "TSLA"]).tickers == ["MSFT"]
+
+
+def test_saved_engine_loads_as_read_only_memory_maps(tmp_path, candles):
+    engine = BacktestDataEngine({"AAPL": candles})
+    engine.save(tmp_path)
+    loaded = BacktestDataEngine.load(tmp_path)
+
+    assert loaded.tickers == ["AAPL"]
+    assert (loaded.timestamps["AAPL"] == engine.timestamps["AAPL"]).all()
+    np.testing.assert_array_equal(loaded.frame("AAPL")['close'].values, engine.frame("AAPL")['close'].values)
+    close = loaded.frame("AAPL")['close'].values
+    assert not close.flags.writeable
+    base = close
+    while base is not None and not isinstance(base, np.memmap):
+        base = base.base
+    assert isinstance(base, np.memmap)
+    assert len(loaded.window("AAPL", end=datetime(2024, 1, 3, 12, 0))) == len(engine.window("AAPL", end=datetime(2024, 1, 3, 12, 0)))
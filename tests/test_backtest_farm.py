@@ -0,0 +1,77 @@
+import json
+import pytest
+from datetime import datetime
+
+from app.backtest_farm import BacktestFarm, parameter_grid, parse_param
+from app.models.backtest_runs import BacktestRunStore
+from tests import utils
+
+
+@pytest.fixture
+def data():
+    return {ticker: utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=3, seed=seed) for seed, ticker in enumerate(["AAPL", "MSFT"])}
+
+
+@pytest.fixture
+def runs(tmp_path):
+    return BacktestRunStore(str(tmp_path / "backtest_runs.db"))
+
+
+def test_parameter_grid_sweeps_shared_and_per_strategy_params():
+    jobs = parameter_grid(["AAPL", "MSFT"], ["support_resistance", "trend_following"], {
+        "target_pct": [0.03, 0.05],
+        "support_resistance.support_threshold": [0.01, 0.02],
+    })
+
+    assert [job["job_id"] for job in jobs] == list(range(12))
+    support_resistance = [job for job in jobs if job["strategy"] == "support_resistance"]
+    trend_following = [job for job in jobs if job["strategy"] == "trend_following"]
+    assert len(support_resistance) == 8 and len(trend_following) == 4
+    assert {job["ticker"] for job in jobs} == {"AAPL", "MSFT"}
+    assert all(job["params"].keys() == {"target_pct"} for job in trend_following)
+    assert {(job["params"]["target_pct"], job["params"]["support_threshold"]) for job in support_resistance} == {
+        (0.03, 0.01), (0.03, 0.02), (0.05, 0.01), (0.05, 0.02)
+    }
+
+
+def test_parse_param():
+    assert parse_param("support_resistance.lookback=20,40") == ("support_resistance.lookback", [20, 40])
+    assert parse_param("target_pct=0.03") == ("target_pct", [0.03])
+
+
+def test_farm_stores_every_job_as_a_run_and_ranks_them(data, runs):
+    jobs = parameter_grid(["AAPL", "MSFT"], ["support_resistance"], {"lookback": [5, 10], "target_pct": [0.05]})
+    jobs.append({"job_id": len(jobs), "ticker": "AAPL", "strategy": "support_resistance", "params": {"no_such_param": 1}})
+    farm = BacktestFarm("mock_api_key", "mock_api_secret", workers=0, runs=runs)
+
+    farm_id = farm.run(data, jobs)
+
+    ranked = farm.rank(farm_id)
+    assert len(ranked) == 4  # the failed job isn't ranked
+    assert list(ranked["return_pct"]) == sorted(ranked["return_pct"], reverse=True)
+    assert (ranked["bars"] == 3 * 390).all()
+    assert (ranked["source"] == "farm").all()
+    assert {json.loads(params)["lookback"] for params in ranked["params"]} == {5, 10}
+    assert sorted(ticker for tickers in ranked["tickers"] for ticker in tickers) == ["AAPL", "AAPL", "MSFT", "MSFT"]
+    failed = runs.list_runs(batch_id=farm_id, status="failed")
+    assert len(failed) == 1 and "no_such_param" in failed["error"][0]
+    for run in ranked.itertuples():
+        assert len(runs.get_trades(run.run_id)) == run.trades
+    _, equity = runs.compare_runs(list(ranked["run_id"]))
+    assert (equity.groupby("run_id").size() == 3).all()  # marked to market at the close of every backtested day
+
+
+def test_worker_processes_match_the_in_process_run(data, tmp_path):
+    jobs = parameter_grid(["AAPL", "MSFT"], ["support_resistance"], {"lookback": [5]})
+    in_process = BacktestFarm("mock_api_key", "mock_api_secret", workers=0, runs=BacktestRunStore(str(tmp_path / "in_process.db")))
+    pooled = BacktestFarm("mock_api_key", "mock_api_secret", workers=2, runs=BacktestRunStore(str(tmp_path / "pooled.db")))
+
+    in_process.run(data, jobs, farm_id="farm")
+    pooled.run(data, jobs, farm_id="farm")
+
+    def ranked(farm):
+        runs = farm.rank("farm")
+        runs["ticker"] = [tickers[0] for tickers in runs["tickers"]]
+        return runs.sort_values("ticker")[["ticker", "trades", "final_equity", "return_pct", "max_drawdown", "bars"]].reset_index(drop=True)
+
+    assert ranked(pooled).equals(ranked(in_process))
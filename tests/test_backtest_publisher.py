@@ -0,0 +1,142 @@
+import asyncio
+import json
+import zlib
+from datetime import datetime
+from types import SimpleNamespace
+from unittest.mock import AsyncMock
+
+import pytest
+
+from app.backtester import BacktestingSystem
+from app.models.backtest_data import BacktestDataEngine
+from app.models.backtest_publisher import BacktestPublisher
+from tests import utils
+
+
+class FakeClock:
+    def __init__(self):
+        self.now = 0.0
+
+    def __call__(self):
+        return self.now
+
+
+def position(qty, price):
+    return SimpleNamespace(qty=qty, entry_price=100.0, current_price=price, pl=price - 100.0, pl_pct=price / 100.0 - 1, direction="long", is_open=True)
+
+
+def order(ticker, price):
+    return {"timestamp": "2024-01-02T10:00:00", "ticker": ticker, "side": "buy", "qty": 1, "price": price, "direction": "long"}
+
+
+@pytest.fixture
+def clock():
+    return FakeClock()
+
+
+def test_updates_between_frames_are_coalesced(clock):
+    ws_manager = AsyncMock()
+    publisher = BacktestPublisher(ws_manager, interval=0.25, clock=clock)
+    account = SimpleNamespace(cash_balance=1000.0, positions={"AAPL": position(1, 100.0)})
+
+    assert asyncio.run(publisher.publish(account))  # the first frame goes out straight away
+    for i in range(100):
+        publisher.trade(order("AAPL", 100.0 + i))
+        clock.now += 0.001
+        assert not asyncio.run(publisher.publish(account))
+    clock.now += 0.25
+    assert asyncio.run(publisher.publish(account))
+
+    first, second = [call.args[0] for call in ws_manager.send_message.call_args_list]
+    assert first["positions"]["changed"]["ticker"] == ["AAPL"] and first["balance"] == 1000.0
+    assert second["seq"] == 2 and second["trades"]["price"] == [100.0 + i for i in range(100)]
+    assert "positions" not in second and "balance" not in second  # unchanged since the first frame
+
+
+def test_frames_carry_position_deltas(clock):
+    publisher = BacktestPublisher(AsyncMock(), clock=clock)
+    account = SimpleNamespace(cash_balance=1000.0, positions={"AAPL": position(1, 100.0), "MSFT": position(2, 100.0)})
+    publisher.frame(account)
+
+    account.positions["AAPL"] = position(1, 101.0)
+    del account.positions["MSFT"]
+    frame = publisher.frame(account)
+
+    assert frame["positions"]["changed"]["ticker"] == ["AAPL"] and frame["positions"]["changed"]["current_price"] == [101.0]
+    assert frame["positions"]["removed"] == ["MSFT"]
+    assert publisher.frame(account) is None
+
+
+def apply(state, frame):
+    """What the dashboard keeps of the frames it receives."""
+    if frame["type"] == "snapshot":
+        state = {"positions": dict(), "trades": [], "candles": []}
+    for ticker in frame.get("positions", {}).get("removed", []):
+        state["positions"].pop(ticker)
+    changed = frame.get("positions", {}).get("changed", {"ticker": []})
+    for i, ticker in enumerate(changed["ticker"]):
+        state["positions"][ticker] = {field: values[i] for field, values in changed.items()}
+    state["trades"] += frame.get("trades", {"price": []})["price"]
+    state["candles"] += frame.get("candles", {"timestamp": []})["timestamp"]
+    for field in ["balance", "progress"]:
+        if field in frame:
+            state[field] = frame[field]
+    return state
+
+
+def test_snapshot_and_the_following_frames_give_the_full_state(clock):
+    publisher = BacktestPublisher(AsyncMock(), clock=clock)
+    account = SimpleNamespace(cash_balance=1000.0, positions={"AAPL": position(1, 100.0), "MSFT": position(2, 100.0)})
+    frames = []
+    for step in range(6):
+        publisher.trade(order("AAPL", 100.0 + step))
+        publisher.advance(datetime(2024, 1, 2, 10, step), step / 6)
+        if step == 2:
+            publisher.day([{"timestamp": "2024-01-02", "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5}], {"trades": 3})
+        account.cash_balance -= 10.0
+        account.positions["AAPL"] = position(1, 100.0 + step)  # MSFT stays unchanged after the first frame
+        if step == 4:
+            del account.positions["MSFT"]
+        frames.append(publisher.frame(account))
+        if step == 2:
+            snapshot = publisher.snapshot()  # a dashboard connecting mid-run
+
+    assert frames[0]["type"] == "snapshot" and all(frame["type"] == "frame" for frame in frames[1:])
+    everything = {"positions": dict(), "trades": [], "candles": []}
+    for frame in frames:
+        everything = apply(everything, frame)
+    late = apply(None, snapshot)
+    assert set(late["positions"]) == {"AAPL", "MSFT"} and late["trades"] == [100.0, 101.0, 102.0]
+    for frame in frames[3:]:
+        late = apply(late, frame)
+    assert late == everything
+    assert json.loads(json.dumps(snapshot))["stats"] == {"trades": 3}
+
+
+def test_deflate_frames_are_compressed_json(clock):
+    ws_manager = AsyncMock()
+    publisher = BacktestPublisher(ws_manager, encoding="deflate", clock=clock)
+    publisher.message("Backtest has begun")
+
+    asyncio.run(publisher.publish(SimpleNamespace(cash_balance=1000.0, positions=dict())))
+
+    frame = json.loads(zlib.decompress(ws_manager.send_message.call_args.args[0]))
+    assert frame["messages"] == [{"type": "success", "text": "Backtest has begun"}]
+    with pytest.raises(ValueError):
+        BacktestPublisher(ws_manager, encoding="xml")
+
+
+def test_dashboard_backtest_sends_coalesced_frames(tmp_path):
+    data = {ticker: utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=3, seed=seed) for seed, ticker in enumerate(["AAPL", "MSFT"])}
+    system = BacktestingSystem(["AAPL", "MSFT"], "mock_api_key", "mock_api_secret", db_base_path=str(tmp_path))
+    system.strategy_handler.support_resistance_strategy.configure(lookback=5)
+    system.ws_manager = AsyncMock()
+    system.publish_interval = 3600  # only the forced first and last frames
+
+    asyncio.run(system.run_backtest(data_engine=BacktestDataEngine(data)))
+
+    frames = [call.args[0] for call in system.ws_manager.send_message.call_args_list]
+    assert system.trade_results and len(frames) == 2
+    assert len(frames[1]["trades"]["ticker"]) == len(system.trade_results)
+    assert len(frames[1]["candles"]["timestamp"]) == 2  # one daily candle for every day after the first
+    assert frames[1]["progress"] == 1.0
@@ -0,0 +1,146 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+from unittest.mock import AsyncMock
+
+import pandas as pd
+import pytest
+
+from app.backtester import BacktestingSystem
+from app.models.backtest_data import BacktestDataEngine
+from app.models.backtest_runs import BacktestRunStore, downsample, to_records
+from tests import utils
+
+
+@pytest.fixture
+def runs(tmp_path):
+    return BacktestRunStore(str(tmp_path / "backtest_runs.db"))
+
+
+def make_run(run_id, **fields):
+    return {"run_id": run_id, "source": "cli", "status": "completed", "started_at": datetime(2024, 1, 1), "tickers": ["AAPL"],
+            "strategies": ["support_resistance"], "params": dict(), **fields}
+
+
+def test_downsample_keeps_the_ends():
+    assert list(downsample(10, max_points=20)) == list(range(10))
+    indices = downsample(10_000, max_points=500)
+    assert len(indices) <= 500 and indices[0] == 0 and indices[-1] == 9_999
+
+
+def test_list_filter_order_and_compare(runs):
+    start = datetime(2024, 1, 1)
+    runs.save_run(make_run("a", batch_id="sweep", return_pct=0.1, tickers=["AAPL", "MSFT"]),
+                  trades=[(start, "AAPL", "buy", 1.0, 10.0, "breakout", "support_resistance")],
+                  equity=[(start + timedelta(days=i), 100.0 + i) for i in range(1_000)])
+    runs.save_run(make_run("b", batch_id="sweep", return_pct=0.3, strategies=["trend_following"]))
+    runs.save_run(make_run("c", return_pct=0.2, status="failed"))
+
+    assert list(runs.list_runs(order_by="return_pct")["run_id"]) == ["b", "c", "a"]
+    assert list(runs.list_runs(batch_id="sweep", order_by="return_pct", descending=False)["run_id"]) == ["a", "b"]
+    assert list(runs.list_runs(ticker="MSFT")["run_id"]) == ["a"]
+    assert list(runs.list_runs(strategy="trend_following")["run_id"]) == ["b"]
+    assert list(runs.list_runs(status="failed")["run_id"]) == ["c"]
+    assert list(runs.list_runs(order_by="return_pct", limit=1, offset=1)["run_id"]) == ["c"]
+    with pytest.raises(ValueError):
+        runs.list_runs(order_by="run_id; DROP TABLE backtest_runs")
+
+    compared, equity = runs.compare_runs(["b", "a"])
+    assert list(compared["run_id"]) == ["b", "a"]
+    assert len(equity) <= 500 and equity["equity"].iloc[-1] == 1_099.0
+    assert len(runs.get_trades("a")) == 1
+
+    runs.save_run(make_run("a", return_pct=0.5))  # saving again replaces the run, its trades and equity
+    assert runs.list_runs(order_by="return_pct")["run_id"][0] == "a"
+    assert runs.get_trades("a").empty
+    records = to_records(runs.list_runs(order_by="return_pct"))
+    assert json.loads(json.dumps(records, default=str))[0]["tickers"] == ["AAPL"]
+
+
+def test_backtest_records_its_run(runs, tmp_path):
+    data = {ticker: utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=3, seed=seed) for seed, ticker in enumerate(["AAPL", "MSFT"])}
+    system = BacktestingSystem(["AAPL", "MSFT"], "mock_api_key", "mock_api_secret", db_base_path=str(tmp_path))
+    system.strategy_handler.support_resistance_strategy.configure(lookback=5)
+    system.run_store = runs
+    system.run_params = {"lookback": 5}
+
+    system.run_headless(data_engine=BacktestDataEngine(data))
+
+    run = runs.list_runs().iloc[0]
+    assert run["run_id"] == system.run["run_id"] and run["status"] == "completed" and run["source"] == "dashboard"
+    assert list(run["tickers"]) == ["AAPL", "MSFT"] and json.loads(run["params"]) == {"lookback": 5}
+    assert run["trades"] == len(system.trade_results) == len(runs.get_trades(run["run_id"]))
+    assert run["bars"] == 2 * 3 * 390
+    # equity is the ledger marked to market: cash plus every position at its ticker's last close
+    ledger = runs.get_trades(run["run_id"])
+    signed = ledger["qty"].where(ledger["side"] == "buy", -ledger["qty"])
+    positions = signed.groupby(ledger["ticker"]).sum()
+    closes = {ticker: frame["close"].iloc[-1] for ticker, frame in data.items()}
+    expected = 30000 - (signed * ledger["price"]).sum() + sum(qty * closes[ticker] for ticker, qty in positions.items())
+    assert run["final_equity"] == pytest.approx(expected)
+    attribution = json.loads(run["attribution"])
+    assert {row["strategy"] for row in attribution} <= set(ledger["strategy"])
+
+
+def test_cancelled_backtest_is_recorded(runs, tmp_path):
+    data = {"AAPL": utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=2)}
+    system = BacktestingSystem(["AAPL"], "mock_api_key", "mock_api_secret", db_base_path=str(tmp_path))
+    system.run_store = runs
+
+    replay = system.replay(data_engine=BacktestDataEngine(data))
+    for _ in range(10):
+        next(replay)
+    replay.close()
+
+    assert list(runs.list_runs()["status"]) == ["cancelled"]
+
+
+def test_each_run_of_a_reused_system_holds_only_its_own_trades(runs, tmp_path):
+    data = {ticker: utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=10, seed=seed) for seed, ticker in enumerate(["AAPL", "MSFT"])}
+
+    def backtest(system):
+        system.strategy_handler.support_resistance_strategy.configure(lookback=5)
+        system.run_store = runs
+        system.run_headless(data_engine=BacktestDataEngine(data))
+        return system.run["run_id"]
+
+    fresh = backtest(BacktestingSystem(["AAPL", "MSFT"], "mock_api_key", "mock_api_secret", db_base_path=str(tmp_path)))
+    # the dashboard reuses one system for every backtest
+    system = BacktestingSystem(["AAPL", "MSFT"], "mock_api_key", "mock_api_secret", db_base_path=str(tmp_path))
+    first, second = backtest(system), backtest(system)
+
+    expected = runs.get_trades(fresh).drop(columns="run_id", errors="ignore")
+    assert len(expected) > 0
+    for run_id in (first, second):
+        pd.testing.assert_frame_equal(runs.get_trades(run_id).drop(columns="run_id", errors="ignore"), expected)
+    compared, _ = runs.compare_runs([fresh, second])
+    assert compared["final_equity"].iloc[1] == pytest.approx(compared["final_equity"].iloc[0])
+
+
+def test_dashboard_backtests_run_one_at_a_time(runs, tmp_path):
+    for seed, ticker in enumerate(["AAPL", "MSFT"]):
+        utils.create_ticker_db(tmp_path, ticker, utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=10, seed=seed))
+    system = BacktestingSystem(["AAPL", "MSFT"], "mock_api_key", "mock_api_secret", db_base_path=str(tmp_path))
+    system.strategy_handler.support_resistance_strategy.configure(lookback=5)
+    system.run_store = runs
+    system.ws_manager = AsyncMock()
+
+    async def scenario():
+        await system.start_backtest_for_ticker("AAPL", "support_resistance")
+        first = system.running_backtests["AAPL"]
+        while system.run is None or system.run["tickers"] != ["AAPL"] or not system.trade_results:
+            await asyncio.sleep(0)
+        # starting another backtest cancels the running one, which is recorded before the system is reset
+        await system.start_backtest_for_ticker("MSFT", "support_resistance")
+        await system.running_backtests["MSFT"]
+        assert first.done() and not system.is_running
+
+    asyncio.run(scenario())
+
+    recorded = runs.list_runs().set_index("status")
+    assert list(recorded.loc["cancelled", "tickers"]) == ["AAPL"]
+    assert list(recorded.loc["completed", "tickers"]) == ["MSFT"]
+    for status, ticker in [("cancelled", "AAPL"), ("completed", "MSFT")]:
+        trades = runs.get_trades(recorded.loc[status, "run_id"])
+        assert len(trades) == recorded.loc[status, "trades"] and set(trades["ticker"]) <= {ticker}
+    assert set(system.trade_ledger()[i][1] for i in range(len(system.trade_results))) <= {"MSFT"}
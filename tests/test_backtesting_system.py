@@ -149,5 +149,35 @@ async def test_run_backtest_sends_daily_candle_data(backtest_system):
         # Ensure WebSocket received a daily summary
         assert mock_ws.send_message.call_count > 1
         args, kwargs = mock_ws.send_message.call_args
-        assert "ticker_data" in args[0]  # Ensure ticker data was sent
+        assert "candles" in args[0] and "stats" in args[0]  # Ensure the day's candles were sent
 
+
+
+@pytest.mark.asyncio
+async def test_run_backtest_steps_every_ticker_on_one_clock(backtest_system):
+    """Each ticker is evaluated once per candle of its own, on a clock merged from every ticker's candles."""
+    backtest_system.tickers = ["AAPL", "MSFT"]
+    backtest_system.data_handler.get_backtest_data.return_value = {
+        "AAPL": {"timestamp": [datetime(2024, 2, 1, 10, 0), datetime(2024, 2, 1, 10, 2)], "close": [10.0, 11.0]},
+        "MSFT": {"timestamp": [datetime(2024, 2, 1, 10, 1), datetime(2024, 2, 1, 10, 2), datetime(2024, 2, 1, 10, 3)], "close": [20.0, 21.0, 22.0]},
+    }
+    calls = []
+    backtest_system.strategy_handler.generate_signals.side_effect = lambda is_backtest, backtest_data: calls.append(backtest_data) or {}
+
+    await backtest_system.run_backtest()
+
+    assert [(c["end"].minute, c["tickers"]) for c in calls] == [(0, []), (1, ["AAPL"]), (2, ["MSFT"]), (3, ["AAPL", "MSFT"])]
+    marked = backtest_system.execution_handler.position_manager.mark_positions.call_args_list
+    assert marked[-1].args[0] == {"AAPL": 11.0, "MSFT": 21.0}
+    assert backtest_system.throughput["bars"] == 5 and backtest_system.throughput["tickers"] == 2
+
+
+@pytest.mark.asyncio
+async def test_start_backtest_for_ticker_keeps_the_portfolio_tickers(backtest_system):
+    backtest_system.tickers = ["AAPL", "MSFT"]
+    with patch.object(backtest_system, "run_backtest", new_callable=AsyncMock) as mock_run:
+        await backtest_system.start_backtest_for_ticker("MSFT", "momentum")
+        await asyncio.sleep(0)
+
+    assert backtest_system.tickers == ["AAPL", "MSFT"]
+    mock_run.assert_called_once_with(tickers=["MSFT"])
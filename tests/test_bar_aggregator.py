@@ -0,0 +1,102 @@
+import numpy as np
+import pytest
+from datetime import datetime
+from unittest.mock import patch
+
+from app.models.bar_aggregator import BarAggregator, resample_bars
+from app.strategies.trend_following_strategy import TrendFollowingStrategy
+from tests import utils
+
+PRICE_COLUMNS = ['open', 'high', 'low', 'close', 'volume']
+
+
+@pytest.fixture
+def candles():
+    return utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=20)
+
+
+def assert_matches_pandas(aggregated, candles, interval):
+    expected = resample_bars(candles, interval)
+    assert (aggregated['timestamp'].values == expected['timestamp'].values).all()
+    np.testing.assert_allclose(aggregated[PRICE_COLUMNS].values, expected[PRICE_COLUMNS].values)
+
+
+@pytest.mark.parametrize("interval", ["5min", "15min", "60min", "4h", "1D"])
+def test_seeded_bars_match_pandas_resample(candles, interval):
+    aggregator = BarAggregator()
+    aggregator.update_from_frame("AAPL", candles)
+
+    assert_matches_pandas(aggregator.frame("AAPL", interval), candles, interval)
+
+
+@pytest.mark.parametrize("interval", ["15min", "60min"])
+def test_incremental_bars_match_pandas_resample(candles, interval):
+    aggregator = BarAggregator()
+    aggregator.update_from_frame("AAPL", candles.iloc[:1000])
+    for row in candles.iloc[1000:1500].itertuples():
+        aggregator.update("AAPL", row.timestamp, row.open, row.high, row.low, row.close, row.volume, row.vwap)
+    # overlapping candles are ignored
+    aggregator.update_from_frame("AAPL", candles.iloc[1200:])
+
+    assert aggregator.last_timestamp("AAPL") == candles['timestamp'].iloc[-1]
+    assert_matches_pandas(aggregator.frame("AAPL", interval), candles, interval)
+
+
+def test_open_bucket_is_included(candles):
+    aggregator = BarAggregator()
+    partial = candles.iloc[:7]  # 9:30 - 9:36
+    aggregator.update_from_frame("AAPL", partial)
+
+    bars = aggregator.frame("AAPL", "15min")
+    assert list(bars['timestamp']) == [datetime(2024, 1, 1, 9, 30)]
+    assert bars['close'].iloc[-1] == partial['close'].iloc[-1]
+    assert bars['volume'].iloc[-1] == partial['volume'].sum()
+
+
+def test_frame_requires_coverage(candles):
+    aggregator = BarAggregator()
+    aggregator.update_from_frame("AAPL", candles.iloc[100:500])
+    start, end = candles['timestamp'].iloc[100], candles['timestamp'].iloc[499]
+
+    assert aggregator.frame("AAPL", "15min", start=start, end=end) is not None
+    assert aggregator.frame("AAPL", "15min", start=candles['timestamp'].iloc[0], end=end) is None
+    assert aggregator.frame("AAPL", "15min", start=start, end=candles['timestamp'].iloc[400]) is None
+    assert aggregator.frame("AAPL", "1min", start=start, end=end) is None
+    assert aggregator.frame("MSFT", "15min") is None
+
+
+def test_strategy_reads_from_the_aggregator(candles):
+    expected = TrendFollowingStrategy().generate_signal("AAPL", candles)
+    strategy = TrendFollowingStrategy()
+    strategy.bar_aggregator = BarAggregator()
+    strategy.bar_aggregator.update_from_frame("AAPL", candles)
+
+    with patch.object(strategy, "resample_data", side_effect=AssertionError("resampled with pandas")):
+        signal = strategy.generate_signal("AAPL", candles)
+
+    assert (signal.action, signal.price) == (expected.action, expected.price)
+
+
+@pytest.mark.parametrize("interval", ["15min", "60min", "4h", "1D"])
+def test_window_of_a_warm_aggregator_matches_pandas_resample(candles, interval):
+    aggregator = BarAggregator()
+    aggregator.update_from_frame("AAPL", candles.iloc[:2000])
+    window = candles.iloc[1005:2000]  # starts mid-bucket, after candles the aggregator already holds
+
+    bars = aggregator.window("AAPL", interval, window)
+
+    assert_matches_pandas(bars, window, interval)
+    # the first bar holds only the window's own candles
+    first_bar = window[window['timestamp'] < bars['timestamp'].iloc[1]]
+    assert bars['vwap'].iloc[0] == pytest.approx((first_bar['vwap'] * first_bar['volume']).sum() / first_bar['volume'].sum())
+
+
+def test_frame_leaves_out_the_bucket_holding_earlier_candles(candles):
+    aggregator = BarAggregator()
+    aggregator.update_from_frame("AAPL", candles.iloc[:500])
+    start = candles['timestamp'].iloc[100]  # 11:10, inside the 11:00 bucket
+
+    bars = aggregator.frame("AAPL", "60min", start=start)
+
+    assert bars['timestamp'].iloc[0] == datetime(2024, 1, 1, 12)
+    assert aggregator.window("AAPL", "60min", candles.iloc[100:500])['timestamp'].iloc[0] == datetime(2024, 1, 1, 11)
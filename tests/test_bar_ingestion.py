@@ -0,0 +1,54 @@
+import duckdb
+import numpy as np
+from datetime import datetime, timezone
+from alpaca.data import Bar, TimeFrame
+
+from app.utils.bar_ingestion import BarIngestor, bars_to_frame
+
+
+def make_bars(ticker, n, vwap=True):
+    return [
+        Bar(ticker, {"t": datetime(2024, 1, 2, 14, 30 + i, tzinfo=timezone.utc), "o": 10.0 + i, "h": 11.0 + i,
+                     "l": 9.0 + i, "c": 10.5 + i, "v": 100.0, "n": 5, "vw": 10.2 + i if vwap else None})
+        for i in range(n)
+    ]
+
+
+def create_ticker_db(db_base_path, ticker):
+    conn = duckdb.connect(f"{db_base_path}/{ticker}_{TimeFrame.Minute}_data.db")
+    conn.sql("CREATE TABLE ticker_data (timestamp TIMESTAMP, ticker TEXT, open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume FLOAT, vwap FLOAT, PRIMARY KEY (timestamp, ticker))")
+    conn.close()
+
+
+def test_bars_to_frame_is_columnar_naive_utc():
+    frame = bars_to_frame("AAPL", make_bars("AAPL", 3, vwap=False))
+    assert list(frame.columns) == ["timestamp", "ticker", "open", "high", "low", "close", "volume", "vwap"]
+    assert frame["timestamp"].dt.tz is None
+    assert frame["timestamp"].iloc[0] == datetime(2024, 1, 2, 14, 30)
+    assert frame["close"].dtype == np.float64
+    assert frame["vwap"].isna().all()
+
+
+def test_ingestor_matches_string_insert(tmp_path):
+    """The columnar upsert stores exactly what the old `INSERT OR IGNORE ... VALUES` statement stored."""
+    bars = make_bars("AAPL", 5)
+    legacy_path, columnar_path = tmp_path / "legacy", tmp_path / "columnar"
+    for path in [legacy_path, columnar_path]:
+        path.mkdir()
+        create_ticker_db(path, "AAPL")
+
+    conn = duckdb.connect(f"{legacy_path}/AAPL_1Min_data.db")
+    value_strs = [f"('{row.timestamp}', 'AAPL', {row.open}, {row.high}, {row.low}, {row.close}, {row.volume}, {row.vwap})" for row in bars]
+    conn.execute(f"INSERT OR IGNORE INTO ticker_data VALUES {', '.join(value_strs)}")
+    expected = conn.sql("SELECT * FROM ticker_data ORDER BY timestamp").fetchall()
+    conn.close()
+
+    ingestor = BarIngestor(db_base_path=str(columnar_path), timeframe=TimeFrame.Minute, chunk_size=2)
+    ingestor.ingest_barset({"AAPL": bars, "QQQ": []})
+    ingestor.ingest_barset({"AAPL": bars})  # duplicates are ignored
+    conn = duckdb.connect(f"{columnar_path}/AAPL_1Min_data.db")
+    actual = conn.sql("SELECT * FROM ticker_data ORDER BY timestamp").fetchall()
+    conn.close()
+
+    assert actual == expected
+    assert ingestor.rows_written == 10
@@ -0,0 +1,75 @@
+import pandas as pd
+import pytest
+from datetime import datetime
+from alpaca.data import TimeFrame
+
+from app.handlers.data_handler import DataHandler
+from app.models.bar_store import BarStore
+from app.utils.bar_ingestion import BAR_COLUMNS
+
+
+@pytest.fixture
+def bar_store(tmp_path):
+    """BarStore seeded from the legacy per-ticker test databases."""
+    store = BarStore(str(tmp_path / "market_data.db"))
+    for ticker in ["AAPL", "QQQ", "VXX"]:
+        store.import_ticker_db(f"tests/data/{ticker}_1Day_data.db", ticker, TimeFrame.Day)
+    yield store
+    store.close()
+
+
+def test_import_ticker_db_is_idempotent(bar_store):
+    """Importing the same legacy file twice does not duplicate rows."""
+    row_count = bar_store.import_ticker_db("tests/data/AAPL_1Day_data.db", "AAPL", TimeFrame.Day)
+    assert row_count == 250
+
+
+def test_get_ticker_data_filters_by_ticker_and_time(bar_store):
+    data = bar_store.get_ticker_data("QQQ", TimeFrame.Day, start=datetime(2024, 6, 1), end=datetime(2024, 7, 1))
+    assert not data.empty
+    assert set(data["ticker"]) == {"QQQ"}
+    assert data["timestamp"].is_monotonic_increasing
+    assert data["timestamp"].min() >= datetime(2024, 6, 1)
+    assert data["timestamp"].max() < datetime(2024, 7, 1)
+
+
+def test_get_latest_bars_returns_one_row_per_ticker(bar_store):
+    latest = bar_store.get_latest_bars(["AAPL", "VXX"], TimeFrame.Day).set_index("ticker")
+    assert sorted(latest.index) == ["AAPL", "VXX"]
+    assert latest.loc["AAPL", "timestamp"] == datetime(2025, 1, 10, 5, 0)
+    assert latest.loc["VXX", "timestamp"] == datetime(2025, 1, 13, 5, 0)
+
+
+def test_get_last_timestamp_is_before_end(bar_store):
+    assert bar_store.get_last_timestamp("AAPL", TimeFrame.Day) == datetime(2025, 1, 10, 5, 0)
+    data = bar_store.get_ticker_data("AAPL", TimeFrame.Day, end=datetime(2024, 7, 1))
+    assert bar_store.get_last_timestamp("AAPL", TimeFrame.Day, end=datetime(2024, 7, 1)) == data["timestamp"].iloc[-1]
+    assert bar_store.get_last_timestamp("MSFT", TimeFrame.Day) is None
+
+
+def test_data_handler_reads_and_writes_through_bar_store(bar_store):
+    handler = DataHandler(["AAPL", "QQQ"], "mock_api_key", "mock_secret_key", db_base_path="tests/data",
+                          timeframe=TimeFrame.Day, bar_store=bar_store)
+    bar_store.upsert_frame(pd.DataFrame([{
+        "timestamp": datetime(2025, 1, 13, 5, 0), "ticker": "AAPL", "open": 1.0, "high": 2.0, "low": 0.5, "close": 1.5,
+        "volume": 100.0, "vwap": 1.2,
+    }])[BAR_COLUMNS], TimeFrame.Day)
+
+    prices = handler.fetch_most_recent_prices()
+    assert prices["AAPL"] == pytest.approx(1.5)
+    assert set(prices) == {"AAPL", "QQQ"}
+    assert len(handler.get_backtest_data()["AAPL"]) == 251
+
+
+def test_historical_data_is_the_same_with_and_without_the_bar_store(bar_store):
+    timestamps = bar_store.get_ticker_data("AAPL", TimeFrame.Day)["timestamp"]
+    start, end = timestamps.iloc[100], timestamps.iloc[120]  # `end` is a bar's timestamp
+    legacy = DataHandler(["AAPL"], "mock_api_key", "mock_secret_key", db_base_path="tests/data", timeframe=TimeFrame.Day)
+    store = DataHandler(["AAPL"], "mock_api_key", "mock_secret_key", db_base_path="tests/data", timeframe=TimeFrame.Day, bar_store=bar_store)
+
+    expected = legacy.get_historical_data("AAPL", start, end)
+    data = store.get_historical_data("AAPL", start, end)
+
+    assert len(data) == len(expected) == 21
+    assert list(data["timestamp"]) == list(expected["timestamp"])
+    assert data["timestamp"].iloc[-1] == end
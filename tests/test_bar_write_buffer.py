@@ -0,0 +1,56 @@
+import time
+from datetime import datetime, timezone
+from unittest.mock import MagicMock
+from alpaca.data import Bar
+
+from app.models.bar_write_buffer import BarWriteBuffer
+
+
+def make_bar(ticker, minute):
+    return Bar(ticker, {"t": datetime(2024, 1, 2, 14, minute, tzinfo=timezone.utc), "o": 1.0, "h": 1.0,
+                        "l": 1.0, "c": 1.0, "v": 1.0, "n": 1, "vw": 1.0})
+
+
+def test_flush_batches_bars_across_tickers():
+    ingestor = MagicMock()
+    buffer = BarWriteBuffer(ingestor, max_rows=100, flush_interval=60)
+    for minute in range(3):
+        for ticker in ["AAPL", "QQQ"]:
+            buffer.add(ticker, make_bar(ticker, minute))
+    assert buffer.queue_depth == 6
+
+    assert buffer.flush() == 6
+    ingestor.ingest_frames.assert_called_once()
+    frames = ingestor.ingest_frames.call_args[0][0]
+    assert sorted(frames) == ["AAPL", "QQQ"]
+    assert len(frames["AAPL"]) == 3
+    stats = buffer.stats()
+    assert stats["queue_depth"] == 0 and stats["rows_flushed"] == 6 and stats["flush_count"] == 1
+
+
+def test_worker_flushes_on_size_threshold_and_stop():
+    ingestor = MagicMock()
+    buffer = BarWriteBuffer(ingestor, max_rows=2, flush_interval=60)
+    buffer.start()
+    buffer.add("AAPL", make_bar("AAPL", 0))
+    buffer.add("QQQ", make_bar("QQQ", 0))
+    deadline = time.monotonic() + 2
+    while buffer.rows_flushed < 2 and time.monotonic() < deadline:
+        time.sleep(0.01)
+    assert buffer.rows_flushed == 2
+
+    buffer.add("AAPL", make_bar("AAPL", 1))
+    buffer.stop()
+    assert not buffer.is_running
+    assert buffer.rows_flushed == 3 and buffer.queue_depth == 0
+
+
+def test_failed_flush_keeps_bars_queued():
+    ingestor = MagicMock()
+    ingestor.ingest_frames.side_effect = [Exception("database locked"), None]
+    buffer = BarWriteBuffer(ingestor, max_rows=100, flush_interval=60)
+    buffer.add("AAPL", make_bar("AAPL", 0))
+
+    assert buffer.flush() == 0
+    assert buffer.queue_depth == 1 and buffer.flush_errors == 1
+    assert buffer.flush() == 1
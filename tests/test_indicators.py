@@ -0,0 +1,101 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+
+from alpaca.data import TimeFrame
+
+from app.strategies.market_profile_strategy import MarketProfileStrategy
+from app.utils.indicators import ATR, MACD, RSI, VWAP, IndicatorEngine, RollingExtreme
+from tests import utils
+
+
+@pytest.fixture
+def bars():
+    return utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=2).drop(columns="ticker")
+
+
+def stream(indicator, bars):
+    return [indicator.update(bar) for bar in bars.to_dict(orient="records")]
+
+
+def test_rsi_matches_pandas(bars):
+    expected = MarketProfileStrategy(TimeFrame.Hour).calculate_rsi(bars)
+    np.testing.assert_allclose(stream(RSI(14), bars), expected.values, rtol=1e-9, equal_nan=True)
+
+
+def test_macd_matches_pandas(bars):
+    expected = MarketProfileStrategy(TimeFrame.Hour).calculate_macd(bars)
+    values = stream(MACD(12, 26, 9), bars)
+    np.testing.assert_allclose([v["macd"] for v in values], expected["macd"].values, rtol=1e-9, atol=1e-12)
+    np.testing.assert_allclose([v["signal"] for v in values], expected["signal"].values, rtol=1e-9, atol=1e-12)
+
+
+def test_vwap_matches_pandas(bars):
+    expected = MarketProfileStrategy(TimeFrame.Hour).calculate_vwap(bars)
+    np.testing.assert_allclose(stream(VWAP(), bars), expected.values, rtol=1e-9)
+
+
+@pytest.mark.parametrize("mode,field", [("max", "high"), ("min", "low")])
+def test_rolling_extreme_matches_pandas(bars, mode, field):
+    expected = getattr(bars[field].rolling(30, min_periods=1), mode)()
+    np.testing.assert_allclose(stream(RollingExtreme(30, field=field, mode=mode), bars), expected.values)
+
+
+def test_atr_matches_pandas(bars):
+    prev_close = bars["close"].shift()
+    true_range = pd.concat([
+        bars["high"] - bars["low"], (bars["high"] - prev_close).abs(), (bars["low"] - prev_close).abs()
+    ], axis=1).max(axis=1)
+    expected = true_range.rolling(14, min_periods=1).mean()
+    np.testing.assert_allclose(stream(ATR(14), bars), expected.values, rtol=1e-9)
+
+
+def values(result):
+    return list(result.values()) if isinstance(result, dict) else [result]
+
+
+@pytest.mark.parametrize("indicator", [RSI(14), MACD(), VWAP(), RollingExtreme(30), RollingExtreme(30, "low", "min"), ATR(14)])
+def test_peek_matches_update_without_committing(bars, indicator):
+    records = bars.drop(columns="timestamp").to_dict(orient="records")
+    for bar in records[:100]:
+        indicator.update(bar)
+    state = json.dumps(indicator.to_dict())
+
+    peeked = indicator.peek(records[100])
+
+    assert json.dumps(indicator.to_dict()) == state
+    np.testing.assert_allclose(values(peeked), values(indicator.update(records[100])))
+
+
+def test_engine_keeps_state_per_key_and_round_trips_through_json(bars):
+    factory = lambda: {"rsi": RSI(14), "macd": MACD(), "vwap": VWAP(), "atr": ATR(14), "high": RollingExtreme(20)}
+    engine = IndicatorEngine(factory)
+    records = bars.drop(columns="timestamp").to_dict(orient="records")
+    for bar in records[:300]:
+        engine.update("AAPL", "15min", bar)
+    engine.update("MSFT", "15min", records[0])
+
+    restored = IndicatorEngine(factory)
+    restored.load(json.loads(json.dumps(engine.to_dict())))
+
+    assert restored.get("MSFT", "15min").indicators["vwap"].bars[0][2] == records[0]["volume"]
+    for bar in records[300:]:
+        expected = engine.update("AAPL", "15min", bar)
+        actual = restored.update("AAPL", "15min", bar)
+    assert json.dumps(actual, sort_keys=True) == json.dumps(expected, sort_keys=True)
+
+
+def test_market_profile_streaming_indicators_match_pandas(bars):
+    strategy = MarketProfileStrategy(TimeFrame.Minute)
+    for end in [400, 460, 520]:
+        window = bars.iloc[end - 390:end].reset_index(drop=True)
+        latest = strategy.latest_indicators("AAPL", "1Min", window)
+
+        assert latest["rsi"] == pytest.approx(strategy.calculate_rsi(window).iloc[-1])
+        assert latest["vwap"] == pytest.approx(strategy.calculate_vwap(window).iloc[-1])
+        # the EMAs were seeded before the window moved, the difference decays geometrically
+        macd = strategy.calculate_macd(window).iloc[-1]
+        assert latest["macd"] == pytest.approx(macd["macd"], abs=1e-3)
+        assert latest["signal_line"] == pytest.approx(macd["signal"], abs=1e-3)
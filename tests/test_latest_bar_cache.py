@@ -0,0 +1,39 @@
+import duckdb
+from datetime import datetime, timezone
+from unittest.mock import patch
+from alpaca.data import Bar, TimeFrame
+
+from app.handlers.data_handler import DataHandler
+from app.models.latest_bar_cache import LatestBarCache
+
+
+def make_bar(ticker, minute, close):
+    return Bar(ticker, {"t": datetime(2024, 1, 2, 14, minute, tzinfo=timezone.utc), "o": close, "h": close,
+                        "l": close, "c": close, "v": 1.0, "n": 1, "vw": close})
+
+
+def test_cache_keeps_newest_bar():
+    cache = LatestBarCache()
+    cache.update_from_bar(make_bar("AAPL", 5, 101.0))
+    cache.update_from_bar(make_bar("AAPL", 4, 99.0))  # late bar is ignored
+    cache.update("QQQ", datetime(2024, 1, 2, 14, 5), close=400.0)
+
+    assert cache.get("AAPL")["timestamp"] == datetime(2024, 1, 2, 14, 5)
+    assert cache.price_map(["AAPL", "QQQ", "VXX"]) == {"AAPL": 101.0, "QQQ": 400.0}
+
+
+def test_fetch_most_recent_prices_reads_disk_once():
+    handler = DataHandler(["AAPL", "QQQ", "VXX"], "mock_api_key", "mock_secret_key", db_base_path="tests/data", timeframe=TimeFrame.Day)
+    connect = duckdb.connect
+    with patch("app.handlers.data_handler.duckdb.connect", side_effect=lambda path: connect(path, read_only=True)) as mock_duckdb:
+        prices = handler.fetch_most_recent_prices()
+        assert set(prices) == {"AAPL", "QQQ", "VXX"}
+        assert mock_duckdb.call_count == 3
+
+        # streamed bars update the cache without touching the databases
+        handler.latest_bars.update_from_bar(make_bar("AAPL", 0, 1.25))
+        handler.latest_bars.update("QQQ", datetime(2026, 1, 1), close=2.5)
+        prices = handler.fetch_most_recent_prices()
+        assert prices["QQQ"] == 2.5
+        assert prices["AAPL"] != 1.25  # older than the seeded 2025-01-10 bar
+        assert mock_duckdb.call_count == 3
@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+from datetime import datetime
+from scipy.signal import argrelextrema
+
+from app.models.level_index import LevelIndex
+from app.strategies.support_resistance_strategy import SupportResistanceStrategy
+from tests import utils
+
+
+@pytest.fixture
+def bars():
+    candles = utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=20).drop(columns="ticker")
+    return SupportResistanceStrategy().resample_data(candles, "15min")
+
+
+def build(bars, order=5):
+    levels = LevelIndex(order=order)
+    timestamps = bars['timestamp'].values.astype('datetime64[ns]').astype(np.int64)
+    for timestamp, high, low in zip(timestamps.tolist(), bars['high'].tolist(), bars['low'].tolist()):
+        levels.update(timestamp, high, low)
+    return levels, timestamps
+
+
+def confirmed_extremes(values, comparator, order=5):
+    # extremes with `order` bars on both sides, argrelextrema also reports bars at the edges against clipped neighbours
+    return sorted(values[i] for i in argrelextrema(values, comparator, order=order)[0] if order <= i < len(values) - order)
+
+
+def test_levels_match_argrelextrema(bars):
+    levels, _ = build(bars)
+
+    assert [level for level, _ in levels.supports] == confirmed_extremes(bars['low'].values, np.less)
+    assert [level for level, _ in levels.resistances] == confirmed_extremes(bars['high'].values, np.greater)
+
+
+def test_levels_expire_with_the_window(bars):
+    levels, timestamps = build(bars)
+    start = 200
+    levels.expire(int(timestamps[start]))
+
+    window = bars.iloc[start - 5:]  # the first levels of the window may have neighbours before it
+    assert [level for level, _ in levels.supports] == confirmed_extremes(window['low'].values, np.less)
+    assert all(timestamp >= timestamps[start] for timestamp, _, _ in levels.confirmed)
+
+
+@pytest.mark.parametrize("threshold", [0.0005, 0.002, 0.015])
+def test_nearest_level_matches_a_scan(bars, threshold):
+    levels, _ = build(bars)
+    supports, resistances = [level for level, _ in levels.supports], [level for level, _ in levels.resistances]
+    for price in np.linspace(bars['low'].min() * 0.98, bars['high'].max() * 1.02, 500):
+        near_supports = [support for support in supports if support * (1 + threshold) >= price]
+        near_resistances = [resistance for resistance in resistances if price >= resistance * (1 - threshold)]
+
+        expected_support = min(near_supports, key=lambda level: (abs(level - price), level)) if near_supports else None
+        expected_resistance = min(near_resistances, key=lambda level: (abs(level - price), level)) if near_resistances else None
+        assert levels.nearest_support(price, threshold) == expected_support
+        assert levels.nearest_resistance(price, threshold) == expected_resistance
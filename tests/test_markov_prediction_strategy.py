@@ -0,0 +1,143 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+
+from app.models.bar_aggregator import BarAggregator
+from app.models.markov_model import MarkovTransitionModel
+from app.models.reference_series import ReferenceSeries
+from app.strategies.markov_prediction_strategy import MarkovPredictionStrategy
+from tests import utils
+
+
+@pytest.fixture
+def candles():
+    return utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=20).drop(columns="ticker")
+
+
+@pytest.fixture
+def vxx():
+    return utils.generate_minute_bars("VXX", datetime(2024, 1, 1), days=20, seed=1)[['timestamp', 'close']].rename(columns={'close': 'vxx'})
+
+
+@pytest.fixture
+def hourly(candles, vxx):
+    bars = candles.set_index('timestamp').resample('60min').agg({'close': 'last', 'volume': 'sum', 'vwap': 'mean'})
+    bars['vxx'] = vxx.set_index('timestamp')['vxx'].resample('60min').last()
+    return bars.dropna().reset_index()
+
+
+def strategy_with_vxx(vxx, **kwargs):
+    strategy = MarkovPredictionStrategy(**kwargs)
+    series = ReferenceSeries('vxx', lambda start=None: vxx if start is None else vxx[vxx['timestamp'] >= start])
+    strategy.vxx_series = lambda: series
+    return strategy
+
+
+def test_state_space_is_bounded(hourly):
+    model = MarkovTransitionModel(n_bins=3)
+    model.update(hourly)
+
+    assert model.n_states <= 3 ** 4
+    assert model.n_transitions == len(hourly) - 1
+    assert model.states(hourly).max() < 3 ** 4
+
+
+def test_incremental_updates_match_a_full_fit(hourly):
+    full = MarkovTransitionModel()
+    full.update(hourly)
+    incremental = MarkovTransitionModel()
+    incremental.fit_edges(hourly)
+    for end in range(10, len(hourly) + 1, 7):
+        incremental.update(hourly.iloc[:end])
+    incremental.update(hourly)
+
+    assert incremental.to_dict() == full.to_dict()
+
+
+def test_model_refits_when_the_data_goes_back_in_time(hourly):
+    model = MarkovTransitionModel()
+    model.update(hourly)
+    model.update(hourly.iloc[:50])
+
+    assert model.n_transitions == 49
+    assert model.last_timestamp == hourly['timestamp'].iloc[49]
+
+
+def test_simulated_closes_converge_to_the_analytic_expectation(hourly):
+    model = MarkovTransitionModel(n_bins=4)
+    model.update(hourly)
+    state = model.last_state
+    rng = np.random.default_rng(0)
+
+    for n_steps in [1, 3]:
+        predicted = model.predict_close(state, 0.0, n_steps=n_steps, n_simulations=200_000, rng=rng)
+        assert predicted == pytest.approx(model.expected_close(state, 0.0, n_steps=n_steps), rel=1e-3)
+
+
+def test_model_round_trips_through_disk(tmp_path, hourly):
+    model = MarkovTransitionModel()
+    model.update(hourly.iloc[:100])
+    model.save(tmp_path / "model.json")
+    restored = MarkovTransitionModel.load(tmp_path / "model.json")
+
+    model.update(hourly)
+    restored.update(hourly)
+    assert restored.to_dict() == model.to_dict()
+    assert MarkovTransitionModel.load(tmp_path / "missing.json").n_states == 0
+
+
+def test_make_prediction_is_reproducible(candles, vxx):
+    predictions = [strategy_with_vxx(vxx, seed=3).make_prediction(candles) for _ in range(2)]
+    current_close, predicted_close = predictions[0]
+
+    assert predictions[0] == predictions[1]
+    assert current_close == candles.set_index('timestamp')['close'].resample('60min').last().dropna().iloc[-1]
+    assert candles['close'].min() <= predicted_close <= candles['close'].max()
+
+
+def test_make_prediction_reads_the_same_bars_from_the_aggregator(candles, vxx):
+    expected = strategy_with_vxx(vxx, seed=3).make_prediction(candles)
+    strategy = strategy_with_vxx(vxx, seed=3)
+    strategy.bar_aggregator = BarAggregator()
+    strategy.bar_aggregator.update_from_frame("AAPL", candles)
+
+    assert strategy.make_prediction(candles, ticker="AAPL") == pytest.approx(expected)
+
+
+def test_make_prediction_persists_the_ticker_model(tmp_path, candles, vxx):
+    strategy = strategy_with_vxx(vxx, seed=3, model_dir=str(tmp_path))
+    strategy.make_prediction(candles.iloc[:3900], ticker="AAPL")
+    strategy.make_prediction(candles, ticker="AAPL")
+
+    restarted = strategy_with_vxx(vxx, seed=3, model_dir=str(tmp_path))
+    model = restarted.get_model("AAPL", "60min")
+    assert model.to_dict() == strategy.get_model("AAPL", "60min").to_dict()
+    # the last hour is still being filled and is not counted
+    assert model.last_timestamp == pd.Timestamp(candles['timestamp'].iloc[-1]).floor('60min') - pd.Timedelta('60min')
+
+
+def test_model_refits_its_bins_as_prices_trend():
+    rng = np.random.default_rng(0)
+    n = 600
+    close = 100 * 1.002 ** np.arange(n) * (1 + rng.normal(0, 0.002, n))
+    trending = pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-02", periods=n, freq="60min"),
+        "close": close,
+        "volume": rng.uniform(1_000, 2_000, n),
+        "vwap": close * (1 + rng.normal(0, 0.001, n)),
+        "vxx": rng.uniform(15, 25, n),
+    })
+    refitting, fixed = MarkovTransitionModel(), MarkovTransitionModel(refit_share=1.0)
+    for end in range(200, n + 1, 10):
+        window = trending.iloc[end - 200:end]
+        refitting.update(window)
+        fixed.update(window)
+
+    current_close = trending['close'].iloc[-1]
+    # with bins fit on the first window every later bar lands in the top close bin, predicting its stale mean close
+    stale = fixed.expected_close(fixed.last_state, current_close)
+    assert stale < 0.85 * current_close
+    assert refitting.expected_close(refitting.last_state, current_close) == pytest.approx(current_close, rel=0.05)
+    assert refitting.out_of_range(trending.iloc[-200:]) <= refitting.refit_share
+    assert refitting.ranges[0][0] > trending['close'].iloc[0]
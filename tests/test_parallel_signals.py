@@ -0,0 +1,109 @@
+import pandas as pd
+import pytest
+from datetime import datetime, timedelta
+
+from app.handlers.signal_workers import attach_frame, share_frame
+from app.handlers.strategy_handler import StrategyHandler
+from app.models.bar_aggregator import BarAggregator
+from app.models.reference_series import ReferenceSeries, get_reference_cache
+from tests import utils
+
+TICKERS = ["AAPL", "MSFT", "NVDA"]
+
+
+@pytest.fixture
+def db_base_path(tmp_path):
+    for seed, ticker in enumerate(TICKERS + ["VXX"]):
+        utils.create_ticker_db(tmp_path, ticker, utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=40, seed=seed))
+    yield str(tmp_path)
+    get_reference_cache().clear()
+
+
+def signal_fields(signals):
+    # signals are stamped with the wall clock time they were created at
+    return {ticker: {**signal.__dict__(), 'timestamp': None} for ticker, signal in signals.items()}
+
+
+def make_handler(db_base_path, workers):
+    handler = StrategyHandler(TICKERS + ["VXX"], db_base_path=db_base_path, workers=workers)
+    handler.markov_prediction.model_dir = None
+    handler.markov_prediction.seed = 7
+    # hourly bars, so windows starting mid-bucket come up
+    handler.support_resistance_strategy.configure(time_interval="60min")
+    handler.strategies = {
+        'support_resistance': handler.support_resistance_strategy,
+        'trend_following': handler.trend_following_strategy,
+        'markov': handler.markov_prediction,
+        'market_profile': handler.market_profile_strategy,
+    }
+    return handler
+
+
+def test_shared_frames_round_trip():
+    frame = utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=2).drop(columns="ticker")
+    block, descriptor = share_frame(frame)
+    try:
+        shared = attach_frame(descriptor)
+    finally:
+        block.close()
+        block.unlink()
+
+    assert list(shared.columns) == list(frame.columns)
+    assert (shared['timestamp'].values == frame['timestamp'].values.astype('datetime64[ns]')).all()
+    assert shared.drop(columns="timestamp").equals(frame.drop(columns="timestamp").astype(float))
+
+
+def test_workers_are_sent_the_vxx_rows_of_the_lookback_window(db_base_path):
+    handler = make_handler(db_base_path, workers=0)
+    handler.markov_prediction.configure(lookback_bars=60)
+    now = datetime(2024, 2, 5, 10, 30)
+    start = now - handler.markov_prediction.history_window()
+
+    vxx = handler.shared_vxx_data(now)
+
+    series = handler.markov_prediction.vxx_series()
+    assert vxx['timestamp'].iloc[0] <= start < vxx['timestamp'].iloc[1]
+    assert vxx['timestamp'].iloc[-1] == now and len(vxx) < series.size
+    shipped = ReferenceSeries('vxx', lambda start=None: vxx)
+    shipped.refresh()
+    lookups = pd.date_range(start, now, freq="7min")
+    assert (shipped.asof(lookups) == series.asof(lookups)).all()
+
+
+def test_parallel_signals_match_serial(db_base_path):
+    serial = make_handler(db_base_path, workers=0)
+    parallel = make_handler(db_base_path, workers=2)
+    # the serial handler keeps one aggregator across steps while the windows' start moves forward, the workers
+    # aggregate each shipped window afresh: record the bars the serial aggregator serves to compare them
+    served = []
+    window = serial.bar_aggregator.window
+
+    def record_window(ticker, interval, data):
+        bars = window(ticker, interval, data)
+        served.append((ticker, interval, data, serial.bar_aggregator.first_timestamp(ticker), bars))
+        return bars
+
+    serial.bar_aggregator.window = record_window
+    generated = 0
+    try:
+        for day in range(3):
+            for hour, minute in [(10, 29), (10, 30), (13, 29), (13, 30), (15, 29), (15, 30)]:
+                end = datetime(2024, 2, 5, hour, minute) + timedelta(days=day)
+                expected = serial.generate_signals(is_backtest=True, backtest_data={"end": end})
+                signals = parallel.generate_signals(is_backtest=True, backtest_data={"end": end})
+
+                assert signal_fields(signals) == signal_fields(expected)
+                assert set(parallel.ticker_timings) == set(TICKERS)
+                assert set(serial.ticker_timings) == set(TICKERS)
+                generated += len(expected)
+        assert generated > 0
+        assert parallel.market_profile_strategy.indicators.to_dict() == serial.market_profile_strategy.indicators.to_dict()
+    finally:
+        parallel.close()
+
+    warm = [call for call in served if call[3] < call[2]['timestamp'].iloc[0]]
+    assert warm, "the serial aggregator never held candles before a window"
+    for ticker, interval, data, _, bars in warm:
+        fresh = BarAggregator(serial.bar_aggregator.intervals)
+        fresh.update_from_frame(ticker, data)
+        pd.testing.assert_frame_equal(bars, fresh.frame(ticker, interval))
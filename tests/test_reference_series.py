@@ -0,0 +1,75 @@
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+
+from app.models.bar_store import BarStore
+from app.models.reference_series import ReferenceSeries, get_reference_cache
+from app.strategies.base import BaseStrategy
+from app.utils.bar_ingestion import BAR_COLUMNS
+from tests import utils
+
+
+@pytest.fixture
+def vxx():
+    return utils.generate_minute_bars("VXX", datetime(2024, 1, 1), days=3)
+
+
+class RecordingLoader:
+    def __init__(self, frame):
+        self.frame = frame
+        self.available = len(frame)
+        self.starts = []
+
+    def __call__(self, start=None):
+        self.starts.append(start)
+        rows = self.frame.iloc[:self.available]
+        return rows if start is None else rows[rows['timestamp'] >= start]
+
+
+def test_refresh_only_reads_new_rows(vxx):
+    loader = RecordingLoader(vxx[['timestamp', 'close']].rename(columns={'close': 'vxx'}))
+    loader.available = 100
+    series = ReferenceSeries('vxx', loader)
+
+    assert series.refresh(datetime(2024, 1, 1, 10)) == 100
+    assert series.refresh(datetime(2024, 1, 1, 10)) == 0  # already loaded through `end`
+    loader.available = 150
+    assert series.refresh(datetime(2024, 1, 1, 12)) == 50
+
+    assert loader.starts == [None, pd.Timestamp(vxx['timestamp'].iloc[100])]
+    assert series.size == 150
+
+
+def test_asof_matches_pandas_merge_asof(vxx):
+    series = ReferenceSeries('vxx', lambda start=None: vxx[['timestamp', 'close']].rename(columns={'close': 'vxx'}).iloc[::7])
+    series.refresh()
+    lookups = pd.DataFrame({'timestamp': pd.date_range("2024-01-01 09:00", "2024-01-03 17:00", freq="13min", unit="ns")})
+
+    expected = pd.merge_asof(lookups, series.frame(), on='timestamp')['vxx']
+    np.testing.assert_array_equal(series.asof(lookups['timestamp']), expected.values)
+    assert np.isnan(series.asof([datetime(2024, 1, 1, 9, 29)])[0])
+
+
+def test_frame_excludes_rows_from_end(vxx):
+    series = ReferenceSeries('vxx', lambda start=None: vxx[['timestamp', 'close']].rename(columns={'close': 'vxx'}))
+    series.refresh()
+    frame = series.frame(datetime(2024, 1, 2, 9, 31))
+
+    assert frame['timestamp'].iloc[-1] == datetime(2024, 1, 2, 9, 30)
+    assert frame['vxx'].iloc[-1] == vxx.set_index('timestamp')['close'][datetime(2024, 1, 2, 9, 30)]
+
+
+def test_strategies_share_one_copy_per_source(tmp_path, vxx):
+    get_reference_cache().clear()
+    store = BarStore(str(tmp_path / "market_data.db"))
+    store.upsert_frame(vxx[BAR_COLUMNS], "1Min")
+    first, second = BaseStrategy(), BaseStrategy()
+    first.bar_store = second.bar_store = store
+
+    data = first.fetch_vxx_data(end=datetime(2024, 1, 3))
+    assert second.vxx_series() is first.vxx_series()
+    assert len(data) == 2 * 390
+    np.testing.assert_allclose(data['vxx'].values, vxx['close'].values[:780], rtol=1e-6)
+    store.close()
+    get_reference_cache().clear()
@@ -0,0 +1,93 @@
+import pytest
+from datetime import datetime, timedelta
+
+from app.handlers.strategy_handler import StrategyHandler
+from app.models.signal import Signal
+from app.strategies.base import BaseStrategy
+from tests import utils
+
+
+class RecordingStrategy(BaseStrategy):
+    """Records the candles it is given."""
+    def __init__(self, lookback_interval, lookback_bars):
+        self.lookback_interval = lookback_interval
+        self.lookback_bars = lookback_bars
+        self.received = []
+
+    def generate_signal(self, ticker, data):
+        self.received.append(data)
+        return Signal(strategy="recording", ticker=ticker, price=data['close'].iloc[-1])
+
+
+@pytest.fixture
+def db_base_path(tmp_path):
+    utils.create_ticker_db(tmp_path, "AAPL", utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=60))
+    return str(tmp_path)
+
+
+def test_history_window_covers_lookback_sessions():
+    # 4200 minute candles = 11 sessions -> 16 calendar days + holiday padding
+    assert RecordingStrategy("1min", 60 * 7 * 10).history_window() == timedelta(days=20)
+    assert RecordingStrategy("15min", 360).history_window() == timedelta(days=24)
+    assert RecordingStrategy("1min", None).history_window() is None
+
+
+def test_generate_signals_loads_only_the_union_of_lookbacks(db_base_path):
+    handler = StrategyHandler(["AAPL"], db_base_path=db_base_path)
+    short, long = RecordingStrategy("1min", 390), RecordingStrategy("1D", 10)
+    handler.strategies = {"short": short, "long": long}
+    end = datetime(2024, 3, 1, 15, 0)
+
+    handler.generate_signals(is_backtest=True, backtest_data={"end": end})
+
+    assert handler.history_window() == long.history_window()
+    assert long.received[0]['timestamp'].min() >= end - long.history_window()
+    assert short.received[0]['timestamp'].min() >= end - short.history_window()
+    assert len(short.received[0]) < len(long.received[0]) < 60 * 390
+    assert long.received[0]['timestamp'].max() < end
+
+
+def test_full_history_strategy_disables_the_window(db_base_path):
+    handler = StrategyHandler(["AAPL"], db_base_path=db_base_path)
+    full = RecordingStrategy("1min", None)
+    handler.strategies = {"short": RecordingStrategy("1min", 390), "full": full}
+
+    handler.generate_signals(is_backtest=True, backtest_data={"end": datetime(2024, 3, 1, 15, 0)})
+
+    assert full.received[0]['timestamp'].min() == datetime(2024, 1, 1, 9, 30)
+
+
+def test_only_due_strategies_are_loaded_and_run(db_base_path):
+    handler = StrategyHandler(["AAPL"], db_base_path=db_base_path)
+    hourly, every_minute = RecordingStrategy("1D", 10), RecordingStrategy("1min", 390)
+    hourly.evaluation_minutes = frozenset([0])
+    handler.strategies = {"hourly": hourly, "every_minute": every_minute}
+    loads = []
+    load_ticker_data = handler.load_ticker_data
+    handler.load_ticker_data = lambda ticker, end=None, start=None: loads.append(start) or load_ticker_data(ticker, end=end, start=start)
+
+    # the latest candle before 15:30 is stamped 15:29
+    handler.generate_signals(is_backtest=True, backtest_data={"end": datetime(2024, 3, 1, 15, 30)})
+    assert len(hourly.received) == 0 and len(every_minute.received) == 1
+    assert loads[-1] == datetime(2024, 3, 1, 15, 30) - every_minute.history_window()
+
+    handler.generate_signals(is_backtest=True, backtest_data={"end": datetime(2024, 3, 1, 15, 1)})
+    assert len(hourly.received) == 1 and len(every_minute.received) == 2
+    assert loads[-1] == datetime(2024, 3, 1, 15, 1) - hourly.history_window()
+
+    every_minute.evaluation_minutes = frozenset([0])
+    handler.generate_signals(is_backtest=True, backtest_data={"end": datetime(2024, 3, 1, 15, 30)})
+    assert len(loads) == 2
+
+
+def test_strategies_are_skipped_until_warm(db_base_path):
+    handler = StrategyHandler(["AAPL"], db_base_path=db_base_path)
+    strategy = RecordingStrategy("1min", 390)
+    strategy.warmup_candles = 390
+    handler.strategies = {"warm": strategy}
+
+    # only 30 candles exist before 10:00 of the first session
+    handler.generate_signals(is_backtest=True, backtest_data={"end": datetime(2024, 1, 1, 10, 0)})
+    assert len(strategy.received) == 0
+    handler.generate_signals(is_backtest=True, backtest_data={"end": datetime(2024, 1, 3, 10, 0)})
+    assert len(strategy.received) == 1
@@ -0,0 +1,88 @@
+import json
+import numpy as np
+import pandas as pd
+import pytest
+from datetime import datetime
+
+from app.strategies.trend_following_strategy import TrendFollowingStrategy
+from tests import utils
+
+
+@pytest.fixture
+def bars():
+    candles = utils.generate_minute_bars("AAPL", datetime(2024, 1, 1), days=40, seed=3).drop(columns="ticker")
+    return TrendFollowingStrategy().resample_data(candles, "15min")
+
+
+def loop_detect_trend(data):
+    """The original per-candle scan of `detect_trend`, with the first candle no longer compared to the last one."""
+    if len(data) < 200:
+        return None
+    highs, lows = data['high'].values, data['low'].values
+    higher_highs, higher_lows = [], []
+    for i in range(1, len(data) - 1):
+        if highs[i] > highs[i - 1]:
+            higher_highs.append(i)
+        if lows[i] > lows[i - 1]:
+            higher_lows.append(i)
+    if higher_highs and higher_lows and higher_lows[-1] > higher_highs[-1]:
+        breakout_candle, higher_low_candle = data.iloc[-1], data.iloc[higher_lows[-1]]
+        if breakout_candle['close'] > higher_low_candle['high']:
+            return {
+                "trend": "uptrend",
+                "demand_zone": {"low": higher_low_candle['low'], "high": higher_low_candle['high']},
+                "previous_high": max(highs[higher_highs[-1]:higher_lows[-1]]),
+            }
+    return None
+
+
+def sliding_windows(bars, size=360, step=1):
+    for end in range(200, len(bars) + 1, step):
+        yield bars.iloc[max(0, end - size):end]
+
+
+def test_vectorized_and_incremental_trends_match_the_scan(bars):
+    strategy = TrendFollowingStrategy()
+    uptrends = 0
+    for window in sliding_windows(bars):
+        expected = loop_detect_trend(window)
+        assert strategy.detect_trend(window) == expected
+        assert strategy.latest_trend("AAPL", window) == expected
+        uptrends += expected is not None
+    assert uptrends > 10
+
+
+def test_incremental_trend_rebuilds_when_bars_do_not_continue(bars):
+    strategy = TrendFollowingStrategy()
+    for window in sliding_windows(bars, step=7):
+        strategy.latest_trend("AAPL", window)
+    # going back in time, like a new backtest, and skipping ahead both rebuild the swing points
+    for window in [bars.iloc[:300], bars.iloc[-250:], bars.iloc[100:400]]:
+        assert strategy.latest_trend("AAPL", window) == loop_detect_trend(window)
+
+
+def test_first_candle_is_not_compared_to_the_last(bars):
+    # highs only fall and lows only rise: there is no higher high, the old scan wrapped around to find one at i=0
+    n = 250
+    data = pd.DataFrame({
+        "timestamp": pd.date_range("2024-01-01", periods=n, freq="15min"),
+        "high": np.linspace(120, 110, n),
+        "low": np.linspace(90, 100, n),
+        "close": np.r_[np.full(n - 1, 100.0), 115.0],
+    })
+    strategy = TrendFollowingStrategy()
+
+    assert strategy.detect_trend(data) is None
+    assert strategy.latest_trend("AAPL", data) is None
+
+
+def test_swing_points_round_trip_through_json(bars):
+    strategy = TrendFollowingStrategy()
+    window = bars.iloc[:300]
+    strategy.latest_trend("AAPL", window)
+
+    restored = TrendFollowingStrategy()
+    restored.swings.load(json.loads(json.dumps(strategy.swings.to_dict())))
+    for window in sliding_windows(bars.iloc[:400]):
+        if len(window) > 300:
+            assert restored.latest_trend("AAPL", window) == strategy.latest_trend("AAPL", window)
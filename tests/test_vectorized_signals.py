@@ -0,0 +1,73 @@
+import pytest
+from datetime import datetime
+
+from app.handlers.strategy_handler import StrategyHandler
+from app.models.backtest_data import BacktestDataEngine
+from tests import utils
+
+TICKERS = ["AAPL", "MSFT"]
+
+
+@pytest.fixture(scope="module")
+def engine():
+    return BacktestDataEngine({
+        ticker: utils.generate_minute_bars(ticker, datetime(2024, 1, 1), days=62, seed=seed) for seed, ticker in enumerate(TICKERS)
+    })
+
+
+def make_handler(engine, lookback=None, threshold=None):
+    handler = StrategyHandler(TICKERS, db_base_path="tests/data")
+    handler.backtest_engine = engine
+    strategy = handler.support_resistance_strategy
+    if lookback is not None:
+        strategy.lookback = lookback
+        strategy.lookback_bars = strategy.warmup_candles = 60 * lookback
+    if threshold is not None:
+        strategy.support_threshold = strategy.resistance_threshold = threshold
+    return handler
+
+
+def run(handler, ends):
+    signals = []
+    for end in ends:
+        signal_data = handler.generate_signals(is_backtest=True, backtest_data={"end": end})
+        # signals are stamped with the wall clock time they were created at
+        signals.append({ticker: {**signal.__dict__(), 'timestamp': None} for ticker, signal in signal_data.items()})
+    return signals
+
+
+def assert_vectorized_matches(engine, ends, **kwargs):
+    per_candle = run(make_handler(engine, **kwargs), ends)
+    handler = make_handler(engine, **kwargs)
+    handler.vectorize_backtest(ends)
+    handler.support_resistance_strategy.generate_signal = None  # every signal must come from the vectorized pass
+
+    assert run(handler, ends) == per_candle
+    return per_candle
+
+
+def test_vectorized_support_resistance_matches_per_candle(engine):
+    ends = engine.frame("AAPL")['timestamp'].iloc[-2 * 390:]
+    signals = assert_vectorized_matches(engine, ends)
+    assert sum(len(signal_data) for signal_data in signals) > 0
+
+
+def test_vectorized_support_resistance_matches_with_short_lookbacks(engine):
+    # short lookbacks and tight thresholds exercise buys, sells and no signal, and levels expiring from the window
+    ends = engine.frame("AAPL")['timestamp'].iloc[-3 * 390:]
+    signals = assert_vectorized_matches(engine, ends, lookback=40, threshold=0.0005)
+    actions = {signal['action'] for signal_data in signals for signal in signal_data.values()}
+    assert actions == {'buy', 'sell'}
+    assert sum(len(signal_data) for signal_data in signals) < len(ends) * len(TICKERS)
+
+
+def test_vectorized_signals_have_no_lookahead(engine):
+    handler = make_handler(engine, lookback=40, threshold=0.0005)
+    strategy = handler.support_resistance_strategy
+    frame = engine.frame("AAPL")
+    ends = frame['timestamp'].iloc[-390:]
+    full = strategy.generate_signals_vectorized("AAPL", frame, ends)
+    # dropping every candle at or after the last clock time changes none of the signals
+    truncated = strategy.generate_signals_vectorized("AAPL", frame[frame['timestamp'] < ends.iloc[-1]], ends)
+
+    assert full.equals(truncated)
@@ -0,0 +1,155 @@
+import asyncio
+import json
+
+from app.models.websocket_manager import WebSocketManager
+
+
+class FakeWebSocket:
+    """Records what is sent, holding every send until `gate` is set and failing them all with `fail`."""
+    def __init__(self, gate=None, fail=False):
+        self.sent = []
+        self.gate = gate
+        self.fail = fail
+        self.closed = False
+
+    async def accept(self):
+        pass
+
+    async def send_text(self, data):
+        if self.gate is not None:
+            await self.gate.wait()
+        if self.fail:
+            raise ConnectionError("connection reset")
+        self.sent.append(json.loads(data))
+
+    async def send_bytes(self, data):
+        self.sent.append(data)
+
+    async def close(self):
+        self.closed = True
+
+
+async def settle():
+    for _ in range(20):
+        await asyncio.sleep(0)
+
+
+def test_stalled_client_does_not_hold_up_the_others():
+    async def scenario():
+        manager = WebSocketManager(max_queue=4, policy="drop_oldest")
+        gate = asyncio.Event()
+        fast, stalled = FakeWebSocket(), FakeWebSocket(gate=gate)
+        await manager.connect(fast)
+        await manager.connect(stalled)
+
+        for i in range(10):
+            await manager.send_message({"i": i})
+            await settle()
+        assert [message["i"] for message in fast.sent] == list(range(10))
+        assert stalled.sent == []
+
+        gate.set()
+        await settle()
+        # the first send was in flight, then the stalled client skipped to the newest 4
+        assert [message["i"] for message in stalled.sent] == [0, 6, 7, 8, 9]
+        assert manager.clients[stalled].dropped == 5
+        await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_coalesce_sends_only_the_newest_pending_message_of_a_key():
+    async def scenario():
+        manager = WebSocketManager(policy="coalesce")
+        gate = asyncio.Event()
+        websocket = FakeWebSocket(gate=gate)
+        await manager.connect(websocket)
+        await manager.send_message({"i": 0})
+        await settle()
+
+        await manager.send_message({"progress": 0.1}, key="progress")
+        await manager.send_message({"trades": [1]})
+        await manager.send_message({"progress": 0.2}, key="progress")
+        await manager.send_message({"progress": 0.3}, key="progress")
+        await manager.send_to(websocket, {"message": "Backtest started."})
+        gate.set()
+        await settle()
+
+        assert websocket.sent == [{"i": 0}, {"message": "Backtest started."}, {"trades": [1]}, {"progress": 0.3}]
+        await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_failed_and_timed_out_clients_are_evicted():
+    async def scenario():
+        manager = WebSocketManager(send_timeout=0.01)
+        healthy, broken, hung = FakeWebSocket(), FakeWebSocket(fail=True), FakeWebSocket(gate=asyncio.Event())
+        for websocket in (healthy, broken, hung):
+            await manager.connect(websocket)
+
+        await manager.send_message({"i": 0})
+        await asyncio.sleep(0.05)
+        await manager.send_message(b"\x00")
+        await settle()
+
+        assert manager.active_connections == [healthy]
+        assert broken.closed and hung.closed
+        assert healthy.sent == [{"i": 0}, b"\x00"]
+        await manager.disconnect(broken)  # the route's own disconnect after an eviction does nothing
+        await manager.close()
+        assert manager.active_connections == []
+
+    asyncio.run(scenario())
+
+
+def test_new_connections_are_sent_the_snapshot_first():
+    async def scenario():
+        manager = WebSocketManager()
+        state = {"trades": [1, 2]}
+        manager.snapshot = lambda: {"type": "snapshot", **state}
+        await manager.send_message({"trades": [1]})
+        await manager.send_message({"trades": [2]})
+
+        websocket = FakeWebSocket()
+        await manager.connect(websocket)
+        await settle()
+        state["trades"].append(3)
+        await manager.send_message({"trades": [3]})
+        await settle()
+
+        assert websocket.sent == [{"type": "snapshot", "trades": [1, 2]}, {"trades": [3]}]
+        await manager.close()
+
+    asyncio.run(scenario())
+
+
+def test_client_that_falls_behind_is_resent_the_snapshot():
+    async def scenario():
+        manager = WebSocketManager(max_queue=4)
+        trades = []
+        manager.snapshot = lambda: {"type": "snapshot", "trades": list(trades)}
+        gate = asyncio.Event()
+        fast, stalled = FakeWebSocket(), FakeWebSocket(gate=gate)
+        await manager.connect(fast)
+        await manager.connect(stalled)
+        await settle()
+
+        for i in range(10):
+            trades.append(i)
+            await manager.send_message({"trades": [i]})
+            await settle()
+        gate.set()
+        await settle()
+        trades.append(10)
+        await manager.send_message({"trades": [10]})
+        await settle()
+
+        # the stalled client's frames are deltas: it gets the state it missed in one snapshot, not a gap
+        assert fast.sent[1:] == [{"trades": [i]} for i in range(11)]
+        # its first snapshot was in flight while the log moved on by 10 frames
+        assert stalled.sent == [{"type": "snapshot", "trades": []}, {"type": "snapshot", "trades": list(range(10))}, {"trades": [10]}]
+        assert manager.clients[stalled].dropped == 6
+        await manager.close()
+
+    asyncio.run(scenario())
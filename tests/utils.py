@@ -20,4 +20,38 @@ def get_most_recent_timestamp(ticker, db_base_path="tests/data"):
     conn = duckdb.connect(f"{db_base_path}/{ticker}_1min_data.db")
     timestamp = conn.execute(f"SELECT timestamp FROM ticker_data ORDER BY timestamp DESC LIMIT 1")
     conn.close()
-    return timestamp
\ No newline at end of file
+    return timestamp
+
+
+def generate_minute_bars(ticker, start, days, seed=0):
+    """Generate regular session (9:30 - 16:00) 1-minute candles for `days` weekdays from `start`."""
+    import numpy as np
+    import pandas as pd
+
+    sessions = pd.bdate_range(start, periods=days)
+    timestamps = np.concatenate([
+        pd.date_range(session + timedelta(hours=9, minutes=30), periods=390, freq="1min").values for session in sessions
+    ])
+    rng = np.random.default_rng(seed)
+    close = 100 + np.cumsum(rng.normal(0, 0.05, len(timestamps)))
+    open_ = np.concatenate([[close[0]], close[:-1]])
+    spread = rng.uniform(0, 0.05, len(timestamps))
+    return pd.DataFrame({
+        "timestamp": timestamps,
+        "ticker": ticker,
+        "open": open_,
+        "high": np.maximum(open_, close) + spread,
+        "low": np.minimum(open_, close) - spread,
+        "close": close,
+        "volume": rng.integers(100, 10_000, len(timestamps)).astype(float),
+        "vwap": (open_ + close) / 2,
+    })
+
+
+def create_ticker_db(db_base_path, ticker, frame, timeframe="1Min"):
+    """Create a per-ticker `ticker_data` database holding `frame`."""
+    conn = duckdb.connect(f"{db_base_path}/{ticker}_{timeframe}_data.db")
+    conn.execute("CREATE TABLE ticker_data (timestamp TIMESTAMP, ticker TEXT, open FLOAT, high FLOAT, low FLOAT, close FLOAT, volume FLOAT, vwap FLOAT, PRIMARY KEY (timestamp, ticker))")
+    conn.register("frame", frame)
+    conn.execute("INSERT INTO ticker_data SELECT * FROM frame")
+    conn.close()